@@ -0,0 +1,71 @@
+"""Đo recall@1 và thời gian nhận diện của index ANN (IVF) so với quét toàn bộ gallery.
+
+Gallery được tạo từ ảnh mẫu cùng các bản sao giả (dịch chuyển + nhiễu, ID mới) cho tới
+--gallery dòng; ảnh kiểm tra là các ảnh mẫu đã làm nhiễu. recall@1 là tỉ lệ query mà
+index tìm ra đúng mẫu gần nhất của lần quét toàn bộ.
+
+Chạy từ thư mục gốc dự án: python bench/bench_ann.py --gallery 20000 --probes 1 2 4 8 16
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from face_store import FaceStore  # noqa: E402
+from lbph import LBPHGallery, compute_histogram  # noqa: E402
+from bench_prototypes import augment  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall@1 / thời gian của index ANN so với quét toàn bộ")
+    parser.add_argument("--data-dir", default="images", help="Thư mục ảnh mẫu (mặc định: images)")
+    parser.add_argument("--gallery", type=int, default=10000, help="Số dòng gallery")
+    parser.add_argument("--queries", type=int, default=50, help="Số ảnh kiểm tra")
+    parser.add_argument("--lists", type=int, default=0, help="Số cụm của index (0 = khoảng sqrt(N))")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Các giá trị nprobe cần thử")
+    args = parser.parse_args(argv)
+
+    faces, labels, _ = FaceStore(args.data_dir).update()
+    if len(faces) == 0:
+        print("Không có ảnh mẫu để đánh giá.")
+        return
+    rng = np.random.default_rng(0)
+    offset = int(np.max(labels)) + 1
+    picks = rng.integers(0, len(faces), args.gallery)
+    gallery_faces = [faces[i] if n < len(faces) else augment(faces[i], rng) for n, i in enumerate(picks)]
+    gallery_labels = [labels[i] + (n // len(faces)) * offset for n, i in enumerate(picks)]
+    elapsed, histograms = timed(lambda: np.vstack([compute_histogram(np.stack(gallery_faces[i:i + 256]))
+                                                   for i in range(0, len(gallery_faces), 256)]))
+    print(f"Gallery {len(gallery_faces)} dòng ({elapsed:.1f}s tính histogram)")
+    exact = LBPHGallery(histograms, gallery_labels)
+    elapsed, indexed = timed(lambda: exact.with_index(args.lists))
+    print(f"Tạo index {indexed.index.nlist} cụm trong {elapsed:.2f}s")
+
+    crops = [augment(faces[i], rng) for i in rng.integers(0, len(faces), args.queries)]
+    exact.predict_batch(crops[:1])
+    indexed.predict_batch(crops[:1], exhaustive=True)
+    t_exact, (_, exact_confs) = timed(lambda: exact.predict_batch(crops))
+    print(f"{'nprobe':>7} {'dòng quét':>10} {'recall@1':>9} {'ms/khuôn mặt':>13} {'tăng tốc':>9}")
+    print(f"{'toàn bộ':>7} {len(exact.labels):>10} {1.0:>9.1%} {t_exact / len(crops) * 1000:>13.2f} {1.0:>8.2f}x")
+    queries = indexed.histograms_batch(crops)
+    for nprobe in args.probes:
+        if nprobe > indexed.index.nlist:
+            continue
+        scanned = np.mean([sum(end - start for start, end in ranges)
+                           for ranges in indexed.index.probe(queries, nprobe)])
+        elapsed, (_, confs) = timed(lambda: indexed.predict_batch(crops, nprobe=nprobe))
+        recall = float(np.mean(np.isclose(confs, exact_confs, rtol=0, atol=1e-6)))
+        print(f"{nprobe:>7} {scanned:>10.0f} {recall:>9.1%} {elapsed / len(crops) * 1000:>13.2f} "
+              f"{t_exact / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
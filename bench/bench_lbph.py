@@ -0,0 +1,80 @@
+"""So sánh thời gian nhận diện: LBPHFaceRecognizer.predict() từng khuôn mặt và
+LBPHGallery.predict_batch() cho cả khung hình, khi gallery lớn dần.
+
+Chạy từ thư mục gốc dự án: python bench/bench_lbph.py --sizes 100 1000 5000 --faces 4
+"""
+import os
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from face_store import FaceStore  # noqa: E402
+from lbph import LBPHGallery  # noqa: E402
+
+
+def synthetic_faces(count, size=(100, 100), seed=0):
+    "Ảnh khuôn mặt giả (nhiễu làm mịn) khi chưa có dữ liệu thật"
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (count, size[1], size[0]), dtype=np.uint8)
+    return np.stack([cv2.GaussianBlur(img, (5, 5), 0) for img in noise])
+
+
+def make_gallery(base, labels, count, seed=0):
+    "Nhân bản ảnh mẫu (dịch chuyển và thêm nhiễu) tới count mẫu"
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(base), count)
+    faces = []
+    for i in idx:
+        img = np.roll(base[i], tuple(rng.integers(-3, 4, 2)), axis=(0, 1)).astype(np.int16)
+        img += rng.integers(-10, 11, img.shape, dtype=np.int16)
+        faces.append(np.clip(img, 0, 255).astype(np.uint8))
+    return faces, labels[idx]
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark predict() của OpenCV và predict_batch()")
+    parser.add_argument("--data-dir", default="images", help="Thư mục ảnh mẫu (mặc định: images)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000], help="Số mẫu trong gallery")
+    parser.add_argument("--faces", type=int, default=4, help="Số khuôn mặt trong một khung hình")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    base, labels = np.zeros(0), np.zeros(0)
+    if os.path.isdir(args.data_dir):
+        base, labels, _ = FaceStore(args.data_dir).update()
+    if len(base) == 0:
+        print("Không có ảnh mẫu, dùng ảnh giả.")
+        base = synthetic_faces(50)
+        labels = np.arange(50, dtype=np.int32) % 10
+
+    rng = np.random.default_rng(1)
+    crops = [base[i] for i in rng.integers(0, len(base), args.faces)]
+
+    print(f"{'gallery':>8} {'cv2 predict (ms)':>17} {'predict_batch (ms)':>19} {'tăng tốc':>9} {'khớp':>5}")
+    for size in args.sizes:
+        faces, face_labels = make_gallery(base, np.asarray(labels), size)
+        rec = cv2.face.LBPHFaceRecognizer_create()
+        rec.train(faces, face_labels)
+        gallery = LBPHGallery.from_recognizer(rec)
+        gallery.predict_batch(crops[:1])  # tính trước tổng mỗi dòng
+
+        t_cv, ref = timed(lambda: [rec.predict(c) for c in crops], args.repeat)
+        t_np, (ids, confs) = timed(lambda: gallery.predict_batch(crops), args.repeat)
+        same = all(int(i) == r[0] and abs(c - r[1]) < 1e-3 for i, c, r in zip(ids, confs, ref))
+        print(f"{size:>8} {t_cv * 1000:>17.2f} {t_np * 1000:>19.2f} {t_cv / t_np:>8.2f}x {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""So sánh độ chính xác và thời gian nhận diện khi thu gọn mô hình thành prototype.
+
+Ảnh trong thư mục mẫu được chia theo từng người: cứ --test-every ảnh thì một ảnh dùng để
+kiểm tra, còn lại làm gallery. Với mỗi mức --levels (0 = giữ đủ mẫu) và mỗi cách thu gọn,
+in số dòng gallery, độ chính xác top-1 và thời gian predict trung bình mỗi khuôn mặt.
+--replicate R thêm R bản sao (dịch chuyển + nhiễu, ID mới) của mỗi người để giả lập
+danh sách lớn.
+
+Chạy từ thư mục gốc dự án: python bench/bench_prototypes.py --levels 0 1 3 5 10
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from face_store import FaceStore  # noqa: E402
+from lbph import LBPHGallery, compute_histogram  # noqa: E402
+from prototypes import METHODS, compress_gallery  # noqa: E402
+
+
+def augment(img, rng):
+    img = np.roll(img, tuple(rng.integers(-3, 4, 2)), axis=(0, 1)).astype(np.int16)
+    img += rng.integers(-10, 11, img.shape, dtype=np.int16)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def split(labels, test_every):
+    test = np.zeros(len(labels), bool)
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        test[idx[::test_every]] = True
+    return np.flatnonzero(~test), np.flatnonzero(test)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Độ chính xác / thời gian nhận diện theo số prototype mỗi người")
+    parser.add_argument("--data-dir", default="images", help="Thư mục ảnh mẫu (mặc định: images)")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 3, 5, 10],
+                        help="Số prototype mỗi người cần thử (0 = giữ đủ mẫu)")
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--test-every", type=int, default=5, help="Mỗi N ảnh của một người lấy 1 ảnh để kiểm tra")
+    parser.add_argument("--replicate", type=int, default=0, help="Số người giả thêm vào cho mỗi người thật")
+    args = parser.parse_args(argv)
+
+    faces, labels, _ = FaceStore(args.data_dir).update()
+    if len(faces) == 0:
+        print("Không có ảnh mẫu để đánh giá.")
+        return
+    labels = np.asarray(labels)
+    train_idx, test_idx = split(labels, args.test_every)
+    gallery_faces = [faces[i] for i in train_idx]
+    gallery_labels = list(labels[train_idx])
+    rng = np.random.default_rng(0)
+    offset = int(labels.max()) + 1
+    for r in range(1, args.replicate + 1):
+        for i in train_idx:
+            gallery_faces.append(augment(faces[i], rng))
+            gallery_labels.append(labels[i] + r * offset)
+
+    histograms = np.vstack([compute_histogram(np.stack(gallery_faces[i:i + 256]))
+                            for i in range(0, len(gallery_faces), 256)])
+    full = LBPHGallery(histograms, gallery_labels)
+    crops = [faces[i] for i in test_idx]
+    expected = labels[test_idx]
+    print(f"{len(np.unique(gallery_labels))} người, {len(full.labels)} mẫu gallery, {len(crops)} ảnh kiểm tra")
+
+    print(f"{'cách':>7} {'mức':>4} {'gallery':>8} {'top-1':>7} {'ms/khuôn mặt':>13} {'thu gọn (s)':>12}")
+    for method in args.methods:
+        for level in args.levels:
+            if level <= 0 and method != args.methods[0]:
+                continue
+            start = time.perf_counter()
+            gallery = full if level <= 0 else compress_gallery(full, level, method)
+            build_time = time.perf_counter() - start
+            gallery.predict_batch(crops[:1])
+            start = time.perf_counter()
+            ids, _ = gallery.predict_batch(crops)
+            per_face = (time.perf_counter() - start) / len(crops) * 1000
+            accuracy = float(np.mean(ids == expected))
+            name = "đủ" if level <= 0 else method
+            print(f"{name:>7} {level:>4} {len(gallery.labels):>8} {accuracy:>7.1%} {per_face:>13.2f} {build_time:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
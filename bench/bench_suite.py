@@ -0,0 +1,278 @@
+"""Bộ benchmark đầu-cuối: phát hiện khuôn mặt, nhận diện, huấn luyện, ghi điểm danh và báo cáo.
+
+Chạy không cần camera/cửa sổ, với dữ liệu giả hoặc dữ liệu có sẵn (--images cho ảnh mẫu,
+--frames cho video/thư mục ảnh camera đã ghi). Mọi file tạm (database, mô hình, ảnh) được
+tạo trong một thư mục tạm, không đụng tới data/ của dự án. Kết quả ghi ra JSON; --baseline
+so với một lần chạy trước và báo các chỉ số chậm đi quá --tolerance (thoát với mã 1).
+
+Chạy từ thư mục gốc dự án:
+    python bench/bench_suite.py --output bench_results.json
+    python bench/bench_suite.py --quick --only detection predict --baseline bench_results.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import datetime
+import tempfile
+import contextlib
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from detector import FaceDetector  # noqa: E402
+from frame_source import open_source  # noqa: E402
+from face_store import FaceStore, FACE_SIZE  # noqa: E402
+from lbph import LBPHGallery  # noqa: E402
+from bench_lbph import synthetic_faces, make_gallery, timed  # noqa: E402
+
+SUITES = ("detection", "predict", "training", "insert", "report")
+DEFAULTS = {
+    "resolutions": ["320x240", "640x480", "1280x720"],
+    "gallery_sizes": [100, 1000, 5000],
+    "train_sizes": [200, 1000, 3000],
+    "report_events": [10000, 100000],
+}
+QUICK = {
+    "resolutions": ["320x240", "640x480"],
+    "gallery_sizes": [100, 1000],
+    "train_sizes": [100, 500],
+    "report_events": [5000, 20000],
+}
+
+
+class Results:
+    "Các chỉ số theo tên dạng 'suite.tham_số.chỉ_số', kèm đơn vị và chiều tốt hơn (higher/lower)"
+
+    def __init__(self):
+        self.metrics = {}
+
+    def add(self, name, value, unit, better):
+        self.metrics[name] = {"value": round(float(value), 4), "unit": unit, "better": better}
+        print(f"  {name:<45} {value:>12.3f} {unit}")
+
+
+def quiet(fn, *args, **kwargs):
+    "Gọi hàm và bỏ phần in ra màn hình (build_model, export_report in tiến trình)"
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def load_frames(path, limit):
+    frames = []
+    if path:
+        source = open_source(path)
+        while len(frames) < limit:
+            ret, img = source.read()
+            if not ret:
+                break
+            frames.append(img)
+        source.release()
+    if not frames:
+        # khung hình giả: nền làm mịn cùng vài mảng sáng tối, đủ để cascade duyệt mọi tỉ lệ
+        rng = np.random.default_rng(0)
+        for _ in range(limit):
+            img = cv2.GaussianBlur(rng.integers(0, 256, (720, 1280), dtype=np.uint8), (9, 9), 0)
+            frames.append(cv2.cvtColor(img, cv2.COLOR_GRAY2BGR))
+    return frames
+
+
+def sample_faces(images_dir):
+    "Ảnh mẫu và nhãn từ --images, hoặc ảnh giả"
+    if images_dir and os.path.isdir(images_dir):
+        faces, labels, _ = quiet(FaceStore(images_dir, store_dir=os.path.join("data", "bench_store")).update)
+        if len(faces):
+            return np.asarray(faces), np.asarray(labels)
+    return synthetic_faces(50), np.arange(50, dtype=np.int32) % 10
+
+
+def bench_detection(results, args, sizes):
+    frames = load_frames(args.frames, args.frames_count)
+    detector = FaceDetector(cascade_threads=args.cascade_threads)
+    for spec in sizes["resolutions"]:
+        w, h = (int(v) for v in spec.split("x"))
+        grays = [cv2.cvtColor(cv2.resize(f, (w, h)), cv2.COLOR_BGR2GRAY) for f in frames]
+        detector.detect(grays[0])  # nạp cascade trước khi đo
+        elapsed, _ = timed(lambda: [detector.detect(g) for g in grays], 1)
+        results.add(f"detection.{spec}.fps", len(grays) / elapsed, "fps", "higher")
+    detector.close()
+
+
+def bench_predict(results, args, sizes):
+    base, labels = sample_faces(args.images)
+    rng = np.random.default_rng(1)
+    crops = [base[i] for i in rng.integers(0, len(base), args.faces)]
+    for size in sizes["gallery_sizes"]:
+        faces, face_labels = make_gallery(base, labels, size)
+        rec = cv2.face.LBPHFaceRecognizer_create()
+        rec.train(faces, face_labels)
+        gallery = LBPHGallery.from_recognizer(rec)
+        gallery.predict_batch(crops[:1])
+        t_cv, _ = timed(lambda: [rec.predict(c) for c in crops], args.repeat)
+        t_np, _ = timed(lambda: gallery.predict_batch(crops), args.repeat)
+        results.add(f"predict.{size}.cv2_ms_per_face", 1000 * t_cv / len(crops), "ms", "lower")
+        results.add(f"predict.{size}.batch_ms_per_face", 1000 * t_np / len(crops), "ms", "lower")
+
+
+def bench_training(results, args, sizes):
+    from model_builder import build_model
+    base, labels = sample_faces(args.images)
+    for count in sizes["train_sizes"]:
+        images_dir = os.path.join("train_images", str(count))
+        os.makedirs(images_dir, exist_ok=True)
+        faces, face_labels = make_gallery(base, labels, count)
+        for n, (face, label) in enumerate(zip(faces, face_labels)):
+            cv2.imwrite(os.path.join(images_dir, f"user.{label}.{n}.png"), cv2.resize(face, FACE_SIZE))
+        model_path = os.path.join("data", f"bench_{count}.yml")
+        store_dir = os.path.join("data", "face_store")
+        shutil.rmtree(store_dir, ignore_errors=True)
+        # lần đầu: đọc ảnh + huấn luyện toàn bộ; lần hai: không có gì đổi (chỉ kiểm tra manifest)
+        t_full, _ = timed(lambda: quiet(build_model, images_dir, model_path, full=True), 1)
+        t_noop, _ = timed(lambda: quiet(build_model, images_dir, model_path), 1)
+        # thêm 5% ảnh mới: cập nhật tăng dần
+        extra = max(1, count // 20)
+        for n, face in enumerate(faces[:extra]):
+            cv2.imwrite(os.path.join(images_dir, f"user.{face_labels[n]}.{count + n}.png"), cv2.resize(face, FACE_SIZE))
+        t_update, _ = timed(lambda: quiet(build_model, images_dir, model_path), 1)
+        results.add(f"training.{count}.full_s", t_full, "s", "lower")
+        results.add(f"training.{count}.noop_s", t_noop, "s", "lower")
+        results.add(f"training.{count}.update_s", t_update, "s", "lower")
+
+
+def bench_insert(results, args, sizes):
+    from database import get_db
+    db = get_db(os.path.join("data", "bench_insert.db"))
+    now = datetime.datetime.now()
+    rows = [(str(i % 500), now + datetime.timedelta(milliseconds=i), "Có mặt") for i in range(args.insert_rows)]
+    start = time.perf_counter()
+    for i in range(0, len(rows), args.insert_batch):
+        db.log_attendance_many(rows[i:i + args.insert_batch])
+    results.add(f"insert.batch{args.insert_batch}.rows_per_s", len(rows) / (time.perf_counter() - start),
+                "rows/s", "higher")
+    single = rows[:min(len(rows), 2000)]
+    start = time.perf_counter()
+    for user_id, when, status in single:
+        db.log_attendance(user_id, status, when)
+    results.add("insert.single.rows_per_s", len(single) / (time.perf_counter() - start), "rows/s", "higher")
+
+
+def bench_report(results, args, sizes):
+    from database import get_db
+    from reports import export_report
+    people = 500
+    for events in sizes["report_events"]:
+        db_path = os.path.join("data", f"bench_report_{events}.db")
+        db = get_db(db_path)
+        db.add_people([(str(i), f"Person {i}", None, None) for i in range(people)], replace=True)
+        rng = random.Random(0)
+        days = max(1, events // (people * 2))
+        end = datetime.datetime(2025, 1, 1) + datetime.timedelta(days=days - 1)
+        db.log_attendance_many([(str(rng.randrange(people)),
+                                 end - datetime.timedelta(days=rng.randrange(days), minutes=rng.randrange(600)),
+                                 "Có mặt") for _ in range(events)])
+        day = end.date().isoformat()
+        first = (end - datetime.timedelta(days=days - 1)).date().isoformat()
+        t_day, _ = timed(lambda: quiet(export_report, "report_day.xlsx", "daily", day, day, db_path=db_path),
+                      args.repeat)
+        t_range, _ = timed(lambda: quiet(export_report, "report_range.csv", "daily", first, day, db_path=db_path),
+                        args.repeat)
+        t_summary, _ = timed(lambda: quiet(export_report, "report_summary.csv", "summary", first, day,
+                                        db_path=db_path), args.repeat)
+        results.add(f"report.{events}.day_xlsx_s", t_day, "s", "lower")
+        results.add(f"report.{events}.range_csv_s", t_range, "s", "lower")
+        results.add(f"report.{events}.summary_csv_s", t_summary, "s", "lower")
+
+
+BENCHES = {"detection": bench_detection, "predict": bench_predict, "training": bench_training,
+           "insert": bench_insert, "report": bench_report}
+
+
+def compare(current, baseline, tolerance):
+    "In thay đổi so với baseline; trả về danh sách chỉ số bị chậm đi quá tolerance"
+    regressions = []
+    print(f"\n{'chỉ số':<45} {'baseline':>12} {'hiện tại':>12} {'thay đổi':>9}")
+    for name, metric in current.items():
+        old = baseline.get(name)
+        if old is None or not old["value"]:
+            continue
+        change = metric["value"] / old["value"] - 1
+        worse = -change if metric["better"] == "higher" else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  CHẬM HƠN"
+            regressions.append(name)
+        print(f"{name:<45} {old['value']:>12.3f} {metric['value']:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark đầu-cuối, kết quả JSON và so sánh với baseline")
+    parser.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES), help="Chỉ chạy các nhóm này")
+    parser.add_argument("--quick", action="store_true", help="Kích thước nhỏ để chạy nhanh (CI)")
+    parser.add_argument("--images", default=None, help="Thư mục ảnh mẫu thật (mặc định: ảnh giả)")
+    parser.add_argument("--frames", default=None, help="Video/thư mục ảnh camera đã ghi (mặc định: khung hình giả)")
+    parser.add_argument("--frames-count", type=int, default=10, help="Số khung hình dùng để đo detection")
+    parser.add_argument("--cascade-threads", type=int, default=3)
+    parser.add_argument("--faces", type=int, default=4, help="Số khuôn mặt mỗi lần predict")
+    parser.add_argument("--insert-rows", type=int, default=20000)
+    parser.add_argument("--insert-batch", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Ghi kết quả ra file JSON")
+    parser.add_argument("--baseline", default=None, help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Mức chậm đi cho phép so với baseline")
+    args = parser.parse_args(argv)
+
+    # đường dẫn người dùng truyền vào được đổi thành tuyệt đối trước khi chuyển sang thư mục tạm
+    for name in ("images", "frames", "output", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    sizes = QUICK if args.quick else DEFAULTS
+    results = Results()
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="face_bench_")
+    os.chdir(workdir)
+    try:
+        for suite in args.only:
+            print(f"[{suite}]")
+            start = time.perf_counter()
+            BENCHES[suite](results, args, sizes)
+            print(f"  ({time.perf_counter() - start:.1f}s)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "suites": args.only,
+        },
+        "metrics": results.metrics,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Đã ghi kết quả vào {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results.metrics, baseline["metrics"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} chỉ số chậm hơn baseline quá {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+        print("Không có chỉ số nào chậm hơn baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
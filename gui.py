@@ -1,88 +1,57 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox
 import subprocess
 import os
-import sqlite3
 import pandas as pd
 import datetime
 from tkinter import scrolledtext
 import sys
-import signal
 import threading
+import time
+import glob
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+from database import get_db
+from recognizer_client import send_command, is_running
+from reports import REPORT_KINDS, export_report, default_report_path
+from model_builder import shard_path, build_model, remove_model
+
+IMAGES_DIR = "images"
+MODEL_PATH = "data/trainingData.yml"
 
 
 def initialize_database():
     try:    
-        db_path = os.path.abspath("data/FaceBase.db")
-        if not os.path.exists(os.path.dirname(db_path)):
-            os.makedirs(os.path.dirname(db_path))
-            
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS People (
-            ID TEXT PRIMARY KEY,
-            Name TEXT,
-            Gender TEXT,
-            Age TEXT
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Attendance (
-            ID INTEGER PRIMARY KEY AUTOINCREMENT,
-            UserID TEXT,
-            RecognitionTime TIMESTAMP,
-            Status TEXT,
-            FOREIGN KEY (UserID) REFERENCES People(ID)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        # mở kết nối dùng chung, tạo bảng và bật WAL một lần khi khởi động
+        get_db()
         return True
     except Exception as e:
         print(f"Lỗi khi khởi tạo cơ sở dữ liệu: {e}")
         return False
 
-def generate_attendance_report(date_str=None):
-    "Hàm tạo báo cáo điểm danh"
+def generate_attendance_report(date_str=None, end_str=None, kind="daily"):
+    "Hàm tạo báo cáo điểm danh cho một ngày hoặc một khoảng ngày (tổng hợp bằng SQL, ghi file theo từng khối)"
     try:
         if date_str is None:
             date_str = datetime.datetime.now().strftime("%Y-%m-%d")
+        end_str = end_str or date_str
         
-        conn = sqlite3.connect("data/FaceBase.db")
-        all_people = pd.read_sql_query("SELECT ID, Name FROM People", conn)
-        query = "SELECT UserID, RecognitionTime, Status FROM Attendance WHERE DATE(RecognitionTime) = ?"
-        attendance = pd.read_sql_query(query, conn, params=(date_str,))
-        conn.close()
-        
-        attended = attendance.merge(all_people, left_on="UserID", right_on="ID", how="inner")
-        attended = attended[["Name", "RecognitionTime", "Status"]]
-        
-        not_attended = all_people[~all_people["ID"].isin(attendance["UserID"])][["Name"]]
-        not_attended["Status"] = "Not Attended"
-        
-        report = pd.concat([attended, not_attended.rename(columns={"Name": "Name"})])
-        report["Date"] = date_str
-        
-        report_file = f"Attendance_Report_{date_str}.xlsx"
-        report.to_excel(report_file, index=False)
-        print(f"Đã tạo báo cáo tại: {report_file}")
+        report_file = default_report_path(kind, date_str, end_str)
+        count = export_report(report_file, kind, date_str, end_str)
+        print(f"Đã tạo báo cáo tại: {report_file} ({count} dòng)")
         return report_file
     except Exception as e:
         print(f"Lỗi khi tạo báo cáo: {e}")
         return None
 
-# Biến để theo dõi quá trình nhận diện
+# Tiến trình nhận diện chạy nền (src/recognizer_daemon.py) do giao diện khởi động
 recognition_process = None
 
 def show_capture_input(root):
     "Hàm hiển thị cửa sổ nhập"
     capture_window = tk.Toplevel(root)
     capture_window.title("Thu thập dữ liệu khuôn mặt")
-    capture_window.geometry("500x400")
+    capture_window.geometry("500x440")
     capture_window.configure(bg="#f0f0f0")
 
     tk.Label(capture_window, text="Nhập thông tin người dùng:", font=("Arial", 12, "bold"), bg="#f0f0f0").pack(pady=10)
@@ -119,14 +88,13 @@ def show_capture_input(root):
     
     img_count_var.trace("w", update_count_label)
 
+    tk.Label(form_frame, text="Nhóm (tuỳ chọn):", bg="#f0f0f0", font=("Arial", 10)).grid(row=5, column=0, sticky="e", padx=5, pady=5)
+    group_entry = tk.Entry(form_frame, width=30)
+    group_entry.grid(row=5, column=1, sticky="w", padx=5, pady=5)
+
     def check_id_exists(id):
         try:
-            conn = sqlite3.connect("data/FaceBase.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM People WHERE ID = ?", (id,))
-            count = cursor.fetchone()[0]
-            conn.close()
-            return count > 0
+            return get_db().person_exists(id)
         except Exception as e:
             print(f"Lỗi khi kiểm tra ID: {e}")
             return False
@@ -137,10 +105,17 @@ def show_capture_input(root):
         gender = gender_var.get()
         age = age_entry.get()
         img_count = int(img_count_var.get())
+        group = group_entry.get().strip()
         
         if not user_id or not name or not age:
             messagebox.showwarning("Cảnh báo", "Vui lòng nhập đầy đủ ID, Tên và Tuổi!")
             return
+        if group:
+            try:
+                shard_path(group)
+            except ValueError as e:
+                messagebox.showerror("Lỗi", str(e))
+                return
             
         # check ID đã tồn tại chưa
         if check_id_exists(user_id):
@@ -152,16 +127,15 @@ def show_capture_input(root):
         
         try:
             # thêm người dùng vào cơ sở dữ liệu
-            conn = sqlite3.connect("data/FaceBase.db")
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO People (ID, Name, Gender, Age) VALUES (?, ?, ?, ?)", 
-                           (user_id, name, gender, age))
-            conn.commit()
-            conn.close()
+            get_db().add_person(user_id, name, gender, age)
             
             # chạy script thu thập dữ liệu
             script_path = os.path.abspath("src/dataset.py")
-            subprocess.run([sys.executable, script_path, user_id, name, str(img_count)])
+            # dataset.py: <user_id> <name> [số ảnh] [--group nhóm]
+            command = [sys.executable, script_path, user_id, name, str(img_count)]
+            if group:
+                command += ["--group", group]
+            subprocess.run(command)
             
             messagebox.showinfo("Thành công", "Thu thập dữ liệu khuôn mặt hoàn tất!")
             log_text.insert(tk.END, "Thu thập dữ liệu hoàn tất!\n")
@@ -264,112 +238,141 @@ def show_train_input(root):
     train_window.transient(root)
     train_window.grab_set()
 
-def start_recognition():
+def launch_recognizer():
+    "Khởi động tiến trình nhận diện chạy nền nếu chưa có; nhật ký của nó được đưa vào khung log"
     global recognition_process
-    
     if recognition_process is not None and recognition_process.poll() is None:
-        messagebox.showinfo("Thông báo", "Quá trình nhận diện đang chạy!")
         return
-    
+    if is_running():
+        return
+    script_path = os.path.abspath("src/recognizer_daemon.py")
+    process = subprocess.Popen([sys.executable, "-u", script_path, "serve"],
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               universal_newlines=True)
+    recognition_process = process
+
+    def read_output():
+        for line in process.stdout:
+            log_text.insert(tk.END, line)
+            log_text.see(tk.END)
+
+    threading.Thread(target=read_output, daemon=True).start()
+
+def wait_for_recognizer(on_done, timeout=30.0):
+    "Chờ tiến trình nhận diện sẵn sàng nhận lệnh bằng after() (giao diện không bị treo), rồi gọi on_done(True/False)"
+    deadline = time.time() + timeout
+
+    def poll():
+        if is_running():
+            on_done(True)
+        elif time.time() >= deadline or (recognition_process is not None and recognition_process.poll() is not None):
+            on_done(False)
+        else:
+            log_text.after(200, poll)
+    poll()
+
+def start_recognition():
     try:
-        script_path = os.path.abspath("src/recognize.py")
-        log_text.insert(tk.END, f"Đang thử mở file: {script_path}\n")
+        launch_recognizer()
+    except Exception as e:
+        messagebox.showerror("Lỗi", f"Lỗi khi bắt đầu nhận diện: {e}")
+        log_text.insert(tk.END, f"Lỗi chi tiết: {str(e)}\n")
         log_text.see(tk.END)
-        
-        recognition_process = subprocess.Popen([sys.executable, script_path], 
-                                             stdout=subprocess.PIPE, 
-                                             stderr=subprocess.PIPE,
-                                             universal_newlines=True)
-        
-        stderr_output = ""
-        while recognition_process.poll() is None:
-            stderr_line = recognition_process.stderr.readline()
-            if stderr_line:
-                stderr_output += stderr_line
-                log_text.insert(tk.END, f"Lỗi: {stderr_line}")
-                log_text.see(tk.END)
-            else:
-                break
-        
-        if stderr_output:
-            messagebox.showerror("Lỗi khi khởi động", stderr_output)
+        return
+    wait_for_recognizer(send_start)
+
+def send_start(ready):
+    if not ready:
+        messagebox.showerror("Lỗi khi khởi động", "Không khởi động được tiến trình nhận diện, xem nhật ký hoạt động.")
+        return
+    try:
+        # detector và mô hình đã nằm sẵn trong tiến trình nền nên phiên mới bắt đầu ngay
+        response = send_command("start", args=[])
+        if not response["ok"]:
+            messagebox.showinfo("Thông báo", response["error"])
             return
-        
         log_text.insert(tk.END, "Đã bắt đầu quá trình nhận diện khuôn mặt...\n")
         log_text.see(tk.END)
         
-        def read_output():
-            while recognition_process and recognition_process.poll() is None:
-                output = recognition_process.stdout.readline()
-                if output:
-                    log_text.insert(tk.END, output)
-                    log_text.see(tk.END)
-        
-        threading.Thread(target=read_output, daemon=True).start()
-        
     except Exception as e:
         messagebox.showerror("Lỗi", f"Lỗi khi bắt đầu nhận diện: {e}")
         log_text.insert(tk.END, f"Lỗi chi tiết: {str(e)}\n")
         log_text.see(tk.END)
 
 def stop_recognition():
-    global recognition_process
-    
-    if recognition_process is not None and recognition_process.poll() is None:
-        try:
-            if sys.platform == "win32":
-                recognition_process.terminate()
-            else:
-                os.kill(recognition_process.pid, signal.SIGTERM)
-                
-            log_text.insert(tk.END, "Đã dừng quá trình nhận diện khuôn mặt.\n")
-            log_text.see(tk.END)
-            recognition_process = None
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Lỗi khi dừng nhận diện: {e}")
-            log_text.insert(tk.END, f"Lỗi: {e}\n")
-            log_text.see(tk.END)
+    try:
+        response = send_command("stop")
+    except (OSError, EOFError):
+        response = {"ok": False, "error": "Không có quá trình nhận diện nào đang chạy!"}
+    if response["ok"]:
+        # chỉ dừng phiên, tiến trình nền vẫn giữ mô hình cho lần bắt đầu sau
+        log_text.insert(tk.END, "Đã dừng quá trình nhận diện khuôn mặt.\n")
+        log_text.see(tk.END)
     else:
-        messagebox.showinfo("Thông báo", "Không có quá trình nhận diện nào đang chạy!")
+        messagebox.showinfo("Thông báo", response["error"])
+
+def shutdown_recognizer():
+    "Tắt tiến trình nhận diện nền do giao diện khởi động (ghi nốt dữ liệu điểm danh trước khi thoát)"
+    global recognition_process
+    if recognition_process is None or recognition_process.poll() is not None:
+        return
+    try:
+        send_command("shutdown")
+        recognition_process.wait(timeout=10)
+    except Exception:
+        recognition_process.terminate()
+    recognition_process = None
 
 def show_report_dialog(root):
     report_window = tk.Toplevel(root)
     report_window.title("Tạo báo cáo điểm danh")
-    report_window.geometry("400x200")
+    report_window.geometry("400x300")
     report_window.configure(bg="#f0f0f0")
 
-    tk.Label(report_window, text="Chọn ngày tạo báo cáo:", font=("Arial", 12, "bold"), bg="#f0f0f0").pack(pady=10)
-    
-    date_frame = tk.Frame(report_window, bg="#f0f0f0")
-    date_frame.pack(pady=10)
+    tk.Label(report_window, text="Chọn khoảng ngày tạo báo cáo:", font=("Arial", 12, "bold"), bg="#f0f0f0").pack(pady=10)
     
     today = datetime.datetime.now()
     
-    day_var = tk.StringVar(value=str(today.day).zfill(2))
-    month_var = tk.StringVar(value=str(today.month).zfill(2))
-    year_var = tk.StringVar(value=str(today.year))
-    
     days = [str(i).zfill(2) for i in range(1, 32)]
     months = [str(i).zfill(2) for i in range(1, 13)]
     years = [str(i) for i in range(2020, today.year + 1)]
     
-    ttk.Combobox(date_frame, textvariable=day_var, values=days, width=3).pack(side="left", padx=2)
-    tk.Label(date_frame, text="/", bg="#f0f0f0").pack(side="left")
-    ttk.Combobox(date_frame, textvariable=month_var, values=months, width=3).pack(side="left", padx=2)
-    tk.Label(date_frame, text="/", bg="#f0f0f0").pack(side="left")
-    ttk.Combobox(date_frame, textvariable=year_var, values=years, width=5).pack(side="left", padx=2)
+    def date_picker(label):
+        date_frame = tk.Frame(report_window, bg="#f0f0f0")
+        date_frame.pack(pady=5)
+        tk.Label(date_frame, text=label, width=8, anchor="e", bg="#f0f0f0").pack(side="left")
+        
+        day_var = tk.StringVar(value=str(today.day).zfill(2))
+        month_var = tk.StringVar(value=str(today.month).zfill(2))
+        year_var = tk.StringVar(value=str(today.year))
+        
+        ttk.Combobox(date_frame, textvariable=day_var, values=days, width=3).pack(side="left", padx=2)
+        tk.Label(date_frame, text="/", bg="#f0f0f0").pack(side="left")
+        ttk.Combobox(date_frame, textvariable=month_var, values=months, width=3).pack(side="left", padx=2)
+        tk.Label(date_frame, text="/", bg="#f0f0f0").pack(side="left")
+        ttk.Combobox(date_frame, textvariable=year_var, values=years, width=5).pack(side="left", padx=2)
+        return lambda: f"{year_var.get()}-{month_var.get()}-{day_var.get()}"
+    
+    get_start = date_picker("Từ ngày:")
+    get_end = date_picker("Đến ngày:")
+    
+    kind_frame = tk.Frame(report_window, bg="#f0f0f0")
+    kind_frame.pack(pady=5)
+    tk.Label(kind_frame, text="Loại:", width=8, anchor="e", bg="#f0f0f0").pack(side="left")
+    kind_var = tk.StringVar(value="daily")
+    # daily: mỗi người mỗi ngày một dòng, summary: số buổi có mặt của mỗi người trong khoảng ngày
+    ttk.Combobox(kind_frame, textvariable=kind_var, values=REPORT_KINDS, width=10, state="readonly").pack(side="left", padx=2)
     
     def generate_report():
         try:
-            day = day_var.get()
-            month = month_var.get()
-            year = year_var.get()
-            date_str = f"{year}-{month}-{day}"
+            date_str = get_start()
+            end_str = get_end()
             
-            log_text.insert(tk.END, f"Đang tạo báo cáo điểm danh cho ngày {date_str}...\n")
+            log_text.insert(tk.END, f"Đang tạo báo cáo điểm danh từ {date_str} đến {end_str}...\n")
             log_text.see(tk.END)
             
-            report_file = generate_attendance_report(date_str)
+            report_file = generate_attendance_report(date_str, end_str, kind_var.get())
             
             if report_file:
                 messagebox.showinfo("Thành công", f"Đã tạo báo cáo điểm danh: {report_file}")
@@ -393,11 +396,29 @@ def show_report_dialog(root):
     report_window.transient(root)
     report_window.grab_set()
 
+def rebuild_models(groups):
+    """Huấn luyện lại mô hình chung và mô hình của các nhóm sau khi xoá ảnh của một người
+    (build_model thấy mẫu bị xoá nên huấn luyện lại toàn bộ). Mô hình không còn ảnh nào bị xoá
+    luôn để người đã xoá không còn được nhận diện. Chạy trên luồng riêng."""
+    def log(message):
+        def write():
+            log_text.insert(tk.END, message + "\n")
+            log_text.see(tk.END)
+        log_text.after(0, write)
+    try:
+        targets = [(MODEL_PATH, None)] + [(shard_path(group), get_db().group_members(group)) for group in groups]
+        for model_path, members in targets:
+            if members == [] or build_model(IMAGES_DIR, model_path, user_ids=members) is None:
+                remove_model(model_path)
+                log(f"Không còn ảnh để huấn luyện, đã xoá mô hình {model_path}")
+            else:
+                log(f"Đã huấn luyện lại mô hình {model_path}")
+    except Exception as e:
+        log(f"Lỗi khi huấn luyện lại mô hình: {e}")
+
 def show_user_list(root):
     try:
-        conn = sqlite3.connect("data/FaceBase.db")
-        users_df = pd.read_sql_query("SELECT ID, Name, Gender, Age FROM People", conn)
-        conn.close()
+        users_df = pd.DataFrame(get_db().list_people(), columns=["ID", "Name", "Gender", "Age"])
         
         user_window = tk.Toplevel(root)
         user_window.title("Danh sách người dùng")
@@ -441,26 +462,22 @@ def show_user_list(root):
                 return
                 
             try:
-                conn = sqlite3.connect("data/FaceBase.db")
-                cursor = conn.cursor()
-                
-                cursor.execute("DELETE FROM Attendance WHERE UserID = ?", (user_id,))
-                
-                cursor.execute("DELETE FROM People WHERE ID = ?", (user_id,))
-                
-                conn.commit()
-                conn.close()
-                
-                data_dir = os.path.join("dataset", str(user_id))
-                if os.path.exists(data_dir):
-                    import shutil
-                    shutil.rmtree(data_dir)
-                
+                db = get_db()
+                # nhóm có người này: mô hình riêng của nhóm cũng phải huấn luyện lại
+                groups = [name for name, _ in db.list_groups() if str(user_id) in db.group_members(name)]
+                db.delete_person(str(user_id))
+
+                images = glob.glob(os.path.join(IMAGES_DIR, f"user.{user_id}.*"))
+                for path in images:
+                    os.remove(path)
+
                 tree.delete(selected_item[0])
-                
-                log_text.insert(tk.END, f"Đã xóa người dùng {user_name} (ID: {user_id})\n")
+
+                log_text.insert(tk.END, f"Đã xóa người dùng {user_name} (ID: {user_id}) và {len(images)} ảnh, "
+                                        "đang huấn luyện lại mô hình...\n")
                 log_text.see(tk.END)
-                
+                threading.Thread(target=rebuild_models, args=(groups,), daemon=True).start()
+
                 messagebox.showinfo("Thành công", f"Đã xóa người dùng {user_name}")
             except Exception as e:
                 messagebox.showerror("Lỗi", f"Lỗi khi xóa người dùng: {e}")
@@ -528,6 +545,8 @@ def main():
     log_text = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, width=70, height=12)
     log_text.pack(padx=10, pady=10, fill="both", expand=True)
     log_text.insert(tk.END, "Hệ thống đã khởi động...\n")
+    # nạp sẵn detector/mô hình ở tiến trình nền để lần bắt đầu nhận diện đầu tiên không phải chờ
+    launch_recognizer()
     
     info_frame = tk.Frame(root, bg="#f0f0f0")
     info_frame.pack(pady=5, fill="x")
@@ -536,8 +555,7 @@ def main():
     tk.Label(info_frame, text="© 2025", font=("Arial", 8), bg="#f0f0f0").pack(side="right", padx=20)
     
     def on_closing():
-        if recognition_process is not None and recognition_process.poll() is None:
-            stop_recognition()
+        shutdown_recognizer()
         root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
@@ -0,0 +1,94 @@
+import numpy as np
+
+# chỉ tạo index khi gallery đủ lớn để quét toàn bộ bắt đầu tốn thời gian
+ANN_MIN_SAMPLES = 2000
+KMEANS_SAMPLE = 20000
+
+
+def embed(histograms):
+    "Biến đổi sqrt (Hellinger): khoảng cách L2 giữa các vector này xấp xỉ tốt khoảng cách chi-square"
+    return np.sqrt(np.asarray(histograms, np.float32))
+
+
+def nearest_centroids(points, centroids, count=1):
+    "Chỉ số count tâm gần nhất (L2) của mỗi điểm, gần nhất đứng trước"
+    # |c|^2 - 2 x.c (bỏ |x|^2 vì không đổi theo tâm), tính bằng một phép nhân ma trận
+    scores = (centroids * centroids).sum(axis=1)[None, :] - 2.0 * points @ centroids.T
+    if count >= scores.shape[1]:
+        return np.argsort(scores, axis=1)
+    nearest = np.argpartition(scores, count - 1, axis=1)[:, :count]
+    order = np.argsort(np.take_along_axis(scores, nearest, axis=1), axis=1)
+    return np.take_along_axis(nearest, order, axis=1)
+
+
+def kmeans(points, k, iterations=10, seed=0):
+    "k-means đơn giản bằng NumPy, khởi tạo bằng các điểm ngẫu nhiên"
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = nearest_centroids(points, centroids)[:, 0]
+        counts = np.bincount(assignment, minlength=k)
+        # tổng điểm của mỗi cụm bằng một phép nhân ma trận one-hot (nhanh hơn nhiều so với np.add.at)
+        onehot = np.zeros((k, len(points)), np.float32)
+        onehot[assignment, np.arange(len(points))] = 1.0
+        sums = onehot @ points
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # cụm rỗng: lấy lại một điểm ngẫu nhiên
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Index inverted-file cho gallery LBPH.
+
+    Các histogram được gom thành nlist cụm (k-means trên sqrt histogram). Gallery được sắp
+    lại theo cụm để mỗi danh sách là một đoạn dòng liên tục [offsets[i], offsets[i+1]).
+    Khi nhận diện chỉ nprobe cụm gần query nhất được so khớp chính xác bằng chi-square.
+    """
+
+    def __init__(self, centroids, offsets, nprobe=8):
+        self.centroids = np.asarray(centroids, np.float32)
+        self.offsets = np.asarray(offsets, np.int64)
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, histograms, nlist=0, nprobe=0, iterations=10, seed=0):
+        """Tạo index, trả về (index, order): order là thứ tự mới của các dòng gallery.
+
+        nlist=0 chọn khoảng sqrt(N) cụm; nprobe=0 mặc định dò 1/8 số cụm (tối thiểu 1).
+        """
+        n = len(histograms)
+        nlist = min(n, nlist or max(1, int(round(np.sqrt(n)))))
+        points = np.vstack([embed(histograms[i:i + 4096]) for i in range(0, n, 4096)])
+        rng = np.random.default_rng(seed)
+        sample = points if n <= KMEANS_SAMPLE else points[rng.choice(n, KMEANS_SAMPLE, replace=False)]
+        centroids = kmeans(sample, nlist, iterations, seed)
+        assignment = np.concatenate([nearest_centroids(points[i:i + 4096], centroids)[:, 0]
+                                     for i in range(0, n, 4096)])
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.zeros(nlist + 1, np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=offsets[1:])
+        return cls(centroids, offsets, nprobe or max(1, nlist // 8)), order
+
+    def probe(self, queries, nprobe=0):
+        "Các đoạn dòng gallery cần so khớp cho mỗi query: list các list (start, end)"
+        nprobe = min(self.nlist, nprobe or self.nprobe)
+        lists = nearest_centroids(embed(queries), self.centroids, nprobe)
+        return [[(int(self.offsets[i]), int(self.offsets[i + 1])) for i in row
+                 if self.offsets[i + 1] > self.offsets[i]] for row in lists]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, nprobe=self.nprobe)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], int(data["nprobe"]))
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+from database import DB_PATH, get_db
+
+ARCHIVE_PATH = "data/attendance_archive.db"
+
+
+def print_status(db):
+    events, oldest = db.query("SELECT COUNT(*), MIN(RecognitionTime) FROM Attendance")[0]
+    days, summary_rows = db.query("SELECT COUNT(DISTINCT Day), COUNT(*) FROM DailyAttendance")[0]
+    print(f"Attendance: {events} lượt điểm danh" + (f", cũ nhất {str(oldest)[:10]}" if oldest else ""))
+    print(f"DailyAttendance: {summary_rows} dòng tổng hợp cho {days} ngày")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bảo trì bảng điểm danh: tổng hợp theo ngày và lưu trữ lượt điểm danh cũ')
+    parser.add_argument('--db', default=DB_PATH, help='Đường dẫn database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('status', help='Số lượt điểm danh và số dòng tổng hợp')
+    sub.add_parser('backfill', help='Tính lại DailyAttendance từ các lượt điểm danh còn trong Attendance')
+    compact = sub.add_parser('compact', help='Chuyển lượt điểm danh cũ sang database lưu trữ (tổng hợp theo ngày được giữ)')
+    compact.add_argument('--keep-days', type=int, default=90, help='Giữ lại lượt điểm danh của N ngày gần nhất')
+    compact.add_argument('--archive', default=ARCHIVE_PATH, help='Database lưu trữ')
+    compact.add_argument('--vacuum', action='store_true', help='VACUUM để trả lại dung lượng sau khi xoá')
+    args = parser.parse_args(argv)
+
+    db = get_db(args.db)
+    start = time.perf_counter()
+    if args.command == 'status':
+        print_status(db)
+        return 0
+    if args.command == 'backfill':
+        rows = db.rebuild_daily_summary()
+        print(f"Đã tổng hợp {rows} dòng DailyAttendance trong {time.perf_counter() - start:.2f}s")
+        return 0
+
+    # chống trùng khi nhận diện cần các lượt điểm danh của hôm nay
+    if args.keep_days < 1:
+        print("--keep-days phải lớn hơn hoặc bằng 1")
+        return 1
+    before = (datetime.date.today() - datetime.timedelta(days=args.keep_days)).isoformat()
+    # bảo đảm các ngày sắp lưu trữ đã có trong bảng tổng hợp trước khi xoá lượt điểm danh
+    db.rebuild_daily_summary(before)
+    moved = db.archive_attendance(before, args.archive)
+    print(f"Đã chuyển {moved} lượt điểm danh trước {before} sang {args.archive} "
+          f"trong {time.perf_counter() - start:.2f}s")
+    if args.vacuum and moved:
+        size = os.path.getsize(db.path)
+        with db.lock:
+            db.conn.execute("VACUUM")
+        print(f"Database: {size / 1e6:.1f}MB -> {os.path.getsize(db.path) / 1e6:.1f}MB")
+    print_status(db)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
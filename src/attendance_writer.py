@@ -0,0 +1,187 @@
+import os
+import csv
+import queue
+import threading
+import time
+import datetime
+
+CSV_COLUMNS = ["UserID", "Name", "Age", "Gender", "Confidence", "Status", "RecognitionTime"]
+
+_FLUSH = object()
+_STOP = object()
+
+
+class AttendanceWriter:
+    """Ghi điểm danh vào SQLite và attendance.csv ở một luồng nền, theo lô.
+
+    log() chỉ đưa bản ghi vào hàng đợi trong bộ nhớ nên không chặn vòng lặp khung hình.
+    Luồng nền gom bản ghi và ghi khi đủ batch_size hoặc sau flush_interval giây: SQLite
+    bằng một executemany trong một transaction, CSV qua một file handle mở sẵn.
+    close() (gọi khi thoát hoặc khi nhận SIGTERM) ghi nốt toàn bộ bản ghi còn lại.
+    """
+
+    def __init__(self, db, csv_path="attendance.csv", batch_size=32, flush_interval=1.0):
+        self.db = db
+        self.csv_path = csv_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self.csv_file = None
+        self.csv_writer = None
+        self.written = 0
+        self.batches = 0
+        self.closed = False
+        self.close_lock = threading.Lock()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def log(self, user_id, name, age, gender, confidence, status="Có mặt", csv_status="Đã điểm danh"):
+        "Đưa một lượt điểm danh vào hàng đợi ghi"
+        self.queue.put((user_id, name, age, gender, confidence, status, csv_status,
+                        datetime.datetime.now()))
+
+    def flush(self, timeout=None):
+        "Yêu cầu ghi ngay mọi bản ghi đang chờ và đợi ghi xong"
+        done = threading.Event()
+        self.queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self):
+        with self.close_lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        else:
+            # luồng nền chưa chạy: ghi trực tiếp phần còn lại
+            pending = []
+            while not self.queue.empty():
+                item = self.queue.get()
+                if isinstance(item, tuple) and item[0] is _FLUSH:
+                    item[1].set()
+                elif item is not _STOP:
+                    pending.append(item)
+            self._write(pending)
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._write(pending)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                self._write(pending)
+                pending, deadline = [], None
+                item[1].set()
+                continue
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(pending)
+                pending, deadline = [], None
+
+    def _open_csv(self):
+        if self.csv_file is None:
+            new_file = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+            self.csv_file = open(self.csv_path, "a", newline="", encoding="utf-8")
+            self.csv_writer = csv.writer(self.csv_file)
+            if new_file:
+                self.csv_writer.writerow(CSV_COLUMNS)
+                print(f"Đã tạo mới file {self.csv_path}")
+        return self.csv_writer
+
+    def _write(self, records):
+        if not records:
+            return
+        try:
+            self.db.log_attendance_many([(r[0], r[7], r[5]) for r in records])
+        except Exception as e:
+            print(f"Lỗi khi lưu vào SQLite: {e}")
+        try:
+            writer = self._open_csv()
+            writer.writerows([(r[0], r[1], r[2], r[3], r[4], r[6], r[7]) for r in records])
+            self.csv_file.flush()
+        except Exception as e:
+            print(f"Lỗi khi lưu vào CSV: {e}")
+        self.written += len(records)
+        self.batches += 1
+        ids = ", ".join(str(r[0]) for r in records)
+        print(f"Đã lưu {len(records)} lượt điểm danh vào SQLite và {self.csv_path} (ID: {ids})")
+
+
+def parse_time(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value))
+
+
+class AttendanceDedup:
+    """Chống điểm danh trùng, giữ được qua các lần khởi động lại recognize.py.
+
+    Mỗi người chỉ được điểm danh một lần trong mỗi khung thời gian window_minutes tính
+    từ nửa đêm (mặc định 1440 = một lần mỗi ngày; vd. 90 cho mỗi tiết học 90 phút).
+    Khi khởi tạo, các lượt điểm danh của khung hiện tại được nạp từ bảng Attendance bằng
+    một truy vấn dùng index (UserID, RecognitionTime); sau đó mọi kiểm tra chỉ dùng bộ nhớ.
+    """
+
+    def __init__(self, db, window_minutes=1440):
+        self.db = db
+        self.window_minutes = max(1, min(window_minutes, 1440))
+        self.marked = set()
+        self.lock = threading.Lock()
+        self.current_window = None
+        self.load()
+
+    def window_key(self, when):
+        slot = (when.hour * 60 + when.minute) // self.window_minutes
+        return when.date(), slot
+
+    def window_start(self, when):
+        date, slot = self.window_key(when)
+        minutes = slot * self.window_minutes
+        return datetime.datetime.combine(date, datetime.time(minutes // 60, minutes % 60))
+
+    def load(self, now=None):
+        now = now or datetime.datetime.now()
+        rows = self.db.attendance_since(self.window_start(now))
+        with self.lock:
+            self.current_window = self.window_key(now)
+            self.marked = {(str(user_id), self.window_key(parse_time(when))) for user_id, when in rows}
+        return len(rows)
+
+    def mark(self, user_id, when=None):
+        "Trả về True nếu người này chưa được điểm danh trong khung hiện tại (và đánh dấu luôn)"
+        when = when or datetime.datetime.now()
+        key = (str(user_id), self.window_key(when))
+        with self.lock:
+            if key[1] != self.current_window:
+                # sang khung thời gian mới: bỏ các khoá cũ để set không phình ra
+                self.current_window = key[1]
+                self.marked = {k for k in self.marked if k[1] == key[1]}
+            if key in self.marked:
+                return False
+            self.marked.add(key)
+            return True
+
+    def is_marked(self, user_id, when=None):
+        when = when or datetime.datetime.now()
+        with self.lock:
+            return (str(user_id), self.window_key(when)) in self.marked
@@ -0,0 +1,379 @@
+import os
+import sqlite3
+import threading
+import datetime
+import time
+from collections import OrderedDict
+
+DB_PATH = "data/FaceBase.db"
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS People (
+        ID TEXT PRIMARY KEY,
+        Name TEXT,
+        Gender TEXT,
+        Age TEXT
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Attendance (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        UserID TEXT,
+        RecognitionTime TIMESTAMP,
+        Status TEXT,
+        FOREIGN KEY (UserID) REFERENCES People(ID)
+    )
+    ''',
+    # tra cứu điểm danh theo người và thời gian (nạp chống trùng khi khởi động, báo cáo)
+    '''
+    CREATE INDEX IF NOT EXISTS idx_attendance_user_time ON Attendance (UserID, RecognitionTime)
+    ''',
+    # báo cáo theo khoảng ngày (reports.py): quét theo thời gian, index phủ luôn UserID
+    '''
+    CREATE INDEX IF NOT EXISTS idx_attendance_time_user ON Attendance (RecognitionTime, UserID)
+    ''',
+    # tổng hợp theo ngày (mỗi người mỗi ngày một dòng) cho báo cáo; vẫn giữ khi Attendance được lưu trữ/xoá bớt
+    '''
+    CREATE TABLE IF NOT EXISTS DailyAttendance (
+        Day TEXT,
+        UserID TEXT,
+        FirstSeen TIMESTAMP,
+        LastSeen TIMESTAMP,
+        Count INTEGER,
+        PRIMARY KEY (Day, UserID)
+    )
+    ''',
+    # cập nhật DailyAttendance trong cùng transaction với mỗi lượt điểm danh, kể cả từ tiến trình khác
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_attendance_daily AFTER INSERT ON Attendance
+    BEGIN
+        INSERT INTO DailyAttendance (Day, UserID, FirstSeen, LastSeen, Count)
+        VALUES (substr(NEW.RecognitionTime, 1, 10), NEW.UserID, NEW.RecognitionTime, NEW.RecognitionTime, 1)
+        ON CONFLICT (Day, UserID) DO UPDATE SET
+            FirstSeen = MIN(FirstSeen, excluded.FirstSeen),
+            LastSeen = MAX(LastSeen, excluded.LastSeen),
+            Count = Count + 1;
+    END
+    ''',
+    # nhóm (lớp/phòng): mỗi nhóm có một mô hình riêng trong data/models/<nhóm>.*
+    '''
+    CREATE TABLE IF NOT EXISTS GroupMembers (
+        GroupName TEXT,
+        UserID TEXT,
+        PRIMARY KEY (GroupName, UserID),
+        FOREIGN KEY (UserID) REFERENCES People(ID)
+    )
+    ''',
+]
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",     # gui.py và recognize.py đọc/ghi đồng thời không chặn nhau
+    "PRAGMA synchronous=NORMAL",   # an toàn với WAL, ít fsync hơn FULL
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",     # ~8MB page cache
+]
+
+
+class Database:
+    """Kết nối SQLite dùng lâu dài cho cả gui.py, dataset.py và recognize.py.
+
+    Schema và pragma chỉ chạy một lần khi mở; sqlite3 tự cache các câu lệnh đã chuẩn bị
+    theo connection nên các truy vấn lặp lại trong vòng lặp khung hình không phải parse lại.
+    Connection được dùng chung giữa các luồng và được bảo vệ bằng lock.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = os.path.abspath(path)
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                    cached_statements=256)
+        self.lock = threading.RLock()
+        # tăng mỗi khi chính connection này sửa bảng People (data_version chỉ đổi khi connection khác ghi)
+        self.people_generation = 0
+        with self.lock:
+            for pragma in PRAGMAS:
+                self.conn.execute(pragma)
+            self.init_schema()
+
+    def init_schema(self):
+        self.migrate_attendance()
+        with self.lock, self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        # database cũ (có Attendance từ trước khi có bảng tổng hợp): tổng hợp một lần
+        with self.lock:
+            empty = self.conn.execute("SELECT 1 FROM DailyAttendance LIMIT 1").fetchone() is None
+            has_events = self.conn.execute("SELECT 1 FROM Attendance LIMIT 1").fetchone() is not None
+        if empty and has_events:
+            self.rebuild_daily_summary()
+
+    def migrate_attendance(self):
+        """Bảng Attendance cũ (UserID, RecognitionTime, Status) không có cột ID AUTOINCREMENT nên
+        rowid bị dùng lại sau khi xoá hết các dòng cuối bảng; chuyển sang schema mới, giữ nguyên rowid."""
+        with self.lock:
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(Attendance)")]
+            if not columns or "ID" in columns:
+                return
+            with self.conn:
+                self.conn.execute("BEGIN")
+                # index/trigger đi theo bảng khi đổi tên: xoá trước để SCHEMA tạo lại trên bảng mới
+                self.conn.execute("DROP TRIGGER IF EXISTS trg_attendance_daily")
+                self.conn.execute("DROP INDEX IF EXISTS idx_attendance_user_time")
+                self.conn.execute("DROP INDEX IF EXISTS idx_attendance_time_user")
+                self.conn.execute("ALTER TABLE Attendance RENAME TO Attendance_legacy")
+                self.conn.execute(SCHEMA[1])
+                self.conn.execute("INSERT INTO Attendance (ID, UserID, RecognitionTime, Status) "
+                                  "SELECT rowid, UserID, RecognitionTime, Status FROM Attendance_legacy ORDER BY rowid")
+                self.conn.execute("DROP TABLE Attendance_legacy")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def integrity_ok(self):
+        with self.lock:
+            return self.conn.execute("PRAGMA integrity_check;").fetchone()[0] == "ok"
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def data_version(self):
+        "Giá trị đổi mỗi khi một connection/tiến trình khác commit thay đổi vào file database"
+        with self.lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # People
+
+    def person_exists(self, user_id):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM People WHERE ID = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def get_person(self, user_id):
+        "Trả về (ID, Name, Gender, Age) hoặc None"
+        with self.lock:
+            return self.conn.execute("SELECT ID, Name, Gender, Age FROM People WHERE ID = ?",
+                                     (user_id,)).fetchone()
+
+    def list_people(self):
+        with self.lock:
+            return self.conn.execute("SELECT ID, Name, Gender, Age FROM People").fetchall()
+
+    def add_person(self, user_id, name, gender=None, age=None, replace=False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        with self.lock, self.conn:
+            self.conn.execute(f"{verb} INTO People (ID, Name, Gender, Age) VALUES (?, ?, ?, ?)",
+                              (user_id, name, gender, age))
+            self.people_generation += 1
+
+    def add_people(self, rows, replace=False):
+        "Thêm nhiều người (ID, Name, Gender, Age) trong một transaction"
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        with self.lock, self.conn:
+            self.conn.executemany(f"{verb} INTO People (ID, Name, Gender, Age) VALUES (?, ?, ?, ?)", rows)
+            self.people_generation += 1
+
+    def upsert_people(self, rows, groups=None):
+        """Thêm hoặc cập nhật nhiều người (ID, Name, Gender, Age): giá trị None không ghi đè thông
+        tin đã có (người mới không có tên thì lấy ID làm tên). groups: dict nhóm -> list ID được
+        thêm vào nhóm trong cùng transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO People (ID, Name, Gender, Age) VALUES (?1, COALESCE(?2, ?1), ?3, ?4) "
+                "ON CONFLICT(ID) DO UPDATE SET Name = COALESCE(?2, Name), "
+                "Gender = COALESCE(?3, Gender), Age = COALESCE(?4, Age)", rows)
+            for group, user_ids in (groups or {}).items():
+                self.conn.executemany("INSERT OR IGNORE INTO GroupMembers (GroupName, UserID) VALUES (?, ?)",
+                                      [(group, str(user_id)) for user_id in user_ids])
+            self.people_generation += 1
+
+    def delete_person(self, user_id):
+        "Xoá người dùng cùng toàn bộ lịch sử điểm danh và nhóm trong một transaction"
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM Attendance WHERE UserID = ?", (user_id,))
+            self.conn.execute("DELETE FROM DailyAttendance WHERE UserID = ?", (user_id,))
+            self.conn.execute("DELETE FROM GroupMembers WHERE UserID = ?", (user_id,))
+            self.conn.execute("DELETE FROM People WHERE ID = ?", (user_id,))
+            self.people_generation += 1
+
+    # Groups
+
+    def add_group_members(self, group, user_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO GroupMembers (GroupName, UserID) VALUES (?, ?)",
+                                  [(group, str(user_id)) for user_id in user_ids])
+
+    def remove_group_members(self, group, user_ids):
+        with self.lock, self.conn:
+            self.conn.executemany("DELETE FROM GroupMembers WHERE GroupName = ? AND UserID = ?",
+                                  [(group, str(user_id)) for user_id in user_ids])
+
+    def group_members(self, group):
+        "Danh sách UserID của nhóm"
+        with self.lock:
+            rows = self.conn.execute("SELECT UserID FROM GroupMembers WHERE GroupName = ? ORDER BY UserID",
+                                     (group,)).fetchall()
+        return [row[0] for row in rows]
+
+    def list_groups(self):
+        "Danh sách (GroupName, số thành viên)"
+        with self.lock:
+            return self.conn.execute("SELECT GroupName, COUNT(*) FROM GroupMembers "
+                                     "GROUP BY GroupName ORDER BY GroupName").fetchall()
+
+    # Attendance
+
+    def log_attendance(self, user_id, status="Có mặt", when=None):
+        if when is None:
+            when = datetime.datetime.now()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO Attendance (UserID, RecognitionTime, Status) VALUES (?, ?, ?)",
+                              (user_id, when, status))
+
+    def attendance_since(self, since):
+        "Lần điểm danh gần nhất của mỗi người kể từ thời điểm since: list (UserID, RecognitionTime)"
+        with self.lock:
+            return self.conn.execute(
+                "SELECT UserID, MAX(RecognitionTime) FROM Attendance "
+                "WHERE RecognitionTime >= ? GROUP BY UserID", (str(since),)).fetchall()
+
+    def log_attendance_many(self, rows):
+        "Ghi nhiều lượt điểm danh (UserID, RecognitionTime, Status) trong một transaction"
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO Attendance (UserID, RecognitionTime, Status) VALUES (?, ?, ?)",
+                                  rows)
+
+
+    def rebuild_daily_summary(self, before=None):
+        """Tính lại DailyAttendance từ Attendance (tất cả, hoặc các ngày trước ngày của before).
+        Ngày đã được lưu trữ (không còn trong Attendance) được giữ nguyên. Trả về số dòng tổng hợp."""
+        # chỉ xét trọn ngày: before được cắt về YYYY-MM-DD để ngày bị xoá và ngày được tính lại trùng nhau
+        where, params = ("WHERE RecognitionTime < ?", (str(before)[:10],)) if before else ("", ())
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM DailyAttendance WHERE Day IN "
+                              f"(SELECT DISTINCT substr(RecognitionTime, 1, 10) FROM Attendance {where})", params)
+            return self.conn.execute(
+                "INSERT INTO DailyAttendance (Day, UserID, FirstSeen, LastSeen, Count) "
+                "SELECT substr(RecognitionTime, 1, 10), UserID, MIN(RecognitionTime), MAX(RecognitionTime), COUNT(*) "
+                f"FROM Attendance {where} GROUP BY 1, 2", params).rowcount
+
+    def archive_attendance(self, before, archive_path):
+        """Chuyển các lượt điểm danh trước thời điểm before sang database lưu trữ archive_path.
+
+        Hai database chỉ atomic riêng từng file khi dùng WAL, nên chạy lại sau khi bị ngắt giữa
+        chừng phải không tạo bản trùng: lượt đã có trong lưu trữ (trùng cả UserID, RecognitionTime,
+        Status) không chép lại. ID không dùng để so vì ID của database lưu trữ và của Attendance có
+        thể trùng nhau. Chỉ xoá các dòng đã có trong lưu trữ; nếu số dòng xoá khác số dòng chọn thì
+        huỷ cả transaction. Trả về số lượt đã chuyển.
+        """
+        with self.lock:
+            self.conn.execute("ATTACH DATABASE ? AS archive", (os.path.abspath(archive_path),))
+            try:
+                with self.conn:
+                    self.conn.execute("CREATE TABLE IF NOT EXISTS archive.Attendance ("
+                                      "ID INTEGER PRIMARY KEY, UserID TEXT, RecognitionTime TIMESTAMP, Status TEXT)")
+                    self.conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_user_time "
+                                      "ON Attendance (UserID, RecognitionTime)")
+                    self.conn.execute("CREATE TEMP TABLE archive_batch AS "
+                                      "SELECT rowid AS RowID, UserID, RecognitionTime, Status FROM main.Attendance "
+                                      "WHERE RecognitionTime < ?", (str(before),))
+                    selected = self.conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+                    archived = ("EXISTS (SELECT 1 FROM archive.Attendance a WHERE a.UserID IS b.UserID "
+                                "AND a.RecognitionTime IS b.RecognitionTime AND a.Status IS b.Status)")
+                    self.conn.execute("INSERT INTO archive.Attendance (UserID, RecognitionTime, Status) "
+                                      "SELECT UserID, RecognitionTime, Status FROM temp.archive_batch b "
+                                      f"WHERE NOT {archived} ORDER BY RowID")
+                    moved = self.conn.execute("DELETE FROM main.Attendance WHERE rowid IN "
+                                              f"(SELECT RowID FROM temp.archive_batch b WHERE {archived})").rowcount
+                    if moved != selected:
+                        raise sqlite3.DatabaseError(f"Chỉ chép được {moved}/{selected} lượt điểm danh sang lưu trữ")
+                    return moved
+            finally:
+                self.conn.execute("DROP TABLE IF EXISTS temp.archive_batch")
+                self.conn.execute("DETACH DATABASE archive")
+
+
+_MISSING = object()
+
+
+class ProfileCache:
+    """Cache trong bộ nhớ cho profile (ID, Name, Gender, Age) của bảng People.
+
+    Nạp sẵn toàn bộ People khi khởi tạo (tối đa capacity dòng, sau đó thay thế theo LRU).
+    Cache tự xoá và nạp lại khi bảng People bị sửa: trong cùng tiến trình qua
+    Database.people_generation, từ tiến trình khác (vd. gui.py thêm/xoá người dùng) qua
+    PRAGMA data_version, được kiểm tra tối đa mỗi check_interval giây để việc tra cứu
+    trong vòng lặp khung hình gần như không tốn chi phí. ID không có trong People cũng
+    được cache để không truy vấn lặp lại.
+    """
+
+    def __init__(self, db, capacity=10000, check_interval=1.0):
+        self.db = db
+        self.capacity = capacity
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation = self.db.people_generation
+            self.version = self.db.data_version()
+            self.last_check = time.monotonic()
+            rows = self.db.query("SELECT ID, Name, Gender, Age FROM People LIMIT ?", (self.capacity,))
+            for row in rows:
+                self.entries[str(row[0])] = row
+            self.reloads += 1
+
+    def invalidate(self):
+        self.reload()
+
+    def is_stale(self):
+        if self.db.people_generation != self.generation:
+            return True
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        return self.db.data_version() != self.version
+
+    def get(self, user_id):
+        "Trả về (ID, Name, Gender, Age) hoặc None nếu ID không có trong People"
+        if self.is_stale():
+            self.reload()
+        key = str(user_id)
+        with self.lock:
+            row = self.entries.get(key)
+            if row is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return None if row is _MISSING else row
+        self.misses += 1
+        row = self.db.get_person(user_id)
+        with self.lock:
+            self.entries[key] = _MISSING if row is None else row
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return row
+
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_db(path=DB_PATH):
+    "Trả về Database dùng chung trong tiến trình cho đường dẫn này"
+    key = os.path.abspath(path)
+    with _instances_lock:
+        db = _instances.get(key)
+        if db is None:
+            db = Database(path)
+            _instances[key] = db
+        return db
@@ -1,18 +1,22 @@
-import sys
+import argparse
 import cv2
 import os
-import numpy as np
 import sqlite3
 import tkinter.simpledialog
+from database import get_db
+from model_builder import build_model, shard_path
+from detector import FaceDetector
+from face_quality import QualityGate
+from face_store import IMAGE_EXTENSIONS
+from sample_writer import SampleWriter
+
+# gợi ý hiển thị khi ảnh bị loại
+REJECT_HINTS = {"size": "move closer", "blur": "hold still", "pose": "face the camera",
+                "duplicate": "move slightly"}
 
 def check_database():
     try:
-        conn = sqlite3.connect("data/FaceBase.db")
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA integrity_check;")
-        result = cursor.fetchone()
-        conn.close()
-        if result[0] != "ok":
+        if not get_db().integrity_ok():
             print("database bị lỗi, tạo database mới")
             return False
         return True
@@ -22,20 +26,13 @@ def check_database():
 
 if not check_database():
     print("Tạo database mới...")
-    conn = sqlite3.connect("data/FaceBase.db")
-    conn.execute('CREATE TABLE IF NOT EXISTS People (ID INTEGER NOT NULL, Name TEXT NOT NULL, Gender TEXT, Age INTEGER, PRIMARY KEY(ID));')
-    conn.close()
+    get_db().init_schema()
     print("Database mới đã được tạo")
 
 def add_user_to_db(user_id, name, gender=None, age=None):
-    conn = sqlite3.connect("data/FaceBase.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO People (ID, Name, Gender, Age) VALUES (?, ?, ?, ?)", 
-                   (user_id, name, gender, age))
-    conn.commit()
-    conn.close()
-
-def capture_faces(user_id, name, save_dir="images", num_samples=50):
+    get_db().add_person(user_id, name, gender, age, replace=True)
+
+def capture_faces(user_id, name, save_dir="images", num_samples=50, align=False):
     # Yêu cầu nhập Age và Gender qua cửa sổ simpledialog
     age = tkinter.simpledialog.askstring("Nhập thông tin", "Nhập tuổi của người dùng:")
     gender = tkinter.simpledialog.askstring("Nhập thông tin", "Nhập giới tính của người dùng (Male/Female):")
@@ -46,11 +43,22 @@ def capture_faces(user_id, name, save_dir="images", num_samples=50):
         print("Không thể mở camera. Hãy kiểm tra lại kết nối.")
         return
 
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    if face_cascade.empty():
+    gate = QualityGate()
+    # detect trên ảnh thu nhỏ, chỉ tìm khuôn mặt nhìn thẳng đủ lớn để làm mẫu
+    detector = FaceDetector(detect_width=320, min_face=gate.min_size, profile=False)
+    if not detector.is_loaded():
         print("Không thể tải tệp Haar Cascade. hãy kiểm tra lại")
         return
 
+    # ảnh cũ của người này (nếu thu thập lại): không lưu trùng và không ghi đè
+    prefix = f"user.{user_id}."
+    existing = [f for f in os.listdir(save_dir) if f.startswith(prefix) and f.endswith(IMAGE_EXTENSIONS)]
+    gate.seed(img for img in (cv2.imread(os.path.join(save_dir, f), cv2.IMREAD_GRAYSCALE) for f in existing)
+              if img is not None)
+    next_index = max((int(f.split(".")[2]) for f in existing if f.split(".")[2].isdigit()), default=-1) + 1
+
+    # ảnh được chuẩn hoá kích thước và ghi PNG ở luồng nền
+    writer = SampleWriter(save_dir, align=align).start()
     count = 0
     add_user_to_db(user_id, name, gender, age)
 
@@ -61,59 +69,56 @@ def capture_faces(user_id, name, save_dir="images", num_samples=50):
             break
 
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
+        faces = detector.detect(gray)
 
-        for (x, y, w, h) in faces:
+        if len(faces):
+            # chỉ lấy khuôn mặt lớn nhất trong khung hình
+            x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
             face_img = gray[y:y+h, x:x+w]
-            file_path = os.path.join(save_dir, f"user.{user_id}.{count}.jpg")
-            cv2.imwrite(file_path, face_img)
-            count += 1
+            ok, reason = gate.check(face_img)
+            if ok:
+                writer.write(user_id, next_index + count, face_img)
+                count += 1
 
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, f"Capturing {count}/{num_samples}", (x, y-10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            color = (0, 255, 0) if ok else (0, 165, 255)
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            label = f"Capturing {count}/{num_samples}" + ("" if ok else f" ({REJECT_HINTS[reason]})")
+            cv2.putText(frame, label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
         cv2.imshow("Capture Faces", frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
     camera.release()
+    detector.close()
     cv2.destroyAllWindows()
-    print(f"Thu thập ảnh hoàn tất! Đã lưu {count} ảnh.")
-
-def train_model(data_dir="images", model_path="data/trainingData.yml"):
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    faces, ids = [], []
-
-    for file in os.listdir(data_dir):
-        if file.endswith(".jpg"):
-            img_path = os.path.join(data_dir, file)
-            face_img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            if face_img is None:
-                print(f"Không thể đọc ảnh: {img_path}. Bỏ qua...")
-                continue
-
-            try:
-                user_id = int(file.split(".")[1])
-                faces.append(face_img)
-                ids.append(user_id)
-            except ValueError:
-                print(f"Lỗi xử lý ID từ file {file}. Bỏ qua...")
-                continue
-
-    if len(faces) == 0:
+    writer.close()
+    print(f"Thu thập ảnh hoàn tất! Đã lưu {writer.written} ảnh, {writer.bytes / 1024:.0f} KB ({gate.summary()}).")
+
+def train_model(data_dir="images", model_path="data/trainingData.yml", full=False, group=None):
+    # chỉ thêm mẫu của người mới vào mô hình hiện có, huấn luyện lại toàn bộ khi cần
+    if build_model(data_dir, model_path, full=full) is None:
         print("không có dữ liệu để train model. hãy thu thập lại ảnh")
         return
 
-    recognizer.train(faces, np.array(ids))
-    recognizer.save(model_path)
     print(f"train model hoàn tất! model đã được lưu tại: {model_path}")
+    if group:
+        # cập nhật luôn mô hình riêng của nhóm
+        group_path = shard_path(group)
+        if build_model(data_dir, group_path, full=full, user_ids=get_db().group_members(group)) is not None:
+            print(f"model của nhóm {group} đã được lưu tại: {group_path}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Sử dụng: python dataset.py <user_id> <name>")
-    else:
-        user_id = sys.argv[1]
-        name = sys.argv[2]
-        capture_faces(user_id, name)
-        train_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Thu thập ảnh khuôn mặt và huấn luyện mô hình')
+    parser.add_argument('user_id')
+    parser.add_argument('name')
+    parser.add_argument('num_samples', nargs='?', type=int, default=50, help='Số ảnh mẫu cần thu thập')
+    parser.add_argument('--group', default=None, help='Thêm người dùng vào nhóm và cập nhật mô hình của nhóm')
+    parser.add_argument('--align', action='store_true', help='Xoay ảnh mẫu cho hai mắt nằm ngang trước khi lưu')
+    args = parser.parse_args()
+    if args.group:
+        shard_path(args.group)  # báo lỗi sớm nếu tên nhóm không hợp lệ
+    capture_faces(args.user_id, args.name, num_samples=args.num_samples, align=args.align)
+    if args.group:
+        get_db().add_group_members(args.group, [args.user_id])
+    train_model(group=args.group)
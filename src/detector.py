@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from tracker import iou
+
+FRONTAL_CASCADE = 'haarcascade_frontalface_default.xml'
+PROFILE_CASCADE = 'haarcascade_profileface.xml'
+
+
+def overlap_ratio(a, b):
+    "Phần giao chia cho diện tích hộp nhỏ hơn (phát hiện hộp nằm gọn trong hộp khác)"
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    smaller = min(a[2] * a[3], b[2] * b[3])
+    return ix * iy / smaller if smaller > 0 else 0.0
+
+
+def non_max_suppression(boxes, priorities, iou_threshold=0.3, containment=0.7):
+    """Gộp các hộp trùng nhau: giữ hộp có priority cao hơn (rồi đến hộp lớn hơn),
+    bỏ các hộp có IoU > iou_threshold hoặc nằm gần như trọn trong hộp đã giữ."""
+    order = sorted(range(len(boxes)), key=lambda i: (priorities[i], boxes[i][2] * boxes[i][3]), reverse=True)
+    kept = []
+    for i in order:
+        box = boxes[i]
+        if all(iou(box, k) <= iou_threshold and overlap_ratio(box, k) <= containment for k in kept):
+            kept.append(box)
+    return kept
+
+
+class FaceDetector:
+    """Phát hiện khuôn mặt bằng Haar cascade (mặt thẳng + mặt nghiêng).
+
+    Nếu đặt detect_width, cascade chạy trên ảnh đã thu nhỏ về chiều rộng đó và hộp được
+    nhân ngược về toạ độ ảnh gốc, nên việc crop để predict vẫn dùng ảnh độ phân giải đầy đủ.
+    min_face/max_face (pixel, theo ảnh gốc) được đổi thành minSize/maxSize của cascade để
+    bỏ qua các tỉ lệ không thể chứa khuôn mặt.
+    CascadeClassifier không an toàn khi dùng chung giữa nhiều luồng, nên mỗi luồng gọi
+    cascade dùng một bản riêng.
+
+    Ba lượt cascade (mặt thẳng, mặt nghiêng, mặt nghiêng trên ảnh lật ngang để bắt phía
+    còn lại) chạy song song trên cascade_threads luồng (OpenCV nhả GIL khi detect), sau đó
+    được gộp bằng non-maximum suppression để mỗi khuôn mặt chỉ còn một hộp. profile=False chỉ
+    chạy lượt mặt thẳng (dùng khi thu thập mẫu, chỉ giữ ảnh nhìn thẳng).
+    """
+
+    def __init__(self, detect_width=0, min_face=0, max_face=0, scale_factor=1.3, min_neighbors=5,
+                 cascade_dir=None, mirror_profile=True, cascade_threads=3, nms_threshold=0.3, profile=True):
+        self.detect_width = detect_width
+        self.min_face = min_face
+        self.max_face = max_face
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade_dir = cascade_dir or cv2.data.haarcascades
+        self.profile = profile
+        self.mirror_profile = mirror_profile
+        self.cascade_threads = cascade_threads
+        self.nms_threshold = nms_threshold
+        self.local = threading.local()
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    def load_cascades(self):
+        return (cv2.CascadeClassifier(self.cascade_dir + FRONTAL_CASCADE),
+                cv2.CascadeClassifier(self.cascade_dir + PROFILE_CASCADE))
+
+    def cascades(self):
+        if not hasattr(self.local, 'cascades'):
+            self.local.cascades = self.load_cascades()
+        return self.local.cascades
+
+    def is_loaded(self):
+        frontal, profile = self.cascades()
+        return not frontal.empty() and (not self.profile or not profile.empty())
+
+    def scale_for(self, gray):
+        width = gray.shape[1]
+        if self.detect_width and width > self.detect_width:
+            return self.detect_width / width
+        return 1.0
+
+    def size_limits(self, scale):
+        "minSize/maxSize của cascade ở độ phân giải đang detect"
+        min_size = (0, 0)
+        max_size = (0, 0)
+        if self.min_face:
+            side = int(self.min_face * scale)
+            min_size = (side, side)
+        if self.max_face:
+            side = int(round(self.max_face * scale))
+            max_size = (side, side)
+        return min_size, max_size
+
+    def run_cascade(self, cascade, img, min_size, max_size):
+        return cascade.detectMultiScale(img, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                        minSize=min_size, maxSize=max_size)
+
+    def get_pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.cascade_threads,
+                                               thread_name_prefix="cascade")
+            return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def run_pass(self, kind, img, min_size, max_size):
+        "Chạy một lượt cascade trong luồng hiện tại: 'frontal', 'profile' hoặc 'mirror'"
+        frontal, profile = self.cascades()
+        if kind == 'frontal':
+            return list(self.run_cascade(frontal, img, min_size, max_size))
+        if kind == 'profile':
+            return list(self.run_cascade(profile, img, min_size, max_size))
+        width = img.shape[1]
+        mirrored = self.run_cascade(profile, cv2.flip(img, 1), min_size, max_size)
+        return [(width - x - w, y, w, h) for (x, y, w, h) in mirrored]
+
+    def detect(self, gray):
+        "Trả về list hộp (x, y, w, h) theo toạ độ của ảnh xám gốc"
+        scale = self.scale_for(gray)
+        small = gray
+        if scale != 1.0:
+            small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size, max_size = self.size_limits(scale)
+
+        kinds = ['frontal']
+        if self.profile:
+            kinds += ['profile'] + (['mirror'] if self.mirror_profile else [])
+        if self.cascade_threads > 1 and len(kinds) > 1:
+            pool = self.get_pool()
+            futures = [pool.submit(self.run_pass, kind, small, min_size, max_size) for kind in kinds]
+            passes = [f.result() for f in futures]
+        else:
+            passes = [self.run_pass(kind, small, min_size, max_size) for kind in kinds]
+
+        boxes, priorities = [], []
+        for priority, found in zip((2, 1, 1), passes):
+            for box in found:
+                boxes.append(tuple(int(v) for v in box))
+                priorities.append(priority)
+        # ưu tiên hộp mặt thẳng khi trùng với hộp mặt nghiêng
+        boxes = non_max_suppression(boxes, priorities, self.nms_threshold)
+        if scale == 1.0:
+            return boxes
+        img_h, img_w = gray.shape[:2]
+        result = []
+        for box in boxes:
+            x, y, w, h = (int(round(v / scale)) for v in box)
+            w = min(w, img_w - x)
+            h = min(h, img_h - y)
+            result.append((x, y, w, h))
+        return result
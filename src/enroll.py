@@ -0,0 +1,218 @@
+import os
+import sys
+import csv
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from database import get_db
+from detector import FaceDetector
+from face_quality import QualityGate
+from face_store import FACE_SIZE, IMAGE_EXTENSIONS as SAMPLE_EXTENSIONS, normalize_face
+from frame_source import IMAGE_EXTENSIONS
+from model_builder import build_model, shard_path
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+MODEL_PATH = "data/trainingData.yml"
+
+
+def media_files(path):
+    "Danh sách file ảnh/video trong một file hoặc thư mục"
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path)
+                      if f.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS))
+    return [path] if os.path.isfile(path) else []
+
+
+def people_from_folder(root):
+    "Mỗi thư mục con <ID> hoặc <ID>_<Tên> là một người, chứa ảnh/video của người đó"
+    people = []
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        if not os.path.isdir(path):
+            continue
+        user_id, _, name = entry.partition("_")
+        people.append({"ID": user_id, "Name": name or None, "Gender": None, "Age": None,
+                       "Group": None, "Media": media_files(path)})
+    return people
+
+
+def people_from_csv(csv_path):
+    """Manifest CSV có các cột ID, Name, Gender, Age, Group (tuỳ chọn) và Media: đường dẫn file
+    hoặc thư mục (nhiều đường dẫn cách nhau bằng ';', tương đối theo vị trí file CSV)."""
+    base = os.path.dirname(os.path.abspath(csv_path))
+    people = []
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            media = []
+            for item in (row.get("Media") or "").split(";"):
+                if item.strip():
+                    media += media_files(os.path.join(base, item.strip()))
+            people.append({"ID": row["ID"].strip(), "Name": (row.get("Name") or "").strip() or None,
+                           "Gender": row.get("Gender") or None, "Age": row.get("Age") or None,
+                           "Group": row.get("Group") or None, "Media": media})
+    return people
+
+
+def read_frames(path, video_step, max_frames):
+    "Ảnh xám từ một file: một ảnh, hoặc mỗi video_step khung hình của video (tối đa max_frames)"
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            yield img
+        return
+    cap = cv2.VideoCapture(path)
+    index = 0
+    read = 0
+    while read < max_frames:
+        ok = cap.grab()
+        if not ok:
+            break
+        if index % video_step == 0:
+            ok, frame = cap.retrieve()
+            if ok:
+                read += 1
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        index += 1
+    cap.release()
+
+
+_detector = None
+
+
+def _init_worker():
+    global _detector
+    # mỗi tiến trình có detector riêng, một luồng cascade vì song song đã ở mức tiến trình;
+    # chỉ lấy khuôn mặt nhìn thẳng làm mẫu
+    cv2.setNumThreads(1)
+    _detector = FaceDetector(detect_width=640, min_face=60, cascade_threads=1, profile=False)
+
+
+def process_person(person, save_dir, max_samples, video_step, max_video_frames):
+    """Phát hiện, lọc chất lượng và lưu mẫu của một người (chạy trong tiến trình con).
+    Trả về (ID, số mẫu mới đã lưu, số mẫu đã có từ trước, số khung hình đã xét, tóm tắt bộ lọc)."""
+    gate = QualityGate(min_size=60)
+    prefix = f"user.{person['ID']}."
+    existing = [f for f in os.listdir(save_dir) if f.startswith(prefix) and f.endswith(SAMPLE_EXTENSIONS)]
+    gate.seed(img for img in (cv2.imread(os.path.join(save_dir, f), cv2.IMREAD_GRAYSCALE) for f in existing)
+              if img is not None)
+    next_index = max((int(f.split(".")[2]) for f in existing if f.split(".")[2].isdigit()), default=-1) + 1
+    saved = frames = 0
+    for path in person["Media"]:
+        for gray in read_frames(path, video_step, max_video_frames):
+            frames += 1
+            faces = _detector.detect(gray)
+            if not len(faces):
+                continue
+            x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+            face_img = gray[y:y + h, x:x + w]
+            if not gate.check(face_img)[0]:
+                continue
+            cv2.imwrite(os.path.join(save_dir, f"{prefix}{next_index + saved}.png"),
+                        normalize_face(face_img, FACE_SIZE), [cv2.IMWRITE_PNG_COMPRESSION, 3])
+            saved += 1
+            if saved >= max_samples:
+                return person["ID"], saved, len(existing), frames, gate.summary()
+    return person["ID"], saved, len(existing), frames, gate.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Đăng ký hàng loạt từ ảnh thẻ / video có sẵn')
+    parser.add_argument('source', help='Thư mục (mỗi thư mục con <ID>_<Tên> là một người) hoặc file CSV manifest')
+    parser.add_argument('--save-dir', default='images', help='Thư mục lưu ảnh mẫu')
+    parser.add_argument('--workers', type=int, default=0, help='Số tiến trình xử lý (0 = số CPU)')
+    parser.add_argument('--max-samples', type=int, default=30, help='Số mẫu tối đa mỗi người')
+    parser.add_argument('--video-step', type=int, default=5, help='Lấy 1 khung hình mỗi N khung hình của video')
+    parser.add_argument('--max-video-frames', type=int, default=200, help='Số khung hình tối đa đọc từ mỗi video')
+    parser.add_argument('--group', default=None, help='Thêm mọi người vào nhóm này (ngoài cột Group của CSV)')
+    parser.add_argument('--no-train', action='store_true', help='Chỉ lưu mẫu và People, không cập nhật mô hình')
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        people = people_from_folder(args.source)
+    elif args.source.lower().endswith(".csv"):
+        people = people_from_csv(args.source)
+    else:
+        print(f"Không tìm thấy thư mục hoặc file CSV: {args.source}")
+        return 1
+    # gộp các dòng trùng ID để hai tiến trình không cùng ghi ảnh của một người
+    merged = {}
+    for p in people:
+        if not p["ID"]:
+            continue
+        # tên file mẫu user.<ID>.<n>.png chỉ được huấn luyện khi ID là số (face_store.parse_user_id)
+        if not p["ID"].isdigit():
+            print(f"Bỏ qua {p['ID']!r}: ID phải là số nguyên không âm")
+            continue
+        p["ID"] = str(int(p["ID"]))
+        if p["ID"] in merged:
+            merged[p["ID"]]["Media"] += p["Media"]
+        else:
+            merged[p["ID"]] = p
+    people = list(merged.values())
+    if not people:
+        print("Không có người nào để đăng ký.")
+        return 1
+    try:
+        for group in {args.group} | {p["Group"] for p in people}:
+            if group:
+                shard_path(group)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    os.makedirs(args.save_dir, exist_ok=True)
+    workers = args.workers or os.cpu_count() or 1
+    total_media = sum(len(p["Media"]) for p in people)
+    print(f"Đăng ký {len(people)} người ({total_media} file) với {workers} tiến trình...")
+    start = time.perf_counter()
+    results = {}
+    done = saved = frames = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = {pool.submit(process_person, p, args.save_dir, args.max_samples, args.video_step,
+                               args.max_video_frames): p for p in people}
+        for future in as_completed(futures):
+            person = futures[future]
+            try:
+                user_id, count, existing, seen, summary = future.result()
+            except Exception as e:
+                print(f"Lỗi khi xử lý ID {person['ID']}: {e}")
+                continue
+            # người đã có mẫu từ trước vẫn được cập nhật thông tin/nhóm
+            results[user_id] = count + existing
+            done += 1
+            saved += count
+            frames += seen
+            if count == 0:
+                print(f"ID {user_id}: không lấy được mẫu mới nào ({summary})")
+            elapsed = time.perf_counter() - start
+            if done % 10 == 0 or done == len(people):
+                print(f"[{done}/{len(people)}] {saved} mẫu, {frames} khung hình, "
+                      f"{done / elapsed:.1f} người/s, {frames / elapsed:.1f} khung hình/s")
+
+    enrolled = [p for p in people if results.get(p["ID"], 0) > 0]
+    db = get_db()
+    groups = {}
+    for p in enrolled:
+        for group in (p["Group"], args.group):
+            if group:
+                groups.setdefault(group, []).append(p["ID"])
+    # toàn bộ People và nhóm được ghi trong một transaction; cột để trống (vd. Gender/Age khi
+    # đăng ký từ thư mục) không ghi đè thông tin đã có
+    db.upsert_people([(p["ID"], p["Name"], p["Gender"], p["Age"]) for p in enrolled], groups)
+    elapsed = time.perf_counter() - start
+    print(f"Đã đăng ký {len(enrolled)}/{len(people)} người, {saved} mẫu trong {elapsed:.1f}s "
+          f"({frames / elapsed:.1f} khung hình/s)")
+
+    if args.no_train or not enrolled:
+        return 0
+    # mô hình chỉ được cập nhật một lần sau khi xử lý xong mọi người
+    build_model(args.save_dir, MODEL_PATH)
+    for group in groups:
+        build_model(args.save_dir, shard_path(group), user_ids=db.group_members(group))
+    print(f"Hoàn tất sau {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
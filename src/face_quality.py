@@ -0,0 +1,112 @@
+import cv2
+import numpy as np
+from face_store import FACE_SIZE, normalize_face
+
+EYE_CASCADE = 'haarcascade_eye.xml'
+
+
+def blur_score(face_img):
+    "Phương sai Laplacian: càng nhỏ ảnh càng mờ"
+    return float(cv2.Laplacian(face_img, cv2.CV_64F).var())
+
+
+def find_eyes(face_img, eye_cascade):
+    "Hai mắt lớn nhất trong nửa trên khuôn mặt, trái trước phải (x, y, w, h); None nếu không thấy đủ"
+    h, w = face_img.shape[:2]
+    eyes = eye_cascade.detectMultiScale(face_img[:h * 3 // 5], scaleFactor=1.1, minNeighbors=3,
+                                        minSize=(w // 8, w // 8))
+    if len(eyes) < 2:
+        return None
+    return sorted(sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2], key=lambda e: e[0])
+
+
+def yaw_score(face_img, eye_cascade):
+    """Độ lệch ngang của trung điểm hai mắt so với tâm khuôn mặt, theo tỉ lệ chiều rộng
+    (0 = nhìn thẳng, mặt quay nghiêng cho giá trị lớn); None nếu không tìm thấy đủ hai mắt."""
+    eyes = find_eyes(face_img, eye_cascade)
+    if eyes is None:
+        return None
+    w = face_img.shape[1]
+    center = sum(x + ew / 2 for x, y, ew, eh in eyes) / 2
+    return abs(center - w / 2) / w
+
+
+def align_face(face_img, eye_cascade, max_angle=30.0):
+    "Xoay ảnh quanh tâm để hai mắt nằm ngang; giữ nguyên nếu không thấy mắt hoặc góc quá lớn"
+    eyes = find_eyes(face_img, eye_cascade)
+    if eyes is None:
+        return face_img
+    (lx, ly, lw, lh), (rx, ry, rw, rh) = eyes
+    angle = np.degrees(np.arctan2((ry + rh / 2) - (ly + lh / 2), (rx + rw / 2) - (lx + lw / 2)))
+    if abs(angle) > max_angle:
+        return face_img
+    h, w = face_img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(face_img, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def dhash(face_img, hash_size=8):
+    "Perceptual hash (difference hash) 64 bit của ảnh"
+    small = cv2.resize(face_img, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class QualityGate:
+    """Lọc ảnh khuôn mặt khi thu thập mẫu.
+
+    Mỗi ảnh được chấm kích thước, độ nét (phương sai Laplacian) và góc mặt (vị trí hai mắt
+    so với tâm; ảnh không thấy đủ hai mắt, như mặt nghiêng, cũng bị loại vì góc mặt trừ khi
+    require_eyes=False), rồi so perceptual hash với các mẫu đã giữ: ảnh gần trùng (khoảng cách
+    Hamming <= max_hamming) bị bỏ. Nhờ đó vài chục mẫu giữ lại khác nhau thật sự thay vì
+    là các khung hình liên tiếp gần như y hệt.
+    """
+
+    def __init__(self, min_size=80, min_sharpness=20.0, max_yaw=0.18, max_hamming=6, size=FACE_SIZE,
+                 cascade_dir=None, require_eyes=True):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.require_eyes = require_eyes
+        self.eye_cascade = cv2.CascadeClassifier((cascade_dir or cv2.data.haarcascades) + EYE_CASCADE)
+        self.max_hamming = max_hamming
+        self.size = size
+        self.hashes = []
+        self.rejected = {"size": 0, "blur": 0, "pose": 0, "duplicate": 0}
+        self.accepted = 0
+
+    def seed(self, face_imgs):
+        "Thêm hash của các mẫu đã có (vd. ảnh của lần thu thập trước) để không lưu trùng"
+        for img in face_imgs:
+            self.hashes.append(dhash(normalize_face(img, self.size)))
+
+    def check(self, face_img):
+        "Trả về (True, None) nếu nên giữ ảnh, ngược lại (False, lý do)"
+        if min(face_img.shape[:2]) < self.min_size:
+            return self._reject("size")
+        face = normalize_face(face_img, self.size)
+        if blur_score(face) < self.min_sharpness:
+            return self._reject("blur")
+        if not self.eye_cascade.empty():
+            yaw = yaw_score(face, self.eye_cascade)
+            if (yaw is None and self.require_eyes) or (yaw is not None and yaw > self.max_yaw):
+                return self._reject("pose")
+        h = dhash(face)
+        if any(hamming(h, kept) <= self.max_hamming for kept in self.hashes):
+            return self._reject("duplicate")
+        self.hashes.append(h)
+        self.accepted += 1
+        return True, None
+
+    def _reject(self, reason):
+        self.rejected[reason] += 1
+        return False, reason
+
+    def summary(self):
+        r = self.rejected
+        return (f"giữ {self.accepted}, bỏ {sum(r.values())} (nhỏ {r['size']}, mờ {r['blur']}, "
+                f"nghiêng {r['pose']}, trùng {r['duplicate']})")
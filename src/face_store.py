@@ -0,0 +1,162 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# kích thước chuẩn của ảnh khuôn mặt khi huấn luyện và khi predict
+FACE_SIZE = (100, 100)
+STORE_DIR = "data/face_store"
+IMAGE_EXTENSIONS = (".jpg", ".png")
+
+
+def normalize_face(face_img, size=FACE_SIZE):
+    "Đưa ảnh khuôn mặt xám về kích thước chuẩn"
+    if face_img.shape[1] == size[0] and face_img.shape[0] == size[1]:
+        return face_img
+    interpolation = cv2.INTER_AREA if face_img.shape[1] > size[0] else cv2.INTER_LINEAR
+    return cv2.resize(face_img, size, interpolation=interpolation)
+
+
+def parse_user_id(file):
+    "Lấy ID người dùng từ tên file dạng user.<id>.<n>.jpg/.png, ném ValueError nếu không hợp lệ"
+    return int(file.split(".")[1])
+
+
+def scan_images(data_dir):
+    "Liệt kê ảnh mẫu trong thư mục: dict tên file -> (mtime, size)"
+    entries = {}
+    with os.scandir(data_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(IMAGE_EXTENSIONS):
+                st = entry.stat()
+                entries[entry.name] = (st.st_mtime_ns, st.st_size)
+    return entries
+
+
+def load_faces(paths, size=FACE_SIZE, workers=None):
+    "Đọc và chuẩn hoá nhiều ảnh song song (cv2 nhả GIL khi giải mã); ảnh lỗi trả về None"
+    def load(path):
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        return None if img is None else normalize_face(img, size)
+
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load, paths))
+
+
+class FaceStore:
+    """Kho ảnh khuôn mặt đã tiền xử lý cho việc huấn luyện.
+
+    Lưu trong store_dir: faces.npy (N x H x W, uint8, đọc bằng memory-map), labels.npy (N,)
+    và manifest.json ghi tên file, mtime, kích thước file của từng mẫu. Mỗi lần update()
+    chỉ giải mã các ảnh mới hoặc đã thay đổi trong data_dir, các ảnh không đổi được lấy
+    lại từ faces.npy, ảnh đã bị xoá thì bỏ khỏi kho.
+    """
+
+    def __init__(self, data_dir="images", store_dir=STORE_DIR, size=FACE_SIZE):
+        self.data_dir = data_dir
+        self.store_dir = store_dir
+        self.size = tuple(size)
+        self.faces_path = os.path.join(store_dir, "faces.npy")
+        self.labels_path = os.path.join(store_dir, "labels.npy")
+        self.manifest_path = os.path.join(store_dir, "manifest.json")
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(manifest.get("size", ())) != self.size or not os.path.exists(self.faces_path):
+            return None
+        return manifest
+
+    def load(self):
+        "Trả về (faces, labels, files) hiện có trong kho; faces là memory-map chỉ đọc"
+        manifest = self.load_manifest()
+        if manifest is None or not manifest["files"]:
+            return np.zeros((0,) + self.size[::-1], np.uint8), np.zeros(0, np.int32), []
+        faces = np.load(self.faces_path, mmap_mode="r")
+        labels = np.load(self.labels_path)
+        return faces, labels, [entry["file"] for entry in manifest["files"]]
+
+    def update(self, workers=None):
+        """Đồng bộ kho với data_dir, trả về (faces, labels, stats).
+
+        stats gồm số ảnh dùng lại, số ảnh đọc mới, số ảnh bị bỏ qua/xoá.
+        """
+        current = scan_images(self.data_dir)
+        manifest = self.load_manifest()
+        old_faces = None
+        old_index = {}
+        if manifest is not None and manifest["files"]:
+            old_faces = np.load(self.faces_path, mmap_mode="r")
+            old_index = {entry["file"]: entry for entry in manifest["files"]}
+
+        reused, to_load = [], []
+        for file in sorted(current):
+            mtime, size = current[file]
+            try:
+                label = parse_user_id(file)
+            except (ValueError, IndexError):
+                print(f"Lỗi xử lý ID từ file {file}. Bỏ qua...")
+                continue
+            old = old_index.get(file)
+            if old is not None and old["mtime"] == mtime and old["bytes"] == size:
+                reused.append((file, mtime, size, label, old["index"]))
+            else:
+                to_load.append((file, mtime, size, label))
+
+        loaded = load_faces([os.path.join(self.data_dir, f[0]) for f in to_load], self.size, workers)
+        fresh = []
+        skipped = 0
+        for (file, mtime, size, label), img in zip(to_load, loaded):
+            if img is None:
+                print(f"Không thể đọc ảnh: {os.path.join(self.data_dir, file)}. Bỏ qua...")
+                skipped += 1
+                continue
+            fresh.append((file, mtime, size, label, img))
+
+        removed = len(set(old_index) - set(current))
+        stats = {"reused": len(reused), "loaded": len(fresh), "skipped": skipped, "removed": removed}
+        if manifest is not None and not fresh and not removed and len(reused) == len(old_index):
+            # không có gì thay đổi, dùng luôn kho hiện có
+            faces, labels, _ = self.load()
+            return faces, labels, stats
+
+        total = len(reused) + len(fresh)
+        os.makedirs(self.store_dir, exist_ok=True)
+        if total == 0:
+            # không mmap được file rỗng
+            del old_faces
+            np.save(self.faces_path, np.zeros((0,) + self.size[::-1], np.uint8))
+            np.save(self.labels_path, np.zeros(0, np.int32))
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump({"size": list(self.size), "files": []}, f)
+            return self.load()[0], np.zeros(0, np.int32), stats
+        tmp_faces = self.faces_path + ".tmp.npy"
+        faces = np.lib.format.open_memmap(tmp_faces, mode="w+", dtype=np.uint8,
+                                          shape=(total,) + self.size[::-1])
+        labels = np.zeros(total, np.int32)
+        entries = []
+        for i, (file, mtime, size, label, old_i) in enumerate(reused):
+            faces[i] = old_faces[old_i]
+            labels[i] = label
+            entries.append({"file": file, "mtime": mtime, "bytes": size, "label": label, "index": i})
+        for j, (file, mtime, size, label, img) in enumerate(fresh):
+            i = len(reused) + j
+            faces[i] = img
+            labels[i] = label
+            entries.append({"file": file, "mtime": mtime, "bytes": size, "label": label, "index": i})
+        faces.flush()
+        del faces, old_faces
+
+        os.replace(tmp_faces, self.faces_path)
+        np.save(self.labels_path, labels)
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"size": list(self.size), "files": entries}, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        return np.load(self.faces_path, mmap_mode="r"), labels, stats
@@ -0,0 +1,160 @@
+import os
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FrameSource:
+    "Nguồn khung hình chung, có cùng giao diện isOpened/read/release với cv2.VideoCapture"
+
+    # True nếu nguồn chạy theo tốc độ camera (không thể đọc nhanh hơn thời gian thực)
+    realtime = False
+    name = "source"
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        return False, None
+
+    def release(self):
+        pass
+
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                return
+            yield frame
+
+
+class CaptureSource(FrameSource):
+    "Bọc cv2.VideoCapture: webcam, file video hoặc luồng IP camera"
+
+    def __init__(self, target, realtime):
+        self.cap = cv2.VideoCapture(target)
+        self.realtime = realtime
+        self.name = str(target)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+
+class WebcamSource(CaptureSource):
+    def __init__(self, index=0):
+        super().__init__(index, realtime=True)
+
+
+class VideoFileSource(CaptureSource):
+    "Đọc file video nhanh nhất có thể, không chờ theo FPS gốc của file"
+
+    def __init__(self, path):
+        super().__init__(path, realtime=False)
+
+
+class ImageFolderSource(FrameSource):
+    "Đọc lần lượt các ảnh trong một thư mục (theo thứ tự tên file)"
+
+    def __init__(self, folder, loop=False):
+        self.folder = folder
+        self.loop = loop
+        self.name = folder
+        self.files = []
+        if os.path.isdir(folder):
+            self.files = sorted(
+                os.path.join(folder, f) for f in os.listdir(folder)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        self.index = 0
+
+    def isOpened(self):
+        return len(self.files) > 0
+
+    def read(self):
+        # thử tối đa một vòng qua danh sách để không lặp vô hạn khi mọi ảnh đều lỗi
+        for _ in range(len(self.files)):
+            if self.index >= len(self.files):
+                if not self.loop:
+                    break
+                self.index = 0
+            path = self.files[self.index]
+            self.index += 1
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Không thể đọc ảnh: {path}. Bỏ qua...")
+                continue
+            return True, frame
+        return False, None
+
+
+class ArraySource(FrameSource):
+    "Nguồn khung hình từ bộ nhớ: list hoặc generator các mảng numpy BGR"
+
+    def __init__(self, frames, name="array"):
+        self.frames = iter(frames)
+        self.name = name
+
+    def read(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return False, None
+        return True, frame
+
+
+def open_source(spec):
+    "Tạo nguồn khung hình từ chuỗi cấu hình: số (webcam), thư mục ảnh, file video hoặc URL"
+    if isinstance(spec, FrameSource):
+        return spec
+    spec = str(spec)
+    if spec.isdigit():
+        return WebcamSource(int(spec))
+    if os.path.isdir(spec):
+        return ImageFolderSource(spec)
+    if "://" in spec:
+        return CaptureSource(spec, realtime=True)
+    return VideoFileSource(spec)
+
+
+class WindowSink:
+    "Hiển thị khung hình bằng cv2.imshow và trả về phím được nhấn"
+
+    def __init__(self, window_name="Face Recognition"):
+        self.window_name = window_name
+
+    def show(self, img):
+        cv2.imshow(self.window_name, img)
+        return cv2.waitKey(1) & 0xFF
+
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class HeadlessSink:
+    "Không mở cửa sổ; có thể ghi khung hình đã vẽ ra file video"
+
+    def __init__(self, output_path=None, fps=25.0):
+        self.output_path = output_path
+        self.fps = fps
+        self.writer = None
+        self.frames = 0
+
+    def show(self, img):
+        self.frames += 1
+        if self.output_path:
+            if self.writer is None:
+                h, w = img.shape[:2]
+                fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                self.writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, (w, h))
+            self.writer.write(img)
+        return 0xFF
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
@@ -0,0 +1,56 @@
+import sys
+import argparse
+from database import get_db
+from model_builder import shard_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Quản lý nhóm (lớp/phòng) dùng cho mô hình nhận diện riêng')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Liệt kê các nhóm')
+    show = sub.add_parser('show', help='Liệt kê thành viên của một nhóm')
+    show.add_argument('group')
+    add = sub.add_parser('add', help='Thêm người dùng vào nhóm')
+    add.add_argument('group')
+    add.add_argument('user_ids', nargs='+')
+    remove = sub.add_parser('remove', help='Xoá người dùng khỏi nhóm')
+    remove.add_argument('group')
+    remove.add_argument('user_ids', nargs='+')
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    if args.command == 'list':
+        groups = db.list_groups()
+        if not groups:
+            print("Chưa có nhóm nào.")
+        for name, count in groups:
+            print(f"{name}: {count} thành viên ({shard_path(name)})")
+        return 0
+
+    try:
+        shard_path(args.group)  # kiểm tra tên nhóm hợp lệ
+    except ValueError as e:
+        print(e)
+        return 1
+    if args.command == 'show':
+        for user_id in db.group_members(args.group):
+            person = db.get_person(user_id)
+            print(f"{user_id}\t{person[1] if person else '(không có trong People)'}")
+        return 0
+
+    missing = [user_id for user_id in args.user_ids if not db.person_exists(user_id)]
+    if args.command == 'add':
+        if missing:
+            print(f"Các ID chưa có trong People: {', '.join(missing)}")
+            return 1
+        db.add_group_members(args.group, args.user_ids)
+        print(f"Đã thêm {len(args.user_ids)} người vào nhóm {args.group}")
+    else:
+        db.remove_group_members(args.group, args.user_ids)
+        print(f"Đã xoá {len(args.user_ids)} người khỏi nhóm {args.group}")
+    print(f"Chạy 'python src/train.py --group {args.group}' để cập nhật mô hình của nhóm.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
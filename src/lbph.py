@@ -0,0 +1,359 @@
+import os
+import sys
+import math
+import json
+import argparse
+import cv2
+import numpy as np
+from ann_index import IVFIndex
+
+DEFAULT_PARAMS = {"radius": 1, "neighbors": 8, "grid_x": 8, "grid_y": 8}
+# số dòng gallery xử lý mỗi lần khi đọc từ memory-map, giới hạn bộ nhớ tạm khi gallery lớn
+CHUNK_ROWS = 2048
+
+
+def lbp_image(src, radius=1, neighbors=8):
+    """Ảnh mã LBP mở rộng (nội suy song tuyến trên vòng tròn), giống elbp() của OpenCV LBPH.
+
+    src là một ảnh xám (H, W) hoặc một lô ảnh cùng kích thước (B, H, W).
+    """
+    src = np.asarray(src)
+    if src.ndim == 3 and src.shape[-1] == 3:
+        src = cv2.cvtColor(src, cv2.COLOR_BGR2GRAY)
+    src = src.astype(np.float32)
+    rows, cols = src.shape[-2:]
+    out_h, out_w = rows - 2 * radius, cols - 2 * radius
+    center = src[..., radius:radius + out_h, radius:radius + out_w]
+    dst = np.zeros(src.shape[:-2] + (out_h, out_w), np.int32)
+    eps = np.finfo(np.float32).eps
+    for n in range(neighbors):
+        # góc tính bằng double rồi mới ép về float32, như OpenCV
+        x = np.float32(radius * math.cos(2.0 * math.pi * n / float(neighbors)))
+        y = np.float32(-radius * math.sin(2.0 * math.pi * n / float(neighbors)))
+        fx, fy = math.floor(x), math.floor(y)
+        cx, cy = math.ceil(x), math.ceil(y)
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        def shifted(dy, dx):
+            return src[..., radius + dy:radius + dy + out_h, radius + dx:radius + dx + out_w]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        dst += (((t > center) | (np.abs(t - center) < eps)).astype(np.int32)) << n
+    return dst
+
+
+def spatial_histogram(lbp, num_patterns, grid_x=8, grid_y=8):
+    """Histogram LBP của từng ô lưới (chuẩn hoá theo số điểm ảnh mỗi ô), nối thành vector float32.
+
+    lbp có dạng (h, w) hoặc (B, h, w); kết quả tương ứng (D,) hoặc (B, D).
+    """
+    batch = lbp.ndim == 3
+    lbp = lbp.reshape((-1,) + lbp.shape[-2:])
+    height = lbp.shape[1] // grid_y
+    width = lbp.shape[2] // grid_x
+    cells = lbp[:, :grid_y * height, :grid_x * width]
+    dim = grid_x * grid_y * num_patterns
+    # chỉ số ô của từng điểm ảnh, theo thứ tự hàng của lưới trước (giống OpenCV)
+    cell_index = (np.arange(grid_y * height) // height)[:, None] * grid_x + \
+                 (np.arange(grid_x * width) // width)[None, :]
+    offsets = np.arange(len(lbp))[:, None, None] * dim
+    hist = np.bincount((offsets + cell_index * num_patterns + cells).ravel(),
+                       minlength=len(lbp) * dim).astype(np.float32).reshape(len(lbp), dim)
+    if height * width > 0:
+        hist /= np.float32(height * width)
+    return hist if batch else hist[0]
+
+
+def compute_histogram(face_img, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    "Vector đặc trưng LBPH của một ảnh khuôn mặt xám, hoặc (B, D) cho một lô ảnh cùng kích thước"
+    lbp = lbp_image(face_img, radius, neighbors)
+    return spatial_histogram(lbp, 2 ** neighbors, grid_x, grid_y)
+
+
+def inverse_columns(gallery):
+    "Ma trận D x N gồm 1 / h của gallery (inf tại bin bằng 0); mỗi bin là một dòng liên tục"
+    n = len(gallery)
+    dim = gallery.shape[1] if n else 0
+    inverse = np.empty((dim, n), np.float32)
+    with np.errstate(divide="ignore"):
+        for start in range(0, n, CHUNK_ROWS):
+            block = np.asarray(gallery[start:start + CHUNK_ROWS], np.float32)
+            inverse[:, start:start + len(block)] = (1.0 / block).T
+    return inverse
+
+
+def gallery_row_sums(gallery):
+    sums = np.empty(len(gallery), np.float64)
+    for start in range(0, len(gallery), CHUNK_ROWS):
+        sums[start:start + CHUNK_ROWS] = np.asarray(gallery[start:start + CHUNK_ROWS]).sum(axis=1, dtype=np.float64)
+    return sums
+
+
+def chi_square(gallery, query):
+    "Khoảng cách chi-square (HISTCMP_CHISQR_ALT) từ query tới từng dòng gallery"
+    return chi_square_batch(gallery, np.asarray(query, np.float32)[None, :])[0]
+
+
+def chi_square_batch(gallery, queries, inverse=None, row_sums=None):
+    """Ma trận khoảng cách chi-square (B, N) giữa B histogram query và N dòng gallery.
+
+    Dùng đẳng thức (a - q)^2 / (a + q) = a + q - 4 / (1/a + 1/q): khoảng cách bằng
+    2 * (tổng a + tổng q - 4 * S), với S là tổng 1 / (1/a + 1/q) trên các bin mà query
+    khác 0 (bin có a = 0 cho 1/a = inf nên tự đóng góp 0). Histogram LBP thưa nên mỗi
+    query chỉ cần đọc khoảng 10% số dòng của inverse (ma trận D x N từ inverse_columns),
+    mỗi dòng liên tục trong bộ nhớ.
+    """
+    queries = np.asarray(queries, np.float32)
+    if inverse is None:
+        inverse = inverse_columns(gallery)
+    if row_sums is None:
+        row_sums = gallery_row_sums(gallery)
+    dists = np.empty((len(queries), len(gallery)), np.float64)
+    for i, query in enumerate(queries):
+        dists[i] = chi_square_range(inverse, row_sums, query, 0, len(gallery))
+    return dists
+
+
+def chi_square_range(inverse, row_sums, query, start, end):
+    "Khoảng cách chi-square từ một query tới các dòng gallery [start, end), xem chi_square_batch"
+    cols = np.flatnonzero(query)
+    terms = inverse[cols, start:end]
+    terms += (1.0 / query[cols])[:, None]
+    np.reciprocal(terms, out=terms)
+    cross = terms.sum(axis=0, dtype=np.float64)
+    return 2.0 * (row_sums[start:end] + query.sum(dtype=np.float64) - 4.0 * cross)
+
+
+def gallery_prefix(model_path):
+    return os.path.splitext(model_path)[0]
+
+
+def save_npy(path, array):
+    "np.save ra file tạm rồi os.replace, không để lại file .npy ghi dở"
+    tmp = path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+class LBPHGallery:
+    """Mô hình LBPH lưu dạng nhị phân: <prefix>.hist.npy (N x D float32), <prefix>.labels.npy
+    và <prefix>.lbph.json (tham số LBP), kèm <prefix>.inv.npy (D x N, 1 / histogram) dùng
+    cho predict_batch() và <prefix>.ivf.npz nếu gallery có index ANN (xem with_index()).
+
+    Ma trận histogram được mở bằng memory-map nên khởi động gần như tức thì và các tiến trình
+    nhận diện dùng chung trang bộ nhớ qua page cache. predict() có cùng giao diện với
+    LBPHFaceRecognizer.predict().
+    """
+
+    def __init__(self, histograms, labels, params=None, threshold=float("inf")):
+        self.histograms = histograms
+        self.labels = np.asarray(labels, np.int32).ravel()
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.threshold = threshold
+        # thông tin thu gọn (prototypes.compress_gallery), None nếu giữ đủ mọi mẫu
+        self.prototypes = None
+        # index ANN (ann_index.IVFIndex) nếu có; nprobe > 0 thay số cụm dò mặc định của index
+        self.index = None
+        self.nprobe = 0
+        self._inverse = None
+        self._row_sums = None
+        self._label_index = None
+
+    @classmethod
+    def from_recognizer(cls, recognizer):
+        hists = recognizer.getHistograms()
+        histograms = np.vstack([np.asarray(h, np.float32).reshape(1, -1) for h in hists]) if hists \
+            else np.zeros((0, 0), np.float32)
+        params = {"radius": recognizer.getRadius(), "neighbors": recognizer.getNeighbors(),
+                  "grid_x": recognizer.getGridX(), "grid_y": recognizer.getGridY()}
+        return cls(histograms, recognizer.getLabels(), params, recognizer.getThreshold())
+
+    @staticmethod
+    def paths(prefix):
+        return prefix + ".hist.npy", prefix + ".labels.npy", prefix + ".lbph.json"
+
+    @classmethod
+    def exists(cls, prefix):
+        return all(os.path.exists(p) for p in cls.paths(prefix))
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        hist_path, labels_path, meta_path = cls.paths(prefix)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        histograms = np.load(hist_path, mmap_mode="r" if mmap else None)
+        labels = np.load(labels_path)
+        if not len(labels) == histograms.shape[0] == meta.get("count", len(labels)):
+            raise ValueError(f"Mô hình {prefix} đang được ghi lại (số histogram và nhãn không khớp), hãy nạp lại sau")
+        threshold = meta.get("threshold")
+        gallery = cls(histograms, labels, meta.get("params"),
+                      float("inf") if threshold is None else threshold)
+        gallery.prototypes = meta.get("prototypes")
+        index_path = prefix + ".ivf.npz"
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(hist_path):
+            gallery.index = IVFIndex.load(index_path)
+        inverse_path = prefix + ".inv.npy"
+        if os.path.exists(inverse_path) and os.path.getmtime(inverse_path) >= os.path.getmtime(hist_path):
+            gallery._inverse = np.load(inverse_path, mmap_mode="r" if mmap else None)
+        return gallery
+
+    def save(self, prefix):
+        """Mỗi file được ghi ra file tạm rồi os.replace để tiến trình đang nạp lại mô hình (vd.
+        recognizer_daemon.py) không đọc phải file ghi dở. .hist.npy được thay sau nhãn và meta (load
+        kiểm tra số dòng khớp nhau), .inv.npy và index sau cùng vì chỉ được dùng khi không cũ hơn .hist.npy."""
+        hist_path, labels_path, meta_path = self.paths(prefix)
+        save_npy(labels_path, self.labels)
+        threshold = None if not np.isfinite(self.threshold) or self.threshold > 1e300 else self.threshold
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"params": self.params, "threshold": threshold,
+                       "count": int(len(self.labels)), "prototypes": self.prototypes}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        save_npy(hist_path, np.ascontiguousarray(self.histograms, np.float32))
+        save_npy(prefix + ".inv.npy", self.inverse)
+        index_path = prefix + ".ivf.npz"
+        if self.index is not None:
+            self.index.save(index_path + ".tmp")
+            os.replace(index_path + ".tmp", index_path)
+        elif os.path.exists(index_path):
+            os.remove(index_path)
+
+    def histogram(self, face_img):
+        p = self.params
+        return compute_histogram(face_img, p["radius"], p["neighbors"], p["grid_x"], p["grid_y"])
+
+    def histograms_batch(self, crops):
+        "Histogram (B, D) cho danh sách ảnh khuôn mặt; các ảnh cùng kích thước được tính chung một lô"
+        crops = [np.asarray(c) for c in crops]
+        if crops and all(c.shape == crops[0].shape and c.ndim == 2 for c in crops):
+            return self.histogram(np.stack(crops))
+        return np.stack([self.histogram(c) for c in crops])
+
+    def with_index(self, nlist=0, nprobe=0):
+        "Tạo IVFIndex, trả về gallery mới đã sắp lại dòng theo cụm của index"
+        index, order = IVFIndex.build(self.histograms, nlist, nprobe)
+        gallery = LBPHGallery(np.asarray(self.histograms)[order], self.labels[order],
+                              self.params, self.threshold)
+        gallery.prototypes = self.prototypes
+        gallery.index = index
+        return gallery
+
+    @property
+    def inverse(self):
+        # ma trận D x N dùng cho chi_square_batch; nạp từ <prefix>.inv.npy nếu có, không thì tính một lần
+        if self._inverse is None:
+            self._inverse = inverse_columns(self.histograms)
+        return self._inverse
+
+    @property
+    def row_sums(self):
+        if self._row_sums is None:
+            self._row_sums = gallery_row_sums(self.histograms)
+        return self._row_sums
+
+    @property
+    def label_index(self):
+        if self._label_index is None:
+            self._label_index = np.unique(self.labels, return_inverse=True)
+        return self._label_index
+
+    def predict(self, face_img):
+        "Trả về (label, khoảng cách) của mẫu gần nhất; (-1, inf) nếu vượt ngưỡng hoặc gallery rỗng"
+        ids, confs = self.predict_batch([face_img])
+        return int(ids[0]), float(confs[0])
+
+    def predict_batch(self, crops, top_k=1, nprobe=0, exhaustive=False):
+        """Dự đoán cho nhiều khuôn mặt cùng lúc, trả về (ids, confs).
+
+        Nếu gallery có index (IVFIndex), chỉ nprobe cụm gần nhất được so khớp; exhaustive=True
+        luôn quét toàn bộ gallery.
+
+        top_k=1: hai mảng (B,) giống kết quả predict() của từng ảnh. top_k>1: hai mảng (B, k)
+        gồm k người khác nhau gần nhất (khoảng cách nhỏ nhất của mỗi người), tăng dần.
+        Kết quả vượt ngưỡng hoặc không đủ người có id -1 và khoảng cách inf.
+        """
+        count = len(crops)
+        k = max(1, top_k)
+        ids = np.full((count, k), -1, np.int32)
+        confs = np.full((count, k), np.inf)
+        if count and len(self.labels):
+            queries = self.histograms_batch(crops)
+            if self.index is not None and not exhaustive:
+                # chỉ so khớp chính xác các cụm gần nhất của index, các dòng khác coi như inf
+                dists = np.full((count, len(self.labels)), np.inf)
+                for i, ranges in enumerate(self.index.probe(queries, nprobe or self.nprobe)):
+                    for start, end in ranges:
+                        dists[i, start:end] = chi_square_range(self.inverse, self.row_sums,
+                                                               queries[i], start, end)
+            else:
+                dists = chi_square_batch(self.histograms, queries, self.inverse, self.row_sums)
+            if k == 1:
+                best = np.argmin(dists, axis=1)
+                ids[:, 0] = self.labels[best]
+                confs[:, 0] = dists[np.arange(count), best]
+            else:
+                uniq, inverse = self.label_index
+                per_label = np.full((count, len(uniq)), np.inf)
+                for i in range(count):
+                    np.minimum.at(per_label[i], inverse, dists[i])
+                k_avail = min(k, len(uniq))
+                order = np.argsort(per_label, axis=1)[:, :k_avail]
+                ids[:, :k_avail] = uniq[order]
+                confs[:, :k_avail] = np.take_along_axis(per_label, order, axis=1)
+            rejected = confs >= self.threshold
+            ids[rejected] = -1
+            confs[rejected] = np.inf
+        if top_k <= 1:
+            return ids[:, 0], confs[:, 0]
+        return ids, confs
+
+
+def export_model(model_path):
+    "Chuyển trainingData.yml sang định dạng nhị phân, trả về LBPHGallery"
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    gallery = LBPHGallery.from_recognizer(recognizer)
+    gallery.save(gallery_prefix(model_path))
+    return gallery
+
+
+def load_recognizer(model_path, model_format="auto"):
+    """Nạp mô hình nhận diện: 'npy' dùng LBPHGallery, 'yml' dùng cv2 LBPHFaceRecognizer,
+    'auto' dùng bản nhị phân nếu có và mô hình do build_model tạo (có manifest: bản nhị phân là bản
+    chính, có thể đã thu gọn/có index, còn .yml có thể được ensure_yml ghi lại sau), hoặc không cũ
+    hơn file yml."""
+    from model_builder import load_model_manifest  # model_builder import module này
+    prefix = gallery_prefix(model_path)
+    if model_format == "auto":
+        use_binary = LBPHGallery.exists(prefix) and (
+            load_model_manifest(model_path) is not None or
+            not os.path.exists(model_path) or
+            os.path.getmtime(prefix + ".hist.npy") >= os.path.getmtime(model_path))
+        model_format = "npy" if use_binary else "yml"
+    if model_format == "npy":
+        return LBPHGallery.load(prefix)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model_path)
+    return recognizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Chuyển mô hình LBPH (.yml) sang định dạng nhị phân nạp nhanh')
+    parser.add_argument('model', nargs='?', default='data/trainingData.yml', help='Đường dẫn file .yml')
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.model):
+        print(f"Không tìm thấy mô hình: {args.model}")
+        return 1
+    from model_builder import ensure_yml  # model_builder import module này
+    if not ensure_yml(args.model):
+        return 1
+    gallery = export_model(args.model)
+    print(f"Đã lưu {len(gallery.labels)} histogram tại: {gallery_prefix(args.model)}.hist.npy")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import time
+import cv2
+import numpy as np
+from face_store import FaceStore
+from lbph import LBPHGallery, gallery_prefix
+from prototypes import compress_gallery
+from ann_index import ANN_MIN_SAMPLES
+
+
+MODELS_DIR = "data/models"
+
+
+def shard_path(group, models_dir=MODELS_DIR):
+    "Đường dẫn mô hình riêng của một nhóm: data/models/<nhóm>.yml"
+    if not re.fullmatch(r"[\w-]+", group):
+        raise ValueError(f"Tên nhóm không hợp lệ: {group!r} (chỉ dùng chữ, số, '_' hoặc '-')")
+    return os.path.join(models_dir, f"{group}.yml")
+
+
+def manifest_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".manifest.json"
+
+
+def sample_key(entry):
+    return f"{entry['file']}|{entry['mtime']}|{entry['bytes']}"
+
+
+def load_model_manifest(model_path):
+    path = manifest_path_for(model_path)
+    if not os.path.exists(model_path) or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_model_manifest(model_path, size, keys, yml=True):
+    "yml=False: file .yml chưa chứa các mẫu thêm bằng cập nhật tăng dần (xem ensure_yml)"
+    path = manifest_path_for(model_path)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"size": list(size), "samples": sorted(keys), "yml": yml}, f)
+    os.replace(path + ".tmp", path)
+
+
+def remove_model(model_path):
+    "Xoá file .yml, manifest và bản nhị phân của mô hình (vd. không còn ảnh nào để huấn luyện)"
+    prefix = gallery_prefix(model_path)
+    for path in (model_path, manifest_path_for(model_path)) + LBPHGallery.paths(prefix) + \
+            (prefix + ".inv.npy", prefix + ".ivf.npz"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def wants_index(count, ann_lists=None):
+    "ann_lists=None: tự tạo index khi gallery có từ ANN_MIN_SAMPLES dòng; 0: không tạo; N: tạo N cụm"
+    if ann_lists is None:
+        return count >= ANN_MIN_SAMPLES
+    return ann_lists > 0
+
+
+def save_gallery(recognizer, model_path, prototypes=0, method="medoid", ann_lists=None):
+    """Lưu bản nhị phân nạp nhanh cho recognize.py: thu gọn còn tối đa prototypes mẫu mỗi người
+    nếu > 0, và tạo index ANN (IVF) khi gallery lớn (xem wants_index)."""
+    finish_gallery(LBPHGallery.from_recognizer(recognizer), model_path, prototypes, method, ann_lists)
+
+
+def finish_gallery(gallery, model_path, prototypes=0, method="medoid", ann_lists=None):
+    "Thu gọn/tạo index cho gallery đầy đủ mọi mẫu rồi lưu cạnh model_path"
+    if prototypes > 0:
+        full_count = len(gallery.labels)
+        gallery = compress_gallery(gallery, prototypes, method)
+        print(f"Đã thu gọn {full_count} mẫu còn {len(gallery.labels)} prototype ({method})")
+    if wants_index(len(gallery.labels), ann_lists):
+        start = time.perf_counter()
+        gallery = gallery.with_index(ann_lists or 0)
+        print(f"Đã tạo index ANN: {gallery.index.nlist} cụm, dò {gallery.index.nprobe} cụm mỗi lần "
+              f"({time.perf_counter() - start:.2f}s)")
+    gallery.save(gallery_prefix(model_path))
+
+
+def gallery_matches(model_path, prototypes=0, method="medoid", ann_lists=None):
+    "Bản nhị phân hiện có đã được lưu với cùng cấu hình thu gọn và index hay chưa"
+    prefix = gallery_prefix(model_path)
+    if not LBPHGallery.exists(prefix):
+        return False
+    current = LBPHGallery.load(prefix)
+    if wants_index(len(current.labels), ann_lists) != (current.index is not None):
+        return False
+    if ann_lists and current.index.nlist != min(ann_lists, len(current.labels)):
+        return False
+    if prototypes <= 0:
+        return current.prototypes is None
+    return current.prototypes is not None and current.prototypes["per_identity"] == prototypes \
+        and current.prototypes["method"] == method
+
+
+def save_model(recognizer, model_path, prototypes=0, method="medoid", ann_lists=None):
+    "Lưu mô hình dạng yml (OpenCV, luôn đủ mọi mẫu) và bản nhị phân (.hist.npy/.labels.npy)"
+    recognizer.save(model_path)
+    save_gallery(recognizer, model_path, prototypes, method, ann_lists)
+
+
+def append_samples(model_path, faces, labels, trained_count):
+    """Thêm histogram của các mẫu mới vào bản nhị phân đầy đủ (chưa thu gọn) đang có.
+
+    Trả về LBPHGallery mới, hoặc None nếu bản nhị phân không chứa đủ trained_count mẫu (đã thu
+    gọn bằng prototype hoặc không có) và cần huấn luyện lại từ kho ảnh. Histogram được tính bằng
+    NumPy (giống hệt OpenCV), không cần đọc/ghi lại file .yml.
+    """
+    prefix = gallery_prefix(model_path)
+    if not LBPHGallery.exists(prefix):
+        return None
+    current = LBPHGallery.load(prefix)
+    if current.prototypes is not None or len(current.labels) != trained_count:
+        return None
+    histograms = np.vstack([np.asarray(current.histograms, np.float32), current.histograms_batch(faces)])
+    return LBPHGallery(histograms, np.concatenate([current.labels, np.asarray(labels, np.int32)]),
+                       current.params, current.threshold)
+
+
+def store_rows(store, keys):
+    "Ảnh và nhãn trong FaceStore của các mẫu có khoá trong keys; None nếu kho thiếu mẫu nào đó"
+    faces, labels, _ = store.update()
+    manifest = store.load_manifest()
+    if manifest is None:
+        return None
+    wanted = set(keys)
+    rows = [i for i, entry in enumerate(manifest["files"]) if sample_key(entry) in wanted]
+    if len(rows) != len(wanted):
+        return None
+    return faces[rows], np.asarray(labels)[rows]
+
+
+def ensure_yml(model_path, data_dir="images"):
+    """Ghi lại file .yml nếu mô hình đã được cập nhật tăng dần (chỉ bản nhị phân có mẫu mới).
+
+    Dùng trước khi đọc .yml (prototypes.py, lbph.py, --model-format yml). Trả về False nếu ảnh
+    của mô hình không còn đủ trong data_dir, khi đó cần chạy train.py --full.
+    """
+    manifest = load_model_manifest(model_path)
+    if manifest is None or manifest.get("yml", True):
+        return True
+    store = FaceStore(data_dir)
+    if tuple(manifest.get("size", ())) != store.size:
+        return False
+    selected = store_rows(store, manifest["samples"])
+    if selected is None:
+        print(f"Ảnh của mô hình {model_path} đã thay đổi, hãy huấn luyện lại bằng train.py --full.")
+        return False
+    faces, labels = selected
+    start = time.perf_counter()
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(list(faces), np.array(labels))
+    recognizer.save(model_path)
+    save_model_manifest(model_path, store.size, manifest["samples"])
+    print(f"Đã ghi lại {model_path} với {len(labels)} mẫu ({time.perf_counter() - start:.2f}s)")
+    return True
+
+
+def build_model(data_dir="images", model_path="data/trainingData.yml", full=False,
+                prototypes=0, prototype_method="medoid", ann_lists=None, user_ids=None):
+    """Huấn luyện hoặc cập nhật mô hình LBPH từ data_dir.
+
+    Mô hình đi kèm một manifest (<model>.manifest.json) ghi các mẫu (tên file, mtime, kích thước)
+    mà nó đã chứa. Nếu mọi mẫu trong manifest vẫn còn nguyên, chỉ histogram của các mẫu mới được
+    tính và nối vào bản nhị phân (bản đã thu gọn thì huấn luyện lại từ kho ảnh FaceStore); file
+    .yml (ghi chậm hơn huấn luyện nhiều lần) chỉ được ghi lại khi cần đọc tới, xem ensure_yml.
+    Khi có mẫu bị xoá/sửa, đổi kích thước chuẩn hoặc full=True thì huấn luyện lại toàn bộ. Trả về số mẫu đã đưa vào mô hình ở lần chạy này, hoặc None
+    nếu không có dữ liệu. prototypes > 0 thu gọn bản nhị phân dùng khi nhận diện còn tối đa
+    prototypes mẫu mỗi người (xem prototypes.compress_gallery); file yml vẫn giữ đủ mọi mẫu.
+    ann_lists: số cụm của index ANN (None = tự chọn khi gallery lớn, 0 = không tạo index).
+    user_ids: chỉ dùng ảnh của các ID này (mô hình riêng của một nhóm, xem shard_path).
+    """
+    store = FaceStore(data_dir)
+    start = time.perf_counter()
+    faces, labels, stats = store.update()
+    print(f"Đã nạp {len(faces)} ảnh trong {time.perf_counter() - start:.2f}s "
+          f"(dùng lại {stats['reused']}, đọc mới {stats['loaded']}, bỏ qua {stats['skipped']}, "
+          f"đã xoá {stats['removed']})")
+    if len(faces) == 0:
+        return None
+
+    store_manifest = store.load_manifest()
+    keys = [sample_key(entry) for entry in store_manifest["files"]]
+    if user_ids is not None:
+        ids = {int(user_id) for user_id in user_ids if str(user_id).lstrip("-").isdigit()}
+        rows = np.flatnonzero(np.isin(labels, list(ids)))
+        if len(rows) == 0:
+            return None
+        faces, labels = faces[rows], np.asarray(labels)[rows]
+        keys = [keys[i] for i in rows]
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    model_manifest = None if full else load_model_manifest(model_path)
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if model_manifest is not None and tuple(model_manifest.get("size", ())) == store.size:
+        trained = set(model_manifest["samples"])
+        if trained.issubset(keys):
+            new_rows = [i for i, key in enumerate(keys) if key not in trained]
+            if not new_rows:
+                print("Mô hình đã chứa toàn bộ mẫu hiện có, không cần huấn luyện lại.")
+                if not gallery_matches(model_path, prototypes, prototype_method, ann_lists):
+                    # huấn luyện lại từ kho ảnh nhanh hơn đọc file .yml, và không phụ thuộc .yml
+                    recognizer.train(list(faces), np.array(labels))
+                    save_gallery(recognizer, model_path, prototypes, prototype_method, ann_lists)
+                return 0
+            print(f"Cập nhật mô hình với {len(new_rows)} mẫu mới (đã có {len(trained)} mẫu)...")
+            gallery = append_samples(model_path, faces[new_rows], np.asarray(labels)[new_rows], len(trained))
+            if gallery is not None:
+                finish_gallery(gallery, model_path, prototypes, prototype_method, ann_lists)
+            else:
+                # bản nhị phân đã thu gọn: huấn luyện lại từ kho ảnh nhưng vẫn không ghi .yml
+                recognizer.train(list(faces), np.array(labels))
+                save_gallery(recognizer, model_path, prototypes, prototype_method, ann_lists)
+            save_model_manifest(model_path, store.size, keys, yml=False)
+            return len(new_rows)
+        else:
+            print("Có mẫu đã bị xoá hoặc thay đổi, huấn luyện lại toàn bộ mô hình.")
+
+    print(f"Đang huấn luyện với {len(faces)} mẫu dữ liệu...")
+    recognizer.train(list(faces), np.array(labels))
+    save_model(recognizer, model_path, prototypes, prototype_method, ann_lists)
+    save_model_manifest(model_path, store.size, keys)
+    return len(faces)
@@ -0,0 +1,185 @@
+import threading
+import time
+from collections import deque
+from pipeline import DropOldestQueue, FramePacket, QueueClosed
+
+
+class Stream:
+    "Một nguồn khung hình trong MultiStreamRunner cùng hàng đợi và số liệu riêng"
+
+    def __init__(self, index, name, source, process_fn, queue_size):
+        self.index = index
+        self.name = name
+        self.source = source
+        self.process_fn = process_fn
+        self.queue_size = max(1, queue_size)
+        self.pending = deque()
+        self.busy = False
+        self.done = False
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.busy_time = 0.0
+        self.started = time.perf_counter()
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        avg_ms = 1000.0 * self.busy_time / self.processed if self.processed else 0.0
+        return (f"  {self.name}: đọc={self.captured} xử lý={self.processed} bỏ={self.dropped} "
+                f"fps={self.fps():.1f} trung bình={avg_ms:.1f}ms/khung hình")
+
+
+class MultiStreamRunner:
+    """Ghép nhiều camera vào một nhóm worker detect/nhận diện dùng chung.
+
+    Mỗi nguồn có một luồng capture và hàng đợi riêng (webcam/URL bỏ khung hình cũ nhất khi
+    bị tụt lại, file video/thư mục ảnh thì chờ). Worker lấy khung hình theo vòng tròn giữa
+    các nguồn đang có khung hình chờ, và mỗi nguồn chỉ có tối đa một khung hình đang được
+    xử lý: camera nhiều khuôn mặt hay fps cao không chiếm hết worker của các camera khác,
+    còn tracker của mỗi nguồn luôn nhận khung hình theo đúng thứ tự.
+    process_fn(packet) của từng nguồn chạy trên worker; kết quả (stream, packet) được lấy
+    ở luồng chính bằng get() để vẽ và hiển thị.
+    """
+
+    def __init__(self, workers=2, queue_size=2, max_frames=0):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_frames = max_frames
+        self.streams = []
+        self.cond = threading.Condition()
+        self.cursor = 0
+        self.stopping = False
+        self.paused = False
+        self.output = None
+        self.threads = []
+
+    def add(self, name, source, process_fn):
+        stream = Stream(len(self.streams), name, source, process_fn, self.queue_size)
+        self.streams.append(stream)
+        return stream
+
+    def start(self):
+        realtime = any(s.source.realtime for s in self.streams)
+        self.output = DropOldestQueue(max(4, 2 * len(self.streams)), not realtime, "output")
+        for stream in self.streams:
+            stream.started = time.perf_counter()
+            self._spawn(self._capture_loop, f"capture-{stream.index}", stream)
+        workers = [self._spawn(self._worker_loop, f"stream-worker-{i}") for i in range(self.workers)]
+
+        # đóng hàng đợi kết quả khi mọi worker đã kết thúc
+        def close_output():
+            for t in workers:
+                t.join()
+            self.output.close()
+        self._spawn(close_output, "output-closer")
+        return self
+
+    def _spawn(self, target, name, *args):
+        t = threading.Thread(target=target, args=args, name=name, daemon=True)
+        t.start()
+        self.threads.append(t)
+        return t
+
+    def _capture_loop(self, stream):
+        seq = 0
+        try:
+            while not self.stopping and not (self.max_frames and seq >= self.max_frames):
+                ret, img = stream.source.read()
+                if not ret:
+                    break
+                with self.cond:
+                    if not stream.source.realtime:
+                        while len(stream.pending) >= stream.queue_size and not self.stopping:
+                            self.cond.wait()
+                    elif len(stream.pending) >= stream.queue_size:
+                        stream.pending.popleft()
+                        stream.dropped += 1
+                    stream.pending.append(FramePacket(seq, img))
+                    stream.captured += 1
+                    self.cond.notify_all()
+                seq += 1
+        finally:
+            with self.cond:
+                stream.done = True
+                self.cond.notify_all()
+
+    def _next_job(self):
+        "Chọn nguồn kế tiếp theo vòng tròn có khung hình chờ và không có khung hình đang xử lý"
+        with self.cond:
+            while not self.stopping:
+                if self.paused:
+                    self.cond.wait()
+                    continue
+                n = len(self.streams)
+                for k in range(n):
+                    stream = self.streams[(self.cursor + k) % n]
+                    if stream.pending and not stream.busy:
+                        self.cursor = (stream.index + 1) % n
+                        stream.busy = True
+                        packet = stream.pending.popleft()
+                        self.cond.notify_all()
+                        return stream, packet
+                if all(s.done and not s.pending and not s.busy for s in self.streams):
+                    return None
+                self.cond.wait()
+            return None
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            stream, packet = job
+            t0 = time.perf_counter()
+            try:
+                stream.process_fn(packet)
+            except Exception as e:
+                print(f"Lỗi khi xử lý khung hình của {stream.name}: {e}")
+                packet = None
+            elapsed = time.perf_counter() - t0
+            try:
+                if packet is not None:
+                    self.output.put((stream, packet))
+            except QueueClosed:
+                pass
+            with self.cond:
+                stream.busy = False
+                stream.processed += 1
+                stream.busy_time += elapsed
+                self.cond.notify_all()
+
+    def get(self, timeout=None):
+        "Lấy (stream, packet) đã xử lý tiếp theo; trả về None khi mọi nguồn đã kết thúc"
+        try:
+            while True:
+                item = self.output.get(timeout=timeout)
+                if item is not None or timeout is not None:
+                    return item
+        except QueueClosed:
+            return None
+
+    def set_paused(self, paused):
+        "Tạm dừng/tiếp tục các worker (khung hình của webcam vẫn được đọc và bỏ bớt)"
+        with self.cond:
+            self.paused = paused
+            self.cond.notify_all()
+
+    def finished(self):
+        return self.output.closed and self.output.depth() == 0
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
+        if self.output is not None:
+            self.output.close()
+        for t in self.threads:
+            t.join(timeout=5)
+
+    def print_stats(self):
+        print("Thống kê theo camera:")
+        for stream in self.streams:
+            print(stream.stats())
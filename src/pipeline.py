@@ -0,0 +1,258 @@
+import threading
+import time
+from collections import deque
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class DropOldestQueue:
+    "Hàng đợi có giới hạn; khi đầy thì bỏ phần tử cũ nhất (hoặc chờ nếu block=True)"
+
+    def __init__(self, maxsize, block=False, name="queue"):
+        self.maxsize = maxsize
+        self.block = block
+        self.name = name
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        # số liệu thống kê
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.depth_sum = 0
+
+    def put(self, item):
+        "Thêm phần tử, trả về phần tử bị bỏ (nếu có)"
+        dropped = None
+        with self.cond:
+            if self.block:
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.cond.wait()
+            if self.closed:
+                raise QueueClosed()
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.put_count += 1
+            depth = len(self.items)
+            self.depth_sum += depth
+            self.max_depth = max(self.max_depth, depth)
+            self.cond.notify_all()
+        return dropped
+
+    def get(self, timeout=None):
+        "Lấy phần tử đầu hàng đợi; ném QueueClosed khi hàng đợi đã đóng và rỗng"
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while not self.items:
+                if self.closed:
+                    raise QueueClosed()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def depth(self):
+        with self.cond:
+            return len(self.items)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "depth": len(self.items),
+                "max_depth": self.max_depth,
+                "avg_depth": self.depth_sum / self.put_count if self.put_count else 0.0,
+                "put": self.put_count,
+                "dropped": self.dropped,
+            }
+
+
+class FramePacket:
+    "Dữ liệu của một khung hình khi đi qua các stage"
+
+    __slots__ = ("seq", "img", "gray", "faces", "tracks", "results", "captured_at")
+
+    def __init__(self, seq, img):
+        self.seq = seq
+        self.img = img
+        self.gray = None
+        self.faces = []
+        self.tracks = []
+        self.results = []
+        self.captured_at = time.perf_counter()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.busy += seconds
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "processed": self.count,
+                "avg_ms": 1000.0 * self.busy / self.count if self.count else 0.0,
+            }
+
+
+class Pipeline:
+    """Pipeline nhiều luồng: capture -> detect (nhiều worker) -> recognize -> hiển thị.
+
+    detect_fn(packet) gán packet.gray và packet.faces; recognize_fn(packet) gán packet.results.
+    Luồng chính lấy kết quả bằng get() để vẽ và xử lý phím; việc ghi điểm danh vào
+    SQLite/CSV do AttendanceWriter đảm nhận trên luồng riêng của nó.
+    Với nguồn thời gian thực (webcam) các hàng đợi bỏ khung hình cũ nhất khi bị tụt lại,
+    với file video/thư mục ảnh thì chờ để không mất khung hình.
+    """
+
+    def __init__(self, source, detect_fn, recognize_fn, detect_workers=2, queue_size=4,
+                 drop_oldest=None):
+        if drop_oldest is None:
+            drop_oldest = source.realtime
+        self.drop_oldest = drop_oldest
+        block = not drop_oldest
+        self.source = source
+        self.detect_fn = detect_fn
+        self.recognize_fn = recognize_fn
+        self.detect_workers = max(1, detect_workers)
+        self.queues = {
+            "capture": DropOldestQueue(queue_size, block, "capture"),
+            "detect": DropOldestQueue(queue_size, block, "detect"),
+            "output": DropOldestQueue(queue_size, block, "output"),
+        }
+        self.stats = {name: StageStats(name) for name in ("capture", "detect", "recognize")}
+        self.threads = []
+        self.stopping = threading.Event()
+        self.source_done = threading.Event()
+        self.last_seq = -1
+        self.stale = 0
+
+    def start(self):
+        self._spawn(self._capture_loop, "capture")
+        detect_threads = [self._spawn(self._detect_loop, f"detect-{i}") for i in range(self.detect_workers)]
+        self._spawn(self._recognize_loop, "recognize")
+
+        # đóng hàng đợi detect khi toàn bộ worker detect đã kết thúc
+        def close_detect():
+            for t in detect_threads:
+                t.join()
+            self.queues["detect"].close()
+        self._spawn(close_detect, "detect-closer")
+        return self
+
+    def _spawn(self, target, name):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self.threads.append(t)
+        return t
+
+    def _capture_loop(self):
+        seq = 0
+        try:
+            while not self.stopping.is_set():
+                t0 = time.perf_counter()
+                ret, img = self.source.read()
+                if not ret:
+                    break
+                self.stats["capture"].add(time.perf_counter() - t0)
+                self.queues["capture"].put(FramePacket(seq, img))
+                seq += 1
+        except QueueClosed:
+            pass
+        finally:
+            self.source_done.set()
+            self.queues["capture"].close()
+
+    def _detect_loop(self):
+        try:
+            while True:
+                packet = self.queues["capture"].get()
+                t0 = time.perf_counter()
+                self.detect_fn(packet)
+                self.stats["detect"].add(time.perf_counter() - t0)
+                self.queues["detect"].put(packet)
+        except QueueClosed:
+            pass
+
+    def _recognize_loop(self):
+        # các worker detect có thể trả kết quả không theo thứ tự:
+        # chế độ chờ (không mất khung hình) thì sắp xếp lại theo seq,
+        # chế độ bỏ khung hình cũ thì bỏ luôn khung hình đến muộn
+        pending = {}
+        try:
+            while True:
+                packet = self.queues["detect"].get()
+                if self.drop_oldest:
+                    if packet.seq < self.last_seq:
+                        self.stale += 1
+                        continue
+                    self._recognize(packet)
+                    continue
+                pending[packet.seq] = packet
+                while self.last_seq + 1 in pending:
+                    self._recognize(pending.pop(self.last_seq + 1))
+        except QueueClosed:
+            pass
+        finally:
+            self.queues["output"].close()
+
+    def _recognize(self, packet):
+        self.last_seq = packet.seq
+        t0 = time.perf_counter()
+        self.recognize_fn(packet)
+        self.stats["recognize"].add(time.perf_counter() - t0)
+        self.queues["output"].put(packet)
+
+    def get(self, timeout=None):
+        "Lấy khung hình đã xử lý tiếp theo; trả về None khi pipeline đã kết thúc"
+        try:
+            while True:
+                packet = self.queues["output"].get(timeout=timeout)
+                if packet is not None or timeout is not None:
+                    return packet
+        except QueueClosed:
+            return None
+
+    def stop(self):
+        "Dừng capture/detect/recognize"
+        self.stopping.set()
+        for name in ("capture", "detect", "output"):
+            self.queues[name].close()
+        for t in self.threads:
+            t.join(timeout=5)
+
+    def metrics(self):
+        return {
+            "queues": {name: q.stats() for name, q in self.queues.items()},
+            "stages": {name: s.as_dict() for name, s in self.stats.items()},
+            "stale_frames": self.stale,
+        }
+
+    def print_metrics(self):
+        m = self.metrics()
+        print("Thống kê pipeline:")
+        for name, s in m["stages"].items():
+            print(f"  stage {name:<10} xử lý={s['processed']:<6} trung bình={s['avg_ms']:.2f}ms")
+        for name, q in m["queues"].items():
+            print(f"  queue {name:<10} sâu hiện tại={q['depth']:<3} tối đa={q['max_depth']:<3} "
+                  f"trung bình={q['avg_depth']:.2f} bỏ={q['dropped']}")
+        if m["stale_frames"]:
+            print(f"  khung hình cũ bị bỏ: {m['stale_frames']}")
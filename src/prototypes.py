@@ -0,0 +1,92 @@
+import os
+import sys
+import argparse
+import numpy as np
+from lbph import LBPHGallery, chi_square_batch, export_model, gallery_prefix
+from ann_index import ANN_MIN_SAMPLES
+
+METHODS = ("medoid", "mean")
+
+
+def cluster_identity(dists, k, iterations=10):
+    """Chia các mẫu của một người thành k cụm theo ma trận khoảng cách (k-medoids).
+
+    Khởi tạo bằng farthest-first từ mẫu trung tâm nhất, sau đó lặp gán mẫu vào medoid
+    gần nhất / chọn lại medoid có tổng khoảng cách nhỏ nhất trong cụm. Trả về
+    (medoids, assignment).
+    """
+    n = len(dists)
+    k = min(k, n)
+    medoids = [int(np.argmin(dists.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(dists[:, medoids].min(axis=1))))
+    medoids = np.array(medoids)
+    for _ in range(iterations):
+        assignment = np.argmin(dists[:, medoids], axis=1)
+        new_medoids = medoids.copy()
+        for c in range(k):
+            members = np.flatnonzero(assignment == c)
+            if len(members):
+                new_medoids[c] = members[np.argmin(dists[np.ix_(members, members)].sum(axis=1))]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+    return medoids, np.argmin(dists[:, medoids], axis=1)
+
+
+def compress_gallery(gallery, per_identity, method="medoid"):
+    """Thu gọn gallery còn tối đa per_identity prototype cho mỗi người.
+
+    method='medoid' giữ lại histogram medoid của mỗi cụm, method='mean' dùng trung bình
+    các histogram trong cụm (vẫn là histogram đã chuẩn hoá hợp lệ).
+    """
+    if method not in METHODS:
+        raise ValueError(f"method phải là một trong {METHODS}")
+    histograms = np.asarray(gallery.histograms, np.float32)
+    rows, labels = [], []
+    for label in np.unique(gallery.labels):
+        idx = np.flatnonzero(gallery.labels == label)
+        samples = histograms[idx]
+        if len(idx) <= per_identity:
+            rows.append(samples)
+            labels.extend([label] * len(idx))
+            continue
+        medoids, assignment = cluster_identity(chi_square_batch(samples, samples), per_identity)
+        if method == "medoid":
+            rows.append(samples[medoids])
+        else:
+            rows.append(np.stack([samples[assignment == c].mean(axis=0) for c in range(len(medoids))]))
+        labels.extend([label] * len(medoids))
+    compressed = LBPHGallery(np.vstack(rows).astype(np.float32) if rows else histograms[:0],
+                             np.array(labels, np.int32), gallery.params, gallery.threshold)
+    compressed.prototypes = {"per_identity": per_identity, "method": method,
+                             "samples": int(len(gallery.labels))}
+    return compressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Thu gọn mô hình LBPH thành vài prototype cho mỗi người')
+    parser.add_argument('model', nargs='?', default='data/trainingData.yml', help='Đường dẫn file .yml')
+    parser.add_argument('--prototypes', type=int, default=5, help='Số prototype tối đa cho mỗi người')
+    parser.add_argument('--method', choices=METHODS, default='medoid',
+                        help='medoid: giữ mẫu đại diện, mean: trung bình histogram của cụm')
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.model):
+        print(f"Không tìm thấy mô hình: {args.model}")
+        return 1
+    # luôn thu gọn từ mô hình đầy đủ trong file .yml
+    from model_builder import ensure_yml  # model_builder dùng compress_gallery của module này
+    if not ensure_yml(args.model):
+        return 1
+    full = export_model(args.model)
+    compressed = compress_gallery(full, args.prototypes, args.method)
+    if len(compressed.labels) >= ANN_MIN_SAMPLES:
+        compressed = compressed.with_index()
+    compressed.save(gallery_prefix(args.model))
+    print(f"Đã thu gọn {len(full.labels)} mẫu còn {len(compressed.labels)} prototype "
+          f"({args.method}, tối đa {args.prototypes} mỗi người)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,138 +1,397 @@
 import cv2
 import numpy as np
-import sqlite3
 import os
-import datetime
-import pandas as pd
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 import sys
+import time
 import argparse
+import atexit
+import signal
+import threading
+from frame_source import open_source, WindowSink, HeadlessSink
+from pipeline import Pipeline, FramePacket
+from multi_stream import MultiStreamRunner
+from tracker import FaceTracker, DetectionScheduler
+from detector import FaceDetector
+from database import get_db, ProfileCache
+from attendance_writer import AttendanceWriter, AttendanceDedup
+from face_store import normalize_face
+from lbph import LBPHGallery, load_recognizer, gallery_prefix
+from model_builder import shard_path, ensure_yml
 
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 
-def main(args=None):
+class StopRequested(Exception):
+    pass
+
+def request_stop(signum, frame):
+    raise StopRequested()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Nhận diện khuôn mặt và điểm danh')
+    parser.add_argument('--mode', type=str, choices=['auto', 'manual'], default='manual',
+                        help='Chế độ nhận diện: tự động hoặc thủ công')
+    parser.add_argument('--source', type=str, nargs='+', default=['0'],
+                        help='Nguồn khung hình: chỉ số webcam, file video, thư mục ảnh hoặc URL camera; '
+                             'nhiều nguồn được xử lý trong cùng một tiến trình')
+    parser.add_argument('--headless', action='store_true',
+                        help='Chạy không hiển thị cửa sổ (dùng để benchmark/kiểm thử)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Ghi khung hình đã xử lý ra file video (chỉ dùng với --headless)')
+    parser.add_argument('--max-frames', type=int, default=0,
+                        help='Dừng sau số khung hình này, với nhiều nguồn là số khung hình mỗi nguồn (0 = không giới hạn)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Chạy capture/detect/recognize/ghi dữ liệu trên các luồng riêng')
+    parser.add_argument('--detect-workers', type=int, default=2,
+                        help='Số luồng chạy Haar cascade khi dùng --pipeline hoặc nhiều nguồn')
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help='Kích thước tối đa của mỗi hàng đợi giữa các stage')
+    parser.add_argument('--stats-interval', type=float, default=0,
+                        help='In độ sâu hàng đợi mỗi N giây (0 = chỉ in khi kết thúc)')
+    parser.add_argument('--refresh-interval', type=int, default=30,
+                        help='Số khung hình giữa hai lần nhận diện lại một khuôn mặt đang được theo dõi')
+    parser.add_argument('--track-max-missed', type=int, default=10,
+                        help='Xoá track sau số khung hình liên tiếp không thấy khuôn mặt')
+    parser.add_argument('--detect-every', type=int, default=1,
+                        help='Chạy Haar cascade mỗi N khung hình, các khung hình còn lại nội suy bằng tracker')
+    parser.add_argument('--detect-width', type=int, default=0,
+                        help='Thu nhỏ ảnh về chiều rộng này trước khi chạy Haar cascade (0 = giữ nguyên)')
+    parser.add_argument('--min-face', type=int, default=0,
+                        help='Kích thước khuôn mặt nhỏ nhất cần tìm, pixel theo ảnh gốc (0 = không giới hạn)')
+    parser.add_argument('--max-face', type=int, default=0,
+                        help='Kích thước khuôn mặt lớn nhất cần tìm, pixel theo ảnh gốc (0 = không giới hạn)')
+    parser.add_argument('--cascade-threads', type=int, default=3,
+                        help='Số luồng chạy song song các lượt cascade trong một khung hình (1 = tuần tự)')
+    parser.add_argument('--no-mirror-profile', action='store_true',
+                        help='Không chạy cascade mặt nghiêng trên ảnh lật ngang')
+    parser.add_argument('--write-batch', type=int, default=32,
+                        help='Số lượt điểm danh gom lại trước khi ghi SQLite/CSV')
+    parser.add_argument('--write-interval', type=float, default=1.0,
+                        help='Thời gian tối đa (giây) giữ lượt điểm danh trong bộ nhớ trước khi ghi')
+    parser.add_argument('--attendance-window', type=int, default=1440,
+                        help='Mỗi người chỉ điểm danh một lần trong mỗi khung N phút tính từ nửa đêm '
+                             '(1440 = một lần mỗi ngày, vd. 90 cho mỗi tiết học)')
+    parser.add_argument('--model-format', type=str, choices=['auto', 'npy', 'yml'], default='auto',
+                        help='Định dạng mô hình: npy (histogram memory-map, nạp nhanh), yml (OpenCV), '
+                             'auto = dùng npy nếu có và mới hơn yml')
+    parser.add_argument('--group', type=str, default=None,
+                        help='Chỉ nhận diện thành viên của nhóm này, dùng mô hình data/models/<nhóm>.*')
+    parser.add_argument('--ann-probe', type=int, default=0,
+                        help='Số cụm index ANN được so khớp cho mỗi khuôn mặt (0 = theo mô hình)')
+    parser.add_argument('--no-ann', action='store_true',
+                        help='Bỏ qua index ANN, luôn so khớp với toàn bộ mô hình')
+    return parser.parse_args(argv)
+
+def build_detector(args):
+    return FaceDetector(detect_width=getattr(args, 'detect_width', 0),
+                        min_face=getattr(args, 'min_face', 0),
+                        max_face=getattr(args, 'max_face', 0),
+                        cascade_threads=getattr(args, 'cascade_threads', 3),
+                        mirror_profile=not getattr(args, 'no_mirror_profile', False))
+
+def model_path_for(args):
+    group = getattr(args, 'group', None)
+    # --group: chỉ nạp mô hình riêng của nhóm (lớp/phòng) thay vì mô hình chung
+    return os.path.abspath(shard_path(group) if group else "data/trainingData.yml")
+
+def load_model(args):
+    "Nạp mô hình nhận diện theo --group/--model-format/--ann-probe; None nếu chưa có mô hình"
+    try:
+        model_path = model_path_for(args)
+        model_format = getattr(args, 'model_format', 'auto')
+        if not (os.path.exists(model_path) or LBPHGallery.exists(gallery_prefix(model_path))):
+            print("Không tìm thấy mô hình nhận diện. Chỉ sử dụng chế độ đăng ký thủ công.")
+            return None
+        if model_format == 'yml':
+            # mô hình vừa được cập nhật tăng dần chỉ có mẫu mới trong bản nhị phân
+            ensure_yml(model_path)
+        start = time.perf_counter()
+        rec = load_recognizer(model_path, model_format)
+        kind = "nhị phân" if isinstance(rec, LBPHGallery) else "yml"
+        if isinstance(rec, LBPHGallery) and rec.index is not None:
+            if getattr(args, 'no_ann', False):
+                rec.index = None
+            else:
+                rec.nprobe = getattr(args, 'ann_probe', 0)
+                kind += f", index ANN {rec.index.nlist} cụm"
+        print(f"Đã tải mô hình nhận diện khuôn mặt ({kind}, {time.perf_counter() - start:.2f}s).")
+        return rec
+    except Exception as e:
+        print(f"Lỗi khi tải mô hình nhận diện: {e}")
+        return None
+
+class StreamProcessor:
+    """Detect, theo dõi và nhận diện khuôn mặt cho một nguồn khung hình.
+
+    Mỗi camera có một bản riêng (tracker, lịch detect và khung hình trước đó cho optical
+    flow) nhưng dùng chung detector, mô hình và ProfileCache; các khung hình của cùng một
+    nguồn phải được xử lý lần lượt theo thứ tự.
+    Điểm danh (dedup + writer) được ghi ngay khi nhận ra một người trong identify(), nên
+    khung hình bị bỏ ở hàng đợi hiển thị không làm mất lượt điểm danh.
+    """
+
+    def __init__(self, args, detector, rec, profiles, auto_mode=True, writer=None, dedup=None, name=None):
+        self.detector = detector
+        self.rec = rec
+        self.profiles = profiles
+        self.auto_mode = auto_mode
+        self.writer = writer
+        self.dedup = dedup
+        self.name = name
+        self.tracker = FaceTracker(max_missed=getattr(args, 'track_max_missed', 10),
+                                   refresh_interval=getattr(args, 'refresh_interval', 30))
+        self.scheduler = DetectionScheduler(getattr(args, 'detect_every', 1))
+        self.prev_gray = None
+        # danh tính gán khi đăng ký thủ công, áp dụng ở identify() để chỉ một luồng sửa track
+        self.assignments = []
+        self.assign_lock = threading.Lock()
+
+    def assign_identity(self, track, identity):
+        with self.assign_lock:
+            self.assignments.append((track, identity))
+
+    def apply_assignments(self):
+        with self.assign_lock:
+            assignments, self.assignments = self.assignments, []
+        for track, identity in assignments:
+            self.tracker.assign_identity(track, identity)
+
+    def mark_attendance(self, id, conf, profile):
+        if self.dedup is None or not self.dedup.mark(id):
+            return
+        self.writer.log(id, profile[1], profile[3], profile[2], conf)
+        where = f" tai {self.name}" if self.name else ""
+        print(f"Da diem danh cho {profile[1]} (ID: {id}){where}")
+
+    def detect(self, packet):
+        gray = cv2.cvtColor(packet.img, cv2.COLOR_BGR2GRAY)
+        packet.gray = cv2.equalizeHist(gray)
+        
+        # None nghĩa là khung hình này không detect, hộp sẽ được nội suy từ tracker
+        packet.faces = None
+        if not self.scheduler.should_detect(packet.seq):
+            return
+        t0 = time.perf_counter()
+        packet.faces = self.detector.detect(packet.gray)
+        self.scheduler.record_detect(time.perf_counter() - t0)
+
+    def identify(self, packet):
+        """Gán track cho từng khuôn mặt và chỉ dự đoán ID khi track cần làm mới.
+
+        Kết quả mỗi khuôn mặt là (id, conf, profile) nếu vừa predict ở khung hình này, ngược lại None.
+        """
+        tracker = self.tracker
+        self.apply_assignments()
+        if packet.faces is None:
+            t0 = time.perf_counter()
+            packet.tracks, lost = tracker.propagate(self.prev_gray, packet.gray)
+            packet.faces = [track.box for track in packet.tracks]
+            self.scheduler.record_propagate(time.perf_counter() - t0)
+            if lost:
+                self.scheduler.force()
+        else:
+            packet.tracks = tracker.update(packet.faces)
+        self.prev_gray = packet.gray
+        packet.results = [None] * len(packet.faces)
+        pending = [i for i, track in enumerate(packet.tracks)
+                   if self.auto_mode and self.rec is not None and tracker.needs_prediction(track)]
+        if not pending:
+            return
+        crops = []
+        for i in pending:
+            x, y, w, h = packet.faces[i]
+            crops.append(normalize_face(packet.gray[y:y + h, x:x + w]))
+        if hasattr(self.rec, 'predict_batch'):
+            # mọi khuôn mặt cần nhận diện trong khung hình được so với gallery trong một lần
+            ids, confs = self.rec.predict_batch(crops)
+            predictions = [(int(id), float(conf)) for id, conf in zip(ids, confs)]
+        else:
+            predictions = [self.rec.predict(crop) for crop in crops]
+        for i, (id, conf) in zip(pending, predictions):
+            print(f"Predicted ID: {id}, Confidence: {conf}")
+            profile = self.profiles.get(id) if conf < 70 else None  #ngưỡng nhận diện
+            identity = None
+            if profile:
+                status = 'known'
+                identity = {'id': id, 'name': profile[1], 'gender': profile[2], 'age': profile[3]}
+            else:
+                status = 'not_found' if conf < 70 else 'unknown'
+            tracker.record_prediction(packet.tracks[i], status, conf, identity)
+            packet.results[i] = (id, conf, profile)
+            if identity is not None:
+                self.mark_attendance(id, conf, profile)
+
+def stream_output_path(path, index):
+    "out.mp4 -> out_0.mp4, out_1.mp4... khi ghi video của nhiều nguồn"
+    if not path:
+        return None
+    base, ext = os.path.splitext(path)
+    return f"{base}_{index}{ext}"
+
+def run_streams(args, sources, detector, rec, profiles, writer, dedup, control=None):
+    """Nhận diện trên nhiều nguồn trong một tiến trình.
+
+    Các nguồn dùng chung detector, mô hình, nhóm worker và AttendanceWriter; mỗi nguồn có
+    tracker riêng. Chế độ này không hỗ trợ đăng ký khuôn mặt mới (chỉ phím 'a' và 'q').
+    """
+    fontface = cv2.FONT_HERSHEY_SIMPLEX
+    fontscale = 0.8
+    auto_mode = args.mode == 'auto'
+    headless = getattr(args, 'headless', False)
+    runner = MultiStreamRunner(workers=getattr(args, 'detect_workers', 2),
+                               queue_size=getattr(args, 'queue_size', 4),
+                               max_frames=getattr(args, 'max_frames', 0))
+    processors, cams, sinks = [], [], {}
+
+    for spec in sources:
+        cam = open_source(spec)
+        if not cam.isOpened():
+            print(f"Không thể mở nguồn {spec}, bỏ qua.")
+            continue
+        name = f"camera {len(cams)} ({spec})"
+        processor = StreamProcessor(args, detector, rec, profiles, auto_mode, writer, dedup, name)
+
+        def process(packet, processor=processor):
+            processor.detect(packet)
+            processor.identify(packet)
+
+        stream = runner.add(name, cam, process)
+        sinks[stream.index] = (HeadlessSink(stream_output_path(getattr(args, 'output', None), stream.index))
+                               if headless else WindowSink(f"Face Recognition - {stream.index}"))
+        processors.append(processor)
+        cams.append(cam)
+    if not cams:
+        print("Không mở được nguồn nào. Hãy kiểm tra lại kết nối.")
+        return
+    print(f"Nhận diện trên {len(cams)} nguồn với {runner.workers} worker dùng chung.")
+
+    stats_interval = getattr(args, 'stats_interval', 0)
+    last_stats = time.perf_counter()
+    start_time = time.perf_counter()
+    try:
+        runner.start()
+        while True:
+            if control is not None:
+                runner.set_paused(control.paused)
+                if not control.wait_while_paused():
+                    break
+                runner.set_paused(False)
+                auto_mode = control.mode == 'auto'
+                for processor in processors:
+                    processor.auto_mode = auto_mode
+                control.frames = sum(s.processed for s in runner.streams)
+            item = runner.get(timeout=0.5)
+            if item is None:
+                if runner.finished():
+                    print("Đã đọc hết khung hình từ mọi nguồn.")
+                    break
+                continue
+            stream, packet = item
+            img = packet.img
+            for (x, y, w, h), track in zip(packet.faces, packet.tracks):
+                cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                if track.identity is not None:
+                    label = f"ID: {track.identity['id']}, Name: {track.identity['name']}"
+                else:
+                    label = {'not_found': "Not Found", 'unknown': "Unknown"}.get(track.status, "")
+                cv2.putText(img, label, (x, y + h + 30), fontface, fontscale, (0, 255, 0), 2)
+            cv2.putText(img, f"{stream.name}: {stream.fps():.1f} fps", (10, 30), fontface, fontscale,
+                        (255, 255, 255), 2)
+            mode_text = "CHE DO TU DONG" if auto_mode else "CHE DO THU CONG"
+            cv2.putText(img, mode_text, (img.shape[1] - 250, 30), fontface, fontscale, (0, 165, 255), 2)
+            key = sinks[stream.index].show(img)
+
+            if stats_interval and time.perf_counter() - last_stats >= stats_interval:
+                runner.print_stats()
+                last_stats = time.perf_counter()
+            if key == ord('q'):
+                break
+            elif key == ord('a'):
+                auto_mode = not auto_mode
+                for processor in processors:
+                    processor.auto_mode = auto_mode
+                if control is not None:
+                    control.mode = 'auto' if auto_mode else 'manual'
+                print(f"Da chuyen sang che do {'tu dong' if auto_mode else 'thu cong'}")
+    except (KeyboardInterrupt, StopRequested):
+        print("Đã nhận tín hiệu dừng, đang lưu dữ liệu còn lại...")
+
+    runner.stop()
+    elapsed = time.perf_counter() - start_time
+    total = sum(s.processed for s in runner.streams)
+    if total and elapsed > 0:
+        print(f"Đã xử lý {total} khung hình từ {len(cams)} nguồn trong {elapsed:.2f}s ({total / elapsed:.1f} fps)")
+    runner.print_stats()
+    for processor in processors:
+        if processor.scheduler.detect_count:
+            print(f"{processor.name}:")
+            processor.scheduler.report(elapsed)
+    predictions = sum(p.tracker.predictions for p in processors)
+    faces_seen = sum(p.tracker.faces_seen for p in processors)
+    if faces_seen:
+        print(f"Số lần gọi predict: {predictions} cho {faces_seen} khuôn mặt ({predictions / faces_seen:.1%})")
+    for cam in cams:
+        cam.release()
+    for sink in sinks.values():
+        sink.close()
+
+def main(args=None, source=None, sink=None, control=None, resources=None):
+    """Vòng lặp nhận diện/điểm danh.
+
+    control (tuỳ chọn, xem recognizer_daemon.SessionControl) cho phép dừng, tạm dừng và đổi
+    chế độ từ bên ngoài; resources cung cấp detector/mô hình đã nạp sẵn để dùng lại giữa
+    các phiên thay vì nạp lại mỗi lần.
+    """
     if args is None:
-        parser = argparse.ArgumentParser(description='Nhận diện khuôn mặt và điểm danh')
-        parser.add_argument('--mode', type=str, choices=['auto', 'manual'], default='manual',
-                            help='Chế độ nhận diện: tự động hoặc thủ công')
-        args = parser.parse_args()
+        args = parse_args()
     
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    face_profile_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_profileface.xml')
-    if face_cascade.empty() or face_profile_cascade.empty():
+    detector = resources.get_detector(args) if resources is not None else build_detector(args)
+    if not detector.is_loaded():
         print("Không thể tải tệp Haar Cascade. Hãy kiểm tra đường dẫn.")
         return
 
-    def connect_to_db():
-        db_path = os.path.abspath('data/FaceBase.db')
-        if not os.path.exists(os.path.dirname(db_path)):
-            os.makedirs(os.path.dirname(db_path))
-        conn = sqlite3.connect(db_path)
-        
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS People (
-            ID TEXT PRIMARY KEY,
-            Name TEXT,
-            Gender TEXT,
-            Age TEXT
-        )
-        ''')
-        
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS Attendance (
-            ID INTEGER PRIMARY KEY AUTOINCREMENT,
-            UserID TEXT,
-            RecognitionTime TIMESTAMP,
-            Status TEXT,
-            FOREIGN KEY (UserID) REFERENCES People(ID)
-        )
-        ''')
-        
-        conn.commit()
-        return conn
+    db = get_db()
+    profiles = ProfileCache(db)
 
     def check_id_exists(id):
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM People WHERE ID = ?", (id,))
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count > 0
+        return db.person_exists(id)
 
     def add_new_person(id, name, gender, age):
-        conn = connect_to_db()
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO People (ID, Name, Gender, Age) VALUES (?, ?, ?, ?)", 
-                    (id, name, gender, age))
-        conn.commit()
-        conn.close()
+        db.add_person(id, name, gender, age)
+        if getattr(args, 'group', None):
+            db.add_group_members(args.group, [id])
         print(f"Đã thêm người mới: ID={id}, Name={name}")
 
-    def getProfile(id):
-        conn = connect_to_db()
-        cmd = "SELECT * FROM People WHERE ID = ?"
-        cursor = conn.execute(cmd, (id,))
-        profile = cursor.fetchone()
-        conn.close()
-        return profile
-
-    def log_attendance(user_id, status="Có mặt"):
-        try:
-            conn = connect_to_db()
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO Attendance (UserID, RecognitionTime, Status) VALUES (?, ?, ?)", 
-                        (user_id, datetime.datetime.now(), status))
-            conn.commit()
-            conn.close()
-            print(f"Đã lưu điểm danh vào SQLite cho ID: {user_id}")
-            return True
-        except Exception as e:
-            print(f"Lỗi khi lưu vào SQLite: {e}")
-            return False
-
-    def save_to_csv(user_id, name, age, gender, confidence, status="Đã điểm danh"):
-        try:
-            data = {
-                "UserID": [user_id],
-                "Name": [name],
-                "Age": [age],
-                "Gender": [gender],
-                "Confidence": [confidence],
-                "Status": [status],
-                "RecognitionTime": [datetime.datetime.now()]
-            }
-            df = pd.DataFrame(data)
-            csv_path = "attendance.csv"
-            if not os.path.exists(csv_path):
-                df.to_csv(csv_path, index=False)
-                print(f"Đã tạo mới file {csv_path} và lưu dữ liệu cho {name}")
-            else:
-                df.to_csv(csv_path, mode='a', header=False, index=False)
-                print(f"Đã thêm dữ liệu vào {csv_path} cho {name}")
-            return True
-        except Exception as e:
-            print(f"Lỗi khi lưu vào CSV: {e}")
-            return False
+    writer = AttendanceWriter(db, "attendance.csv",
+                              batch_size=getattr(args, 'write_batch', 32),
+                              flush_interval=getattr(args, 'write_interval', 1.0)).start()
+    dedup = AttendanceDedup(db, getattr(args, 'attendance_window', 1440))
+    if control is None:
+        # gui.py dừng tiến trình bằng SIGTERM: thoát vòng lặp bình thường để ghi nốt hàng đợi điểm danh
+        atexit.register(writer.close)
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, request_stop)
 
-    try:
-        rec = cv2.face.LBPHFaceRecognizer_create()
-        model_path = os.path.abspath("data/trainingData.yml")
-        if os.path.exists(model_path):
-            rec.read(model_path)
-            use_recognition = True
-            print("Đã tải mô hình nhận diện khuôn mặt.")
-        else:
-            use_recognition = False
-            print("Không tìm thấy mô hình nhận diện. Chỉ sử dụng chế độ đăng ký thủ công.")
-    except Exception as e:
-        use_recognition = False
-        print(f"Lỗi khi tải mô hình nhận diện: {e}")
+    rec = resources.get_model(args) if resources is not None else load_model(args)
+
+    sources = [source] if source is not None else getattr(args, 'source', ['0'])
+    if isinstance(sources, str):
+        sources = [sources]
+    if len(sources) > 1:
+        # nhiều camera: một tiến trình, một bản detector/mô hình và một AttendanceWriter
+        run_streams(args, sources, detector, rec, profiles, writer, dedup, control)
+        writer.close()
+        if resources is None:
+            detector.close()
+        return 0
 
-    root = tk.Tk()
-    root.withdraw()  # Ẩn cửa sổ chính
+    headless = getattr(args, 'headless', False)
+    root = None
+    if not headless:
+        root = tk.Tk()
+        root.withdraw()  # Ẩn cửa sổ chính
 
     fontface = cv2.FONT_HERSHEY_SIMPLEX
     fontscale = 0.8
@@ -140,174 +399,221 @@ def main(args=None):
     success_color = (0, 255, 0)  
     error_color = (0, 0, 255)  
 
-    recognized_ids = set()
-    processed_faces = {}
     current_face_index = None
     registering_new_face = False
 
-    cam = cv2.VideoCapture(0)
+    cam = open_source(sources[0])
     if not cam.isOpened():
         print("Không thể mở camera. Hãy kiểm tra lại kết nối.")
+        writer.close()
+        if root is not None:
+            root.destroy()
         return
+    if sink is None:
+        sink = HeadlessSink(getattr(args, 'output', None)) if headless else WindowSink('Face Recognition')
+    max_frames = getattr(args, 'max_frames', 0)
 
     registration_mode = False
     face_to_register = None
     auto_mode = args.mode == 'auto'
 
-    while True:
+    processor = StreamProcessor(args, detector, rec, profiles, auto_mode, writer, dedup)
+    tracker = processor.tracker
+    scheduler = processor.scheduler
+
+    use_pipeline = getattr(args, 'pipeline', False)
+    pipeline = None
+    if use_pipeline:
+        pipeline = Pipeline(cam, processor.detect, processor.identify,
+                            detect_workers=getattr(args, 'detect_workers', 2),
+                            queue_size=getattr(args, 'queue_size', 4)).start()
+
+    def next_packet(seq):
+        if pipeline is not None:
+            return pipeline.get()
         ret, img = cam.read()
         if not ret:
-            print("Không thể đọc khung hình từ camera.")
-            break
+            return None
+        packet = FramePacket(seq, img)
+        processor.detect(packet)
+        processor.identify(packet)
+        return packet
 
-        original_img = img.copy()
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
-        profile_faces = face_profile_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
-        all_faces = list(faces) + list(profile_faces)  # Kết hợp cả hai
+    stats_interval = getattr(args, 'stats_interval', 0)
+    last_stats = time.perf_counter()
+    frame_count = 0
+    start_time = time.perf_counter()
+    try:
+        while True:
+            if control is not None:
+                # lệnh từ recognizer_daemon: dừng, tạm dừng hoặc đổi chế độ giữa hai khung hình
+                if not control.wait_while_paused():
+                    break
+                auto_mode = processor.auto_mode = control.mode == 'auto'
+            packet = next_packet(frame_count)
+            if packet is None:
+                if cam.realtime:
+                    print("Không thể đọc khung hình từ camera.")
+                else:
+                    print("Đã đọc hết khung hình từ nguồn.")
+                break
+            frame_count += 1
+            if control is not None:
+                control.frames = frame_count
+            img = packet.img
+            all_faces = packet.faces
 
-        for i, (x, y, w, h) in enumerate(all_faces):
-            face_id = f"{x}_{y}_{w}_{h}"
+            for i, ((x, y, w, h), track, result) in enumerate(zip(all_faces, packet.tracks, packet.results)):
+                cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
             
-            cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                cv2.putText(img, f"Face #{i+1}", (x, y - 10), fontface, fontscale, (0, 255, 255), 2)
             
-            cv2.putText(img, f"Face #{i+1}", (x, y - 10), fontface, fontscale, (0, 255, 255), 2)
-            
-            #kiểm tra xem khuôn mặt đã được xử lý chưa
-            if face_id in processed_faces:
-                profile = processed_faces[face_id]
-                cv2.putText(img, f"ID: {profile['id']}, Name: {profile['name']}", 
-                            (x, y + h + 30), fontface, fontscale, success_color, 2)
-                cv2.putText(img, f"Age: {profile['age']}, Gender: {profile['gender']}", 
-                            (x, y + h + 60), fontface, fontscale, success_color, 2)
-            elif auto_mode and use_recognition:
-                id, conf = rec.predict(gray[y:y + h, x:x + w])
-                print(f"Predicted ID: {id}, Confidence: {conf}")
-
-                if conf < 70:  #ngưỡng nhận diện
-                    profile = getProfile(id)
-                    if profile:
-                        name, gender, age = profile[1], profile[2], profile[3]
-                        # kiểm tra xem ID đã được điểm danh chưa
-                        if id not in recognized_ids:
-                            log_attendance(id)
-                            save_to_csv(id, name, age, gender, conf)
-                            recognized_ids.add(id)
-                            print(f"Da diem danh cho {name} (ID: {id})")
-
-                        processed_faces[face_id] = {
-                            'id': id,
-                            'name': name,
-                            'gender': gender,
-                            'age': age
-                        }
-
-                        cv2.putText(img, f"Diem danh thanh cong: {name}", 
-                                    (x, y - 10), fontface, fontscale, success_color, 2)
-
-                        cv2.putText(img, f"Name: {name}", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
-                        cv2.putText(img, f"Age: {age}", (x, y + h + 60), fontface, fontscale, fontcolor, 2)
-                        cv2.putText(img, f"Gender: {gender}", (x, y + h + 90), fontface, fontscale, fontcolor, 2)
-                        cv2.putText(img, f"Conf: {conf:.2f}", (x, y + h + 120), fontface, fontscale, fontcolor, 2)
+                fresh = result is not None and result[1] < 70 and result[2]
+                #track đã có danh tính thì dùng lại, không cần predict
+                if track.identity is not None and not fresh:
+                    profile = track.identity
+                    cv2.putText(img, f"ID: {profile['id']}, Name: {profile['name']}", 
+                                (x, y + h + 30), fontface, fontscale, success_color, 2)
+                    cv2.putText(img, f"Age: {profile['age']}, Gender: {profile['gender']}", 
+                                (x, y + h + 60), fontface, fontscale, success_color, 2)
+                elif result is not None:
+                    id, conf, profile = result
+
+                    if conf < 70:  #ngưỡng nhận diện
+                        if profile:
+                            # lượt điểm danh đã được ghi trong StreamProcessor.identify
+                            name, gender, age = profile[1], profile[2], profile[3]
+                            cv2.putText(img, f"Diem danh thanh cong: {name}", 
+                                        (x, y - 10), fontface, fontscale, success_color, 2)
+
+                            cv2.putText(img, f"Name: {name}", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
+                            cv2.putText(img, f"Age: {age}", (x, y + h + 60), fontface, fontscale, fontcolor, 2)
+                            cv2.putText(img, f"Gender: {gender}", (x, y + h + 90), fontface, fontscale, fontcolor, 2)
+                            cv2.putText(img, f"Conf: {conf:.2f}", (x, y + h + 120), fontface, fontscale, fontcolor, 2)
+                        else:
+                            cv2.putText(img, "Not Found", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
                     else:
-                        cv2.putText(img, "Not Found", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
-                else:
+                        cv2.putText(img, "Unknown", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
+                elif track.status == 'not_found':
+                    cv2.putText(img, "Not Found", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
+                elif track.status == 'unknown':
                     cv2.putText(img, "Unknown", (x, y + h + 30), fontface, fontscale, fontcolor, 2)
         
-        instructions = [
-            "Nhan 'r' de dang ky khuon mat moi",
-            "Nhan so (1,2,3...) de chon khuon mat dang ky",
-            "Nhan 'c' de huy dang ky",
-            "Nhan 'a' de chuyen doi che do tu dong/thu cong",
-            "Nhan 'q' de thoat"
-        ]
+            instructions = [
+                "Nhan 'r' de dang ky khuon mat moi",
+                "Nhan so (1,2,3...) de chon khuon mat dang ky",
+                "Nhan 'c' de huy dang ky",
+                "Nhan 'a' de chuyen doi che do tu dong/thu cong",
+                "Nhan 'q' de thoat"
+            ]
         
-        for i, text in enumerate(instructions):
-            cv2.putText(img, text, (10, 30 + i * 30), fontface, fontscale, (255, 255, 255), 2)
+            for i, text in enumerate(instructions):
+                cv2.putText(img, text, (10, 30 + i * 30), fontface, fontscale, (255, 255, 255), 2)
         
-        mode_text = "CHE DO TU DONG" if auto_mode else "CHE DO THU CONG"
-        cv2.putText(img, mode_text, (img.shape[1] - 250, 30), fontface, fontscale, (0, 165, 255), 2)
+            mode_text = "CHE DO TU DONG" if auto_mode else "CHE DO THU CONG"
+            cv2.putText(img, mode_text, (img.shape[1] - 250, 30), fontface, fontscale, (0, 165, 255), 2)
         
-        if registration_mode:
-            cv2.putText(img, "CHE DO DANG KY: Chon khuon mat (1,2,3...), 'c' de huy", 
-                        (10, img.shape[0] - 30), fontface, fontscale, (0, 165, 255), 2)
-        elif current_face_index is not None:
-            selected_face = all_faces[current_face_index]
-            x, y, w, h = selected_face
-            cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 255), 3)
-            cv2.putText(img, f"DANG DANG KY CHO MAT #{current_face_index+1}", 
-                        (10, img.shape[0] - 30), fontface, fontscale, (0, 165, 255), 2)
+            if registration_mode:
+                cv2.putText(img, "CHE DO DANG KY: Chon khuon mat (1,2,3...), 'c' de huy", 
+                            (10, img.shape[0] - 30), fontface, fontscale, (0, 165, 255), 2)
+            elif current_face_index is not None:
+                selected_face = all_faces[current_face_index]
+                x, y, w, h = selected_face
+                cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 255), 3)
+                cv2.putText(img, f"DANG DANG KY CHO MAT #{current_face_index+1}", 
+                            (10, img.shape[0] - 30), fontface, fontscale, (0, 165, 255), 2)
                         
-        cv2.imshow('Face Recognition', img)
-        key = cv2.waitKey(1) & 0xFF
+            key = sink.show(img)
+
+            if pipeline is not None and stats_interval and time.perf_counter() - last_stats >= stats_interval:
+                pipeline.print_metrics()
+                last_stats = time.perf_counter()
         
-        if key == ord('q'):
-            break
-        elif key == ord('a'):
-            auto_mode = not auto_mode
-            print(f"Da chuyen sang che do {'tu dong' if auto_mode else 'thu cong'}")
-        elif key == ord('r'):
-            if len(all_faces) > 0:
-                registration_mode = True
-                cv2.putText(img, "Chon khuon mat bang cach nhan so (1,2,3...)", 
-                            (10, img.shape[0] - 60), fontface, fontscale, (0, 165, 255), 2)
-            else:
-                print("Khong phat hien khuon mat nao de dang ky")
-        elif key == ord('c'):
-            registration_mode = False
-            current_face_index = None
-            print("Da huy che do dang ky.")
-        elif registration_mode and ord('1') <= key <= ord('9'):
-            selected_index = key - ord('1')
-            if selected_index < len(all_faces):
-                current_face_index = selected_index
+            if key == ord('q') or (max_frames and frame_count >= max_frames):
+                break
+            elif key == ord('a'):
+                auto_mode = processor.auto_mode = not auto_mode
+                if control is not None:
+                    control.mode = 'auto' if auto_mode else 'manual'
+                print(f"Da chuyen sang che do {'tu dong' if auto_mode else 'thu cong'}")
+            elif key == ord('r'):
+                if len(all_faces) > 0:
+                    registration_mode = True
+                    cv2.putText(img, "Chon khuon mat bang cach nhan so (1,2,3...)", 
+                                (10, img.shape[0] - 60), fontface, fontscale, (0, 165, 255), 2)
+                else:
+                    print("Khong phat hien khuon mat nao de dang ky")
+            elif key == ord('c'):
                 registration_mode = False
+                current_face_index = None
+                print("Da huy che do dang ky.")
+            elif registration_mode and ord('1') <= key <= ord('9'):
+                selected_index = key - ord('1')
+                if selected_index < len(all_faces):
+                    current_face_index = selected_index
+                    registration_mode = False
                 
-                face_coords = all_faces[current_face_index]
-                x, y, w, h = face_coords
-                face_id = f"{x}_{y}_{w}_{h}"
+                    track = packet.tracks[current_face_index]
                 
-                if face_id in processed_faces:
-                    messagebox.showinfo("Warning", f"Khuon mat nay da duoc dang ky voi ID: {processed_faces[face_id]['id']}")
-                    current_face_index = None
-                else:
-                    id = simpledialog.askstring("Nhap ID", "Nhap ID cho nguoi nay:")
-                    if id:
-                        if check_id_exists(id):
-                            messagebox.showerror("Loi", f"ID {id} da ton tai trong CSDL. Vui long chon ID khac.")
-                            current_face_index = None
-                        else:
-                            name = simpledialog.askstring("Nhap Ten", "Nhap ten cho nguoi nay:")
-                            if name:
-                                gender = simpledialog.askstring("Nhap gioi tinh", "Nhap gioi tinh (Nam/Nu):")
-                                age = simpledialog.askstring("Nhap tuoi", "Nhap tuoi:")
+                    if track.identity is not None:
+                        messagebox.showinfo("Warning", f"Khuon mat nay da duoc dang ky voi ID: {track.identity['id']}")
+                        current_face_index = None
+                    else:
+                        id = simpledialog.askstring("Nhap ID", "Nhap ID cho nguoi nay:")
+                        if id:
+                            if check_id_exists(id):
+                                messagebox.showerror("Loi", f"ID {id} da ton tai trong CSDL. Vui long chon ID khac.")
+                                current_face_index = None
+                            else:
+                                name = simpledialog.askstring("Nhap Ten", "Nhap ten cho nguoi nay:")
+                                if name:
+                                    gender = simpledialog.askstring("Nhap gioi tinh", "Nhap gioi tinh (Nam/Nu):")
+                                    age = simpledialog.askstring("Nhap tuoi", "Nhap tuoi:")
                                 
-                                add_new_person(id, name, gender, age)
+                                    add_new_person(id, name, gender, age)
                                 
-                                processed_faces[face_id] = {
-                                    'id': id,
-                                    'name': name,
-                                    'gender': gender,
-                                    'age': age
-                                }
+                                    processor.assign_identity(track, {
+                                        'id': id,
+                                        'name': name,
+                                        'gender': gender,
+                                        'age': age
+                                    })
                                 
-                                log_attendance(id)
-                                save_to_csv(id, name, age, gender, 0.0)
+                                    dedup.mark(id)
+                                    writer.log(id, name, age, gender, 0.0)
                                 
-                                messagebox.showinfo("Success", f"Da dang ky thanh cong {name} voi ID: {id}")
-                                current_face_index = None
-                            else:
-                                current_face_index = None
-                    else:
-                        current_face_index = None
-            else:
-                print(f"Khong co khuon mat nao o vi tri {selected_index+1}")
+                                    messagebox.showinfo("Success", f"Da dang ky thanh cong {name} voi ID: {id}")
+                                    current_face_index = None
+                                else:
+                                    current_face_index = None
+                        else:
+                            current_face_index = None
+                else:
+                    print(f"Khong co khuon mat nao o vi tri {selected_index+1}")
+
+    except (KeyboardInterrupt, StopRequested):
+        print("Đã nhận tín hiệu dừng, đang lưu dữ liệu còn lại...")
+
+    if pipeline is not None:
+        pipeline.stop()
+    elapsed = time.perf_counter() - start_time
+    if frame_count and elapsed > 0:
+        print(f"Đã xử lý {frame_count} khung hình trong {elapsed:.2f}s ({frame_count / elapsed:.1f} fps)")
+
+    if pipeline is not None:
+        pipeline.print_metrics()
+    scheduler.report(elapsed)
+    if tracker.faces_seen:
+        print(f"Số lần gọi predict: {tracker.predictions} cho {tracker.faces_seen} khuôn mặt "
+              f"({tracker.predictions / tracker.faces_seen:.1%})")
 
+    writer.close()
+    if resources is None:
+        detector.close()
     cam.release()
-    cv2.destroyAllWindows()
-    root.destroy()
+    sink.close()
+    if root is not None:
+        root.destroy()
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import os
+import sys
+from multiprocessing.connection import Client
+
+# Unix socket trên Linux/macOS, named pipe trên Windows
+DEFAULT_ADDRESS = r'\\.\pipe\face_recognizer' if sys.platform == 'win32' else 'data/recognizer.sock'
+
+
+def key_path(address=DEFAULT_ADDRESS):
+    "File chứa authkey ngẫu nhiên của tiến trình nhận diện đang chạy tại address (quyền 0600)"
+    if sys.platform == 'win32':
+        return os.path.join('data', os.path.basename(address) + '.key')
+    return address + '.key'
+
+
+def read_authkey(address=DEFAULT_ADDRESS):
+    with open(key_path(address), 'rb') as f:
+        return f.read()
+
+
+def send_command(cmd, address=DEFAULT_ADDRESS, **params):
+    "Gửi một lệnh tới tiến trình nhận diện chạy nền và trả về phản hồi (dict có khoá 'ok')"
+    with Client(address, authkey=read_authkey(address)) as conn:
+        conn.send(dict(params, cmd=cmd))
+        return conn.recv()
+
+
+def is_running(address=DEFAULT_ADDRESS):
+    try:
+        return send_command('status', address)['ok']
+    except (OSError, EOFError):
+        return False
@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import queue
+import signal
+import argparse
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+import recognize
+from lbph import LBPHGallery, gallery_prefix
+from recognizer_client import DEFAULT_ADDRESS, key_path, send_command, is_running
+
+COMMANDS = ('start', 'stop', 'pause', 'resume', 'mode', 'status', 'shutdown')
+
+
+class SessionControl:
+    "Trạng thái một phiên nhận diện, được recognize.main() đọc giữa hai khung hình"
+
+    def __init__(self, argv, mode):
+        self.argv = argv
+        self.mode = mode
+        self.frames = 0
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def pause(self):
+        self.resume_event.clear()
+
+    def resume(self):
+        self.resume_event.set()
+
+    def stop(self):
+        self.stop_event.set()
+        self.resume_event.set()
+
+    def wait_while_paused(self):
+        "Chặn khi đang tạm dừng; trả về False nếu phiên đã được yêu cầu dừng"
+        self.resume_event.wait()
+        return not self.stop_event.is_set()
+
+    def status(self):
+        elapsed = time.time() - self.started
+        return {'state': 'paused' if self.paused else 'running', 'mode': self.mode, 'args': self.argv,
+                'frames': self.frames, 'elapsed': round(elapsed, 1),
+                'fps': round(self.frames / elapsed, 1) if elapsed > 0 else 0.0}
+
+
+def model_signature(model_path):
+    "Thời điểm sửa các file mô hình: khác đi nghĩa là đã train lại và cần nạp lại"
+    paths = (model_path,) + LBPHGallery.paths(gallery_prefix(model_path))
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+class ResourceCache:
+    """Giữ detector và mô hình đã nạp giữa các phiên nhận diện.
+
+    Detector được dùng lại khi tham số detect giống phiên trước; mô hình được dùng lại cho
+    tới khi file mô hình thay đổi (sau train.py/enroll.py) hoặc đổi nhóm/định dạng.
+    """
+
+    def __init__(self):
+        self.detectors = {}
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get_detector(self, args):
+        key = (args.detect_width, args.min_face, args.max_face, args.cascade_threads, args.no_mirror_profile)
+        with self.lock:
+            if key not in self.detectors:
+                self.detectors[key] = recognize.build_detector(args)
+            return self.detectors[key]
+
+    def get_model(self, args):
+        try:
+            model_path = recognize.model_path_for(args)
+        except ValueError as e:
+            print(e)
+            return None
+        key = (model_path, args.model_format, args.no_ann, args.ann_probe)
+        signature = model_signature(model_path)
+        with self.lock:
+            cached = self.models.get(key)
+            if cached is not None and cached[0] == signature:
+                print("Dùng lại mô hình nhận diện đã nạp.")
+                return cached[1]
+            rec = recognize.load_model(args)
+            self.models[key] = (signature, rec)
+            return rec
+
+    def close(self):
+        for detector in self.detectors.values():
+            detector.close()
+
+
+class RecognizerDaemon:
+    """Tiến trình nhận diện chạy nền, điều khiển qua kênh cục bộ (Unix socket / named pipe).
+
+    Thư viện, Haar cascade và mô hình chỉ được nạp một lần; mỗi lệnh start chạy một phiên
+    recognize.main() trên luồng chính (cửa sổ OpenCV/tkinter cần luồng chính), còn các lệnh
+    stop/pause/resume/mode/status được xử lý ở luồng nhận lệnh và có hiệu lực ở khung hình kế tiếp.
+    Mỗi lệnh là một dict {'cmd': ..., ...}, phản hồi là dict có khoá 'ok'.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        self.address = address
+        self.resources = ResourceCache()
+        self.requests = queue.Queue()
+        self.control = None
+        self.busy = False
+        self.lock = threading.Lock()
+        self.sessions = 0
+        self.started = time.time()
+        self.shutdown_event = threading.Event()
+        self.listener = None
+
+    def handle(self, request):
+        cmd = request.get('cmd')
+        control = self.control
+        if cmd == 'status':
+            status = {'ok': True, 'pid': os.getpid(), 'sessions': self.sessions,
+                      'uptime': round(time.time() - self.started, 1),
+                      'models': len(self.resources.models)}
+            status.update(control.status() if control is not None else {'state': 'idle'})
+            return status
+        if cmd == 'start':
+            argv = list(request.get('args', []))
+            try:
+                args = recognize.parse_args(argv)
+            except SystemExit:
+                return {'ok': False, 'error': f"Tham số không hợp lệ: {' '.join(argv)}"}
+            with self.lock:
+                if self.busy:
+                    return {'ok': False, 'error': 'Phiên nhận diện đang chạy'}
+                self.busy = True
+            self.requests.put((argv, args))
+            return {'ok': True}
+        if cmd == 'shutdown':
+            self.shutdown_event.set()
+            if control is not None:
+                control.stop()
+            return {'ok': True}
+        if cmd not in COMMANDS:
+            return {'ok': False, 'error': f"Lệnh không hợp lệ: {cmd}"}
+        if control is None:
+            return {'ok': False, 'error': 'Không có phiên nhận diện nào đang chạy'}
+        if cmd == 'stop':
+            control.stop()
+        elif cmd == 'pause':
+            control.pause()
+        elif cmd == 'resume':
+            control.resume()
+        else:
+            mode = request.get('value')
+            if mode not in ('auto', 'manual'):
+                return {'ok': False, 'error': "Chế độ phải là 'auto' hoặc 'manual'"}
+            control.mode = mode
+        return {'ok': True}
+
+    def serve_connection(self, conn):
+        with conn:
+            try:
+                request = conn.recv()
+                conn.send(self.handle(request if isinstance(request, dict) else {}))
+            except (EOFError, OSError):
+                pass
+
+    def listen(self):
+        while not self.shutdown_event.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, AuthenticationError):
+                # kết nối sai authkey hoặc listener đã đóng
+                continue
+            threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+
+    def request_shutdown(self, signum=None, frame=None):
+        self.shutdown_event.set()
+        if self.control is not None:
+            self.control.stop()
+
+    def create_listener(self):
+        """Mở socket với authkey ngẫu nhiên mới cho mỗi lần chạy, ghi vào file chỉ chủ sở hữu đọc
+        được. umask 077 được đặt trước khi tạo file khoá và socket nên cả hai có quyền 0600 ngay
+        từ lúc được tạo, người dùng khác không kết nối được (multiprocessing.connection dùng pickle)."""
+        authkey = os.urandom(32)
+        path = key_path(self.address)
+        old_umask = os.umask(0o077)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(authkey)
+            return Listener(self.address, authkey=authkey)
+        finally:
+            os.umask(old_umask)
+
+    def run(self):
+        if is_running(self.address):
+            print(f"Tiến trình nhận diện đã chạy tại {self.address}")
+            return 1
+        if sys.platform != 'win32' and os.path.exists(self.address):
+            os.remove(self.address)  # socket cũ của tiến trình đã thoát bất thường
+        self.listener = self.create_listener()
+        signal.signal(signal.SIGTERM, self.request_shutdown)
+        threading.Thread(target=self.listen, name='recognizer-control', daemon=True).start()
+        print(f"Tiến trình nhận diện sẵn sàng tại {self.address} (PID {os.getpid()})")
+        try:
+            while not self.shutdown_event.is_set():
+                try:
+                    argv, args = self.requests.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self.control = SessionControl(argv, args.mode)
+                self.sessions += 1
+                print(f"Bắt đầu phiên nhận diện #{self.sessions}...")
+                try:
+                    recognize.main(args, control=self.control, resources=self.resources)
+                except Exception as e:
+                    print(f"Lỗi trong phiên nhận diện: {e}")
+                finally:
+                    self.control = None
+                    with self.lock:
+                        self.busy = False
+                print(f"Đã kết thúc phiên nhận diện #{self.sessions}.")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.resources.close()
+            self.listener.close()
+            if os.path.exists(key_path(self.address)):
+                os.remove(key_path(self.address))
+        print("Đã tắt tiến trình nhận diện.")
+        return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiến trình nhận diện chạy nền và các lệnh điều khiển')
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help='Đường dẫn Unix socket / named pipe')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('serve', help='Chạy tiến trình nhận diện (nạp sẵn detector và mô hình)')
+    sub.add_parser('start', help='Bắt đầu phiên nhận diện, tham số như recognize.py')
+    sub.add_parser('stop', help='Dừng phiên nhận diện (tiến trình vẫn chạy)')
+    sub.add_parser('pause', help='Tạm dừng xử lý khung hình')
+    sub.add_parser('resume', help='Tiếp tục sau khi tạm dừng')
+    mode = sub.add_parser('mode', help='Chuyển chế độ nhận diện')
+    mode.add_argument('value', choices=['auto', 'manual'])
+    sub.add_parser('status', help='Xem trạng thái')
+    sub.add_parser('shutdown', help='Tắt tiến trình nhận diện')
+    # tham số của start được chuyển nguyên cho recognize.py
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'start':
+        parser.error(f"tham số không hợp lệ: {' '.join(extra)}")
+
+    if args.command == 'serve':
+        return RecognizerDaemon(args.address).run()
+    params = {}
+    if args.command == 'start':
+        params['args'] = [a for a in extra if a != '--']
+    elif args.command == 'mode':
+        params['value'] = args.value
+    try:
+        response = send_command(args.command, args.address, **params)
+    except (OSError, EOFError):
+        print(f"Không kết nối được tới tiến trình nhận diện tại {args.address}")
+        return 1
+    if not response.pop('ok'):
+        print(response['error'])
+        return 1
+    for key, value in response.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import os
+import sys
+import csv
+import time
+import sqlite3
+import pathlib
+import argparse
+import datetime
+from database import DB_PATH, get_db
+
+REPORT_KINDS = ("daily", "summary")
+FORMATS = ("xlsx", "csv")
+CHUNK_ROWS = 5000
+XLSX_MAX_ROWS = 1048576
+
+# người có mặt trong ngày: đọc từ bảng tổng hợp DailyAttendance (khoá chính (Day, UserID)) thay vì
+# gom lại toàn bộ lượt điểm danh trong Attendance
+_SEEN = '''
+    seen AS (
+        SELECT UserID, Day, FirstSeen, LastSeen, Count
+        FROM DailyAttendance
+        WHERE Day >= :start AND Day <= :end{members}
+    )'''
+
+_ROSTER_ALL = '''
+    roster AS (SELECT ID, Name FROM People)'''
+
+_ROSTER_GROUP = '''
+    roster AS (
+        SELECT p.ID, p.Name FROM GroupMembers g JOIN People p ON p.ID = g.UserID
+        WHERE g.GroupName = :group
+    )'''
+
+_DAILY = '''
+    WITH RECURSIVE days(Day) AS (
+        SELECT :start UNION ALL SELECT date(Day, '+1 day') FROM days WHERE Day < :end
+    ),{roster},{seen}
+    SELECT days.Day, r.ID, r.Name,
+           CASE WHEN s.UserID IS NULL THEN 'Not Attended' ELSE 'Attended' END,
+           s.FirstSeen, s.LastSeen, COALESCE(s.Count, 0)
+    FROM days CROSS JOIN roster r
+    LEFT JOIN seen s ON s.UserID = r.ID AND s.Day = days.Day
+    ORDER BY days.Day, r.ID
+'''
+
+_SUMMARY = '''
+    WITH{roster},{seen}
+    SELECT r.ID, r.Name, COUNT(s.Day), :days, ROUND(100.0 * COUNT(s.Day) / :days, 1),
+           MIN(s.FirstSeen), MAX(s.LastSeen), COALESCE(SUM(s.Count), 0)
+    FROM roster r LEFT JOIN seen s ON s.UserID = r.ID
+    GROUP BY r.ID, r.Name
+    ORDER BY r.ID
+'''
+
+COLUMNS = {
+    "daily": ["Date", "ID", "Name", "Status", "FirstSeen", "LastSeen", "Count"],
+    "summary": ["ID", "Name", "DaysPresent", "Days", "Rate", "FirstSeen", "LastSeen", "Count"],
+}
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def report_query(kind, start, end, group=None):
+    "Trả về (tên cột, câu SQL, tham số) của báo cáo từ ngày start đến hết ngày end"
+    if kind not in REPORT_KINDS:
+        raise ValueError(f"kind phải là một trong {REPORT_KINDS}")
+    start, end = parse_date(start), parse_date(end)
+    if end < start:
+        raise ValueError("Ngày kết thúc phải sau ngày bắt đầu")
+    params = {"start": start.isoformat(), "end": end.isoformat(),
+              "days": (end - start).days + 1, "group": group}
+    roster = _ROSTER_GROUP if group else _ROSTER_ALL
+    # với nhóm, chỉ gom lượt điểm danh của thành viên
+    seen = _SEEN.format(members=" AND UserID IN (SELECT ID FROM roster)" if group else "")
+    sql = (_DAILY if kind == "daily" else _SUMMARY).format(roster=roster, seen=seen)
+    return COLUMNS[kind], sql, params
+
+
+def connect_readonly(db_path=DB_PATH):
+    """Connection chỉ đọc riêng cho báo cáo: đọc song song với recognize.py (WAL) và không
+    giữ lock của connection dùng chung trong suốt thời gian xuất file."""
+    get_db(db_path)  # tạo schema/index nếu database chưa có
+    return sqlite3.connect(pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro", uri=True)
+
+
+def iter_report(kind, start, end, group=None, db_path=DB_PATH, chunk_size=CHUNK_ROWS):
+    "Sinh các khối tối đa chunk_size dòng của báo cáo, bộ nhớ không tăng theo số người/số ngày"
+    # kiểm tra tham số ngay khi gọi, trước khi file đầu ra được tạo
+    _, sql, params = report_query(kind, start, end, group)
+
+    def chunks():
+        conn = connect_readonly(db_path)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            conn.close()
+    return chunks()
+
+
+def write_csv(path, columns, chunks):
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def write_xlsx(path, columns, chunks, title="Report"):
+    "Ghi xlsx ở chế độ write-only của openpyxl (từng dòng ra file), sang sheet mới khi vượt giới hạn dòng"
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Cần cài openpyxl để xuất xlsx (pip install openpyxl), hoặc dùng định dạng csv")
+    workbook = Workbook(write_only=True)
+    sheet = None
+    count = sheet_rows = 0
+    for rows in chunks:
+        for row in rows:
+            if sheet is None or sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(title if sheet is None else f"{title} {len(workbook.worksheets) + 1}")
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+            count += 1
+    if sheet is None:
+        workbook.create_sheet(title).append(columns)
+    workbook.save(path)
+    return count
+
+
+def default_report_path(kind, start, end, fmt="xlsx"):
+    "Attendance_Report_<ngày>.xlsx cho một ngày (như trước), ngược lại kèm khoảng ngày và loại báo cáo"
+    if kind == "daily" and str(start) == str(end):
+        return f"Attendance_Report_{start}.{fmt}"
+    return f"Attendance_{kind.capitalize()}_{start}_{end}.{fmt}"
+
+
+def export_report(path, kind="daily", start=None, end=None, group=None, db_path=DB_PATH,
+                  chunk_size=CHUNK_ROWS):
+    "Xuất báo cáo ra .csv hoặc .xlsx (theo đuôi file), trả về số dòng đã ghi"
+    start = start or datetime.date.today().isoformat()
+    end = end or start
+    columns = COLUMNS[kind]
+    chunks = iter_report(kind, start, end, group, db_path, chunk_size)
+    if path.lower().endswith(".csv"):
+        return write_csv(path, columns, chunks)
+    return write_xlsx(path, columns, chunks, title=kind.capitalize())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Xuất báo cáo điểm danh theo khoảng ngày')
+    parser.add_argument('start', nargs='?', default=None, help='Ngày bắt đầu YYYY-MM-DD (mặc định hôm nay)')
+    parser.add_argument('end', nargs='?', default=None, help='Ngày kết thúc YYYY-MM-DD (mặc định = ngày bắt đầu)')
+    parser.add_argument('--kind', choices=REPORT_KINDS, default='daily',
+                        help='daily: mỗi người mỗi ngày một dòng, summary: tổng hợp số buổi có mặt mỗi người')
+    parser.add_argument('--group', default=None, help='Chỉ báo cáo thành viên của nhóm này')
+    parser.add_argument('--format', choices=FORMATS, default='xlsx', help='Định dạng file')
+    parser.add_argument('--output', default=None, help='Đường dẫn file (mặc định tự đặt theo ngày)')
+    parser.add_argument('--db', default=DB_PATH, help='Đường dẫn database')
+    args = parser.parse_args(argv)
+
+    start = args.start or datetime.date.today().isoformat()
+    end = args.end or start
+    path = args.output or default_report_path(args.kind, start, end, args.format)
+    t0 = time.perf_counter()
+    try:
+        count = export_report(path, args.kind, start, end, args.group, args.db)
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        return 1
+    print(f"Đã tạo báo cáo tại: {path} ({count} dòng, {time.perf_counter() - t0:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
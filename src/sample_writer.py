@@ -0,0 +1,67 @@
+import os
+import queue
+import threading
+import cv2
+from face_store import FACE_SIZE, normalize_face
+from face_quality import EYE_CASCADE, align_face
+
+_STOP = object()
+
+
+class SampleWriter:
+    """Ghi ảnh mẫu khi thu thập ở một luồng nền để vòng lặp camera không bị chặn bởi I/O.
+
+    Ảnh được căn chỉnh (tuỳ chọn, xoay cho hai mắt nằm ngang), đưa về kích thước chuẩn
+    FACE_SIZE và lưu dạng PNG (không mất dữ liệu, nhỏ với ảnh xám 100x100) nên lúc huấn
+    luyện không phải resize lại. close() ghi nốt mọi ảnh còn trong hàng đợi.
+    """
+
+    def __init__(self, save_dir="images", size=FACE_SIZE, align=False, ext=".png", png_compression=3,
+                 cascade_dir=None):
+        self.save_dir = save_dir
+        self.size = size
+        self.align = align
+        self.ext = ext
+        self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression] if ext == ".png" else []
+        self.cascade_dir = cascade_dir or cv2.data.haarcascades
+        self.queue = queue.Queue()
+        self.thread = None
+        self.written = 0
+        self.failed = 0
+        self.bytes = 0
+
+    def start(self):
+        os.makedirs(self.save_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="sample-writer", daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, user_id, index, face_img):
+        "Đưa một ảnh khuôn mặt xám vào hàng đợi ghi, trả về đường dẫn file sẽ được tạo"
+        path = os.path.join(self.save_dir, f"user.{user_id}.{index}{self.ext}")
+        # copy vì face_img thường là view vào khung hình sẽ bị ghi đè ở vòng lặp sau
+        self.queue.put((path, face_img.copy()))
+        return path
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def _run(self):
+        # CascadeClassifier không dùng chung giữa các luồng: luồng ghi có bản riêng
+        eye_cascade = cv2.CascadeClassifier(self.cascade_dir + EYE_CASCADE) if self.align else None
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            path, face_img = item
+            if eye_cascade is not None and not eye_cascade.empty():
+                face_img = align_face(face_img, eye_cascade)
+            face_img = normalize_face(face_img, self.size)
+            if cv2.imwrite(path, face_img, self.params):
+                self.written += 1
+                self.bytes += os.path.getsize(path)
+            else:
+                self.failed += 1
+                print(f"Không thể lưu ảnh: {path}")
@@ -0,0 +1,241 @@
+import itertools
+import threading
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    "Tỉ lệ giao trên hợp (IoU) của hai hộp (x, y, w, h)"
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centroid_distance(a, b):
+    "Khoảng cách tâm hai hộp, chuẩn hoá theo kích thước hộp lớn hơn"
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max(aw, ah, bw, bh, 1)
+
+
+class Track:
+    "Một khuôn mặt được theo dõi qua nhiều khung hình, có ID ổn định"
+
+    __slots__ = ("id", "box", "hits", "missed", "identity", "status", "conf",
+                 "last_predict")
+
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.missed = 0
+        # profile đã nhận diện: dict id/name/gender/age
+        self.identity = None
+        # None (chưa dự đoán), 'known', 'unknown' hoặc 'not_found'
+        self.status = None
+        self.conf = None
+        self.last_predict = None
+
+
+class FaceTracker:
+    """Gán ID theo dõi cho các hộp khuôn mặt qua các khung hình bằng IoU/khoảng cách tâm.
+
+    Danh tính được lưu theo track nên chỉ cần gọi predict khi track mới xuất hiện,
+    sau mỗi refresh_interval khung hình, hoặc sớm hơn khi độ tin cậy lần trước kém
+    (conf >= low_conf). Track bị xoá khi không khớp với hộp nào trong max_missed khung hình.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_missed=10,
+                 refresh_interval=30, low_conf=60, unknown_interval=5):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_missed = max_missed
+        self.refresh_interval = refresh_interval
+        self.low_conf = low_conf
+        self.unknown_interval = unknown_interval
+        self.tracks = {}
+        self.next_id = itertools.count(1)
+        self.frame_index = 0
+        # thống kê số lần gọi predict so với số khuôn mặt đã thấy
+        self.faces_seen = 0
+        self.predictions = 0
+
+    def update(self, boxes):
+        "Khớp các hộp của khung hình hiện tại với track; trả về list Track theo thứ tự boxes"
+        self.frame_index += 1
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        self.faces_seen += len(boxes)
+
+        candidates = []
+        for track in self.tracks.values():
+            for i, box in enumerate(boxes):
+                overlap = iou(track.box, box)
+                if overlap >= self.iou_threshold:
+                    candidates.append((1.0 + overlap, track.id, i))
+                else:
+                    dist = centroid_distance(track.box, box)
+                    if dist <= self.max_centroid_distance:
+                        candidates.append((1.0 - dist, track.id, i))
+        # ghép tham lam theo điểm giảm dần: IoU được ưu tiên hơn khoảng cách tâm
+        candidates.sort(reverse=True)
+
+        assigned = [None] * len(boxes)
+        matched_tracks = set()
+        for _, track_id, i in candidates:
+            if track_id in matched_tracks or assigned[i] is not None:
+                continue
+            track = self.tracks[track_id]
+            track.box = boxes[i]
+            track.hits += 1
+            track.missed = 0
+            assigned[i] = track
+            matched_tracks.add(track_id)
+
+        for track_id, track in list(self.tracks.items()):
+            if track_id not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    del self.tracks[track_id]
+
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                track = Track(next(self.next_id), box)
+                self.tracks[track.id] = track
+                assigned[i] = track
+        return assigned
+
+    def propagate(self, prev_gray, gray, grid=4):
+        """Dịch chuyển các track đang hiển thị sang khung hình mới bằng optical flow Lucas-Kanade.
+
+        Dùng cho các khung hình không chạy Haar cascade. Trả về (tracks, lost): lost là True
+        nếu có track không theo được và cần chạy lại detect đầy đủ.
+        """
+        self.frame_index += 1
+        tracks = [t for t in self.tracks.values() if t.missed == 0]
+        if not tracks or prev_gray is None or prev_gray.shape != gray.shape:
+            return [], bool(tracks)
+
+        n = grid * grid
+        pts = []
+        for track in tracks:
+            x, y, w, h = track.box
+            xs = np.linspace(x + w * 0.25, x + w * 0.75, grid)
+            ys = np.linspace(y + h * 0.25, y + h * 0.75, grid)
+            pts.extend((px, py) for py in ys for px in xs)
+        p0 = np.float32(pts).reshape(-1, 1, 2)
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, p0, None,
+                                                 winSize=(21, 21), maxLevel=2)
+
+        img_h, img_w = gray.shape[:2]
+        moved = []
+        lost = False
+        for k, track in enumerate(tracks):
+            ok = status[k * n:(k + 1) * n].ravel() == 1
+            if ok.sum() < n // 2:
+                track.missed += 1
+                lost = True
+                continue
+            shift = (p1[k * n:(k + 1) * n] - p0[k * n:(k + 1) * n]).reshape(-1, 2)[ok]
+            dx, dy = np.median(shift, axis=0)
+            x, y, w, h = track.box
+            x = min(max(0, int(round(x + dx))), max(0, img_w - w))
+            y = min(max(0, int(round(y + dy))), max(0, img_h - h))
+            track.box = (x, y, w, h)
+            moved.append(track)
+
+        for track_id, track in list(self.tracks.items()):
+            if track.missed > self.max_missed:
+                del self.tracks[track_id]
+        self.faces_seen += len(moved)
+        return moved, lost
+
+    def needs_prediction(self, track):
+        if track.last_predict is None:
+            return True
+        age = self.frame_index - track.last_predict
+        if track.status != 'known':
+            return age >= self.unknown_interval
+        if track.conf is not None and track.conf >= self.low_conf:
+            return age >= max(1, self.refresh_interval // 4)
+        return age >= self.refresh_interval
+
+    def record_prediction(self, track, status, conf, identity=None):
+        self.predictions += 1
+        track.last_predict = self.frame_index
+        track.status = status
+        track.conf = conf
+        # danh tính đã biết được giữ lại khi một lần làm mới bị kém, chỉ thay khi nhận ra người khác
+        if identity is not None:
+            track.identity = identity
+
+    def assign_identity(self, track, identity):
+        "Gán danh tính cho track khi đăng ký thủ công (không tính là một lần predict)"
+        track.identity = identity
+        track.status = 'known'
+        track.conf = 0.0
+        track.last_predict = self.frame_index
+
+    def active_tracks(self):
+        return list(self.tracks.values())
+
+
+class DetectionScheduler:
+    """Quyết định khung hình nào chạy Haar cascade đầy đủ: mỗi `every` khung hình,
+    hoặc ngay khung hình kế tiếp khi tracker báo mất khuôn mặt.
+    Các khung hình còn lại chỉ nội suy hộp bằng FaceTracker.propagate.
+    """
+
+    def __init__(self, every=1):
+        self.every = max(1, every)
+        self.forced = threading.Event()
+        self.lock = threading.Lock()
+        self.detect_count = 0
+        self.detect_time = 0.0
+        self.propagate_count = 0
+        self.propagate_time = 0.0
+
+    def should_detect(self, seq):
+        if self.every == 1 or seq % self.every == 0:
+            return True
+        if self.forced.is_set():
+            self.forced.clear()
+            return True
+        return False
+
+    def force(self):
+        self.forced.set()
+
+    def record_detect(self, seconds):
+        with self.lock:
+            self.detect_count += 1
+            self.detect_time += seconds
+
+    def record_propagate(self, seconds):
+        with self.lock:
+            self.propagate_count += 1
+            self.propagate_time += seconds
+
+    def report(self, elapsed=None):
+        total = self.detect_count + self.propagate_count
+        if not total or not self.detect_count:
+            return
+        detect_ms = 1000.0 * self.detect_time / self.detect_count
+        print(f"Detect đầy đủ: {self.detect_count}/{total} khung hình, trung bình {detect_ms:.2f}ms")
+        if not self.propagate_count:
+            return
+        propagate_ms = 1000.0 * self.propagate_time / self.propagate_count
+        mixed_ms = (self.detect_time + self.propagate_time) * 1000.0 / total
+        print(f"Nội suy bằng tracker: {self.propagate_count}/{total} khung hình, trung bình {propagate_ms:.2f}ms")
+        print(f"Thời gian phát hiện mỗi khung hình: {detect_ms:.2f}ms -> {mixed_ms:.2f}ms "
+              f"(nhanh hơn x{detect_ms / mixed_ms:.1f})")
+        if elapsed:
+            fps = total / elapsed
+            # fps ước tính nếu mọi khung hình đều chạy detect đầy đủ
+            baseline_fps = 1.0 / (elapsed / total + (detect_ms - mixed_ms) / 1000.0)
+            print(f"FPS thực tế: {fps:.1f}, ước tính khi detect mọi khung hình: {baseline_fps:.1f}")
@@ -1,6 +1,8 @@
-import cv2
 import os
-import numpy as np
+import argparse
+from model_builder import build_model, shard_path
+from prototypes import METHODS
+from database import get_db
 
 DATA_DIR = "images"
 MODEL_PATH = "data/trainingData.yml"
@@ -9,33 +11,49 @@ if not os.path.exists(DATA_DIR):
     print(f"Thư mục '{DATA_DIR}' không tồn tại. Hãy thu thập dữ liệu trước!")
     exit()
 
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-
-faces, ids = [], []
-
-for file in os.listdir(DATA_DIR):
-    if file.endswith(".jpg"):
-        img_path = os.path.join(DATA_DIR, file)
-        face_img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-        
-        if face_img is None:
-            print(f"Không thể đọc ảnh: {img_path}. Bỏ qua...")
-            continue
-
+parser = argparse.ArgumentParser(description='Huấn luyện mô hình nhận diện khuôn mặt')
+# mặc định chỉ thêm mẫu mới vào mô hình hiện có; --full để huấn luyện lại toàn bộ
+parser.add_argument('--full', action='store_true', help='Huấn luyện lại toàn bộ mô hình')
+parser.add_argument('--prototypes', type=int, default=0,
+                    help='Thu gọn mô hình dùng khi nhận diện còn tối đa N mẫu mỗi người (0 = giữ tất cả)')
+parser.add_argument('--prototype-method', choices=METHODS, default='medoid',
+                    help='Cách chọn prototype: medoid hoặc mean')
+parser.add_argument('--ann-lists', type=int, default=None,
+                    help='Số cụm của index ANN (IVF) cho mô hình nhị phân; mặc định tự tạo khi mô hình '
+                         'lớn, 0 = không tạo index')
+parser.add_argument('--group', action='append', default=[],
+                    help='Chỉ huấn luyện mô hình riêng của nhóm này (data/models/<nhóm>.*), có thể lặp lại')
+parser.add_argument('--all-groups', action='store_true',
+                    help='Huấn luyện mô hình riêng của mọi nhóm; nhóm không có ảnh thay đổi được bỏ qua')
+# gui.py truyền thêm epochs/batch size, LBPH không dùng nên bỏ qua
+args, _ = parser.parse_known_args()
+options = dict(full=args.full, prototypes=args.prototypes, prototype_method=args.prototype_method,
+               ann_lists=args.ann_lists)
+
+groups = list(args.group)
+if args.all_groups:
+    groups += [name for name, _ in get_db().list_groups() if name not in groups]
+
+if not groups:
+    count = build_model(DATA_DIR, MODEL_PATH, **options)
+
+    #kiểm tra nếu có data hợp lệ để train
+    if count is None:
+        print("Không có dữ liệu hợp lệ để huấn luyện! Hãy kiểm tra lại ảnh thu thập.")
+        exit()
+
+    print(f"Huấn luyện mô hình hoàn tất! Mô hình đã được lưu tại: {MODEL_PATH}")
+else:
+    for group in groups:
         try:
-            user_id = int(file.split(".")[1])  # lấy ID từ tên file
-            faces.append(face_img)
-            ids.append(user_id)
-        except ValueError:
-            print(f"Lỗi xử lý ID từ file {file}. Bỏ qua...")
+            model_path = shard_path(group)
+        except ValueError as e:
+            print(e)
             continue
-
-#kiểm tra nếu có data hợp lệ để train
-if len(faces) == 0:
-    print("Không có dữ liệu hợp lệ để huấn luyện! Hãy kiểm tra lại ảnh thu thập.")
-    exit()
-
-print(f"Đang huấn luyện với {len(faces)} mẫu dữ liệu...")
-recognizer.train(faces, np.array(ids))
-recognizer.save(MODEL_PATH)
-print(f"Huấn luyện mô hình hoàn tất! Mô hình đã được lưu tại: {MODEL_PATH}")
\ No newline at end of file
+        members = get_db().group_members(group)
+        print(f"Nhóm {group}: {len(members)} thành viên")
+        count = build_model(DATA_DIR, model_path, user_ids=members, **options)
+        if count is None:
+            print(f"Nhóm {group} không có ảnh hợp lệ để huấn luyện, bỏ qua.")
+        else:
+            print(f"Mô hình nhóm {group} đã được lưu tại: {model_path}")
\ No newline at end of file
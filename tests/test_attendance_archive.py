@@ -0,0 +1,38 @@
+import os
+import sys
+import sqlite3
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from database import Database  # noqa: E402
+
+
+def legacy_db(path, rows):
+    "Database với bảng Attendance cũ như data/FaceBase.db (không có cột ID)"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE People (ID INTEGER NOT NULL, Name TEXT NOT NULL, Gender TEXT, Age INTEGER, PRIMARY KEY(ID))")
+    conn.execute("CREATE TABLE Attendance (UserID INTEGER, RecognitionTime DATETIME, Status TEXT, "
+                 "FOREIGN KEY (UserID) REFERENCES People(ID))")
+    conn.executemany("INSERT INTO Attendance VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_compact_after_compact_keeps_new_events(tmp_path):
+    day = datetime.datetime(2020, 1, 1, 8)
+    legacy_db(str(tmp_path / "face.db"), [(i % 3, str(day + datetime.timedelta(minutes=i)), "Có mặt") for i in range(5)])
+    archive = str(tmp_path / "archive.db")
+    db = Database(str(tmp_path / "face.db"))
+    before = datetime.date(2021, 1, 1).isoformat()
+
+    assert db.archive_attendance(before, archive) == 5
+    later = day + datetime.timedelta(days=1)
+    db.log_attendance_many([(str(i), later + datetime.timedelta(minutes=i), "Có mặt") for i in range(3)])
+    assert db.archive_attendance(before, archive) == 3
+
+    assert db.query("SELECT COUNT(*) FROM Attendance")[0][0] == 0
+    with sqlite3.connect(archive) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM Attendance").fetchone()[0] == 8
+    # chạy lại không chép trùng
+    assert db.archive_attendance(before, archive) == 0
+    db.close()